@@ -0,0 +1,202 @@
+from fastapi import APIRouter, Depends, HTTPException, Cookie, Request
+from python_multipart.multipart import MultipartParser, parse_options_header
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+import asyncio
+import os
+import uuid
+
+from ..core.config import settings
+from ..db.database import get_db
+from ..models.database import Document
+from ..models.schema import DocumentSchema
+from ..services.ingestion import ingestion_pool, SUPPORTED_EXTENSIONS
+from ..services.sessions import sessions
+
+router = APIRouter()
+
+# Room for the multipart boundaries and part headers around the file itself
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+UPLOAD_REQUEST_BODY = {
+    "required": True,
+    "content": {"multipart/form-data": {"schema": {
+        "type": "object",
+        "properties": {"file": {"type": "string", "format": "binary"}},
+        "required": ["file"],
+    }}},
+}
+
+
+async def get_owned_conversation(conversation_id: str, user_id: Optional[str], db: AsyncSession):
+    if not user_id:
+        raise HTTPException(status_code=401, detail="User ID required")
+
+    if not await sessions.owns(conversation_id, user_id, db):
+        raise HTTPException(status_code=404, detail="Conversation not found")
+
+
+def upload_filename(part_headers: dict) -> Optional[str]:
+    """
+        Filename of the "file" part of a multipart body, or None for any other part
+    """
+    _, options = parse_options_header(part_headers.get(b"content-disposition", b""))
+    if options.get(b"name") != b"file":
+        return None
+    return os.path.basename(options.get(b"filename", b"").decode("utf-8", "replace"))
+
+
+async def save_upload(request: Request, directory: str, document_id: str) -> dict:
+    """
+        Parse a multipart upload as it arrives and write its "file" part
+        straight to disk, enforcing the size limit on the bytes received so far
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise HTTPException(status_code=422, detail="Expected a multipart/form-data upload with a file field")
+
+    # The parser's callbacks are synchronous, so they queue events that are
+    # handled (and written out) after each chunk is fed
+    events = []
+    header, field, value = [], bytearray(), bytearray()
+
+    def on_header_end():
+        header.append((bytes(field).lower(), bytes(value)))
+        field.clear()
+        value.clear()
+
+    def on_headers_finished():
+        events.append(("headers", dict(header)))
+        header.clear()
+
+    parser = MultipartParser(params[b"boundary"], {
+        "on_header_field": lambda data, start, end: field.extend(data[start:end]),
+        "on_header_value": lambda data, start, end: value.extend(data[start:end]),
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": lambda data, start, end: events.append(("data", bytes(data[start:end]))),
+        "on_part_end": lambda: events.append(("end", None)),
+    })
+
+    upload, out, in_file = None, None, False
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            for kind, data in events:
+                if kind == "headers":
+                    filename = upload_filename(data)
+                    in_file = filename is not None and upload is None
+                    if not in_file:
+                        continue
+                    extension = os.path.splitext(filename)[1].lower()
+                    if extension not in SUPPORTED_EXTENSIONS:
+                        raise HTTPException(status_code=415, detail=f"Unsupported document type; expected one of {', '.join(SUPPORTED_EXTENSIONS)}")
+                    upload = {
+                        "filename": filename,
+                        "content_type": data.get(b"content-type", b"").decode() or None,
+                        "path": os.path.join(directory, f"{document_id}{extension}"),
+                        "size": 0,
+                    }
+                    out = await asyncio.to_thread(open, upload["path"], "wb")
+                elif kind == "data" and in_file:
+                    upload["size"] += len(data)
+                    if upload["size"] > settings.DOCUMENT_MAX_BYTES:
+                        raise HTTPException(status_code=413, detail="Document is too large")
+                    await asyncio.to_thread(out.write, data)
+                elif kind == "end":
+                    in_file = False
+            events.clear()
+        parser.finalize()
+    except Exception:
+        if out is not None:
+            await asyncio.to_thread(out.close)
+            os.remove(upload["path"])
+        raise
+
+    if upload is None:
+        raise HTTPException(status_code=422, detail="No file was uploaded")
+    await asyncio.to_thread(out.close)
+    return upload
+
+
+@router.post(
+    "/conversations/{conversation_id}/documents",
+    response_model=DocumentSchema,
+    status_code=202,
+    openapi_extra={"requestBody": UPLOAD_REQUEST_BODY},
+)
+async def upload_document(
+    conversation_id: str,
+    request: Request,
+    user_id: Optional[str] = Cookie(None),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Attach a document to a conversation, sent as the "file" field of a multipart form.
+
+    The upload is streamed to disk as it arrives, and refused with a 413 as soon
+    as it passes the size limit (or up front, from its Content-Length). It is
+    then extracted, chunked and indexed in the background; poll the document to
+    follow its status.
+    """
+    await get_owned_conversation(conversation_id, user_id, db)
+
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > settings.DOCUMENT_MAX_BYTES + MULTIPART_OVERHEAD_BYTES:
+        raise HTTPException(status_code=413, detail="Document is too large")
+
+    document_id = str(uuid.uuid4())
+    directory = os.path.join(settings.DOCUMENT_STORAGE_DIR, conversation_id)
+    os.makedirs(directory, exist_ok=True)
+
+    upload = await save_upload(request, directory, document_id)
+
+    document = Document(
+        id=document_id,
+        conversation_id=conversation_id,
+        filename=upload["filename"],
+        content_type=upload["content_type"],
+        size=upload["size"],
+        path=upload["path"],
+        status="pending",
+        chunk_count=0,
+    )
+    db.add(document)
+    await db.commit()
+
+    ingestion_pool.submit(document_id, db.bind)
+    return document
+
+
+@router.get("/conversations/{conversation_id}/documents", response_model=List[DocumentSchema])
+async def list_documents(
+    conversation_id: str,
+    user_id: Optional[str] = Cookie(None),
+    db: AsyncSession = Depends(get_db)
+):
+    await get_owned_conversation(conversation_id, user_id, db)
+
+    return (await db.execute(
+        select(Document).filter(Document.conversation_id == conversation_id).order_by(Document.created_at)
+    )).scalars().all()
+
+
+@router.get("/conversations/{conversation_id}/documents/{document_id}", response_model=DocumentSchema)
+async def get_document(
+    conversation_id: str,
+    document_id: str,
+    user_id: Optional[str] = Cookie(None),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Return a document's ingestion status
+    """
+    await get_owned_conversation(conversation_id, user_id, db)
+
+    document = (await db.execute(
+        select(Document).filter(Document.id == document_id, Document.conversation_id == conversation_id)
+    )).scalars().first()
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return document
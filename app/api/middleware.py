@@ -0,0 +1,216 @@
+import asyncio
+import gzip
+import time
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:
+    # Optional; without it responses are only gzip-compressed
+    brotli = None
+
+from ..core.config import settings
+from ..services.admission import AdmissionRejected, rate_limiter, llm_limiter, retry_after_header
+from ..services.metrics import REQUEST_LATENCY
+from ..services.sessions import sessions
+
+# Endpoints that call the LLM and therefore go through admission control.
+# Batches are admitted per item by the route itself.
+LLM_PATHS = ("/api/query", "/api/query/stream")
+
+# Response types worth compressing; event streams are always sent as produced
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+STREAMING_TYPES = ("text/event-stream",)
+# Fast settings: most of the size reduction at a fraction of the CPU of the maximum levels
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# Bodies above this size are compressed off the event loop
+COMPRESS_IN_THREAD_SIZE = 256 * 1024
+
+
+def client_address(request: Request) -> str:
+    """
+        The client's address. X-Forwarded-For is only honoured when the peer is a
+        trusted proxy; then the nearest hop that is not a trusted proxy is used.
+    """
+    trusted = {p.strip() for p in settings.TRUSTED_PROXIES.split(",") if p.strip()}
+    address = request.client.host if request.client else "unknown"
+    if address in trusted:
+        hops = [hop.strip() for hop in request.headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+        while hops and address in trusted:
+            address = hops.pop()
+    return address
+
+
+def client_key(request: Request) -> str:
+    """
+        Identify the caller by user_id cookie, falling back to the client address
+    """
+    user_id = request.cookies.get("user_id")
+    if user_id:
+        return f"user:{user_id}"
+    return f"ip:{client_address(request)}"
+
+
+class AdmissionMiddleware:
+    """
+        Rate limit each client and cap concurrent LLM requests before they reach the routes.
+
+        The concurrency slot is held until the response, including a stream,
+        has been fully sent.
+    """
+
+    def __init__(self, app: ASGIApp, paths=LLM_PATHS):
+        self.app = app
+        self.paths = paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await rate_limiter.check(client_key(Request(scope)))
+            async with llm_limiter.slot():
+                await self.app(scope, receive, send)
+        except AdmissionRejected as e:
+            response = JSONResponse(
+                {"detail": e.detail},
+                status_code=e.status_code,
+                headers={"Retry-After": retry_after_header(e.retry_after)},
+            )
+            await response(scope, receive, send)
+
+
+class MetricsMiddleware:
+    """
+        Record each request's latency under its route template, so ids in the
+        path do not create a label per conversation
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            REQUEST_LATENCY.labels(
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                str(status),
+            ).observe(time.perf_counter() - started)
+
+
+class LastSeenMiddleware:
+    """
+        Note the user behind each request; the times are written in bulk by the session cache
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] == "http":
+            user_id = Request(scope).cookies.get("user_id")
+            if user_id:
+                sessions.touch(user_id)
+        await self.app(scope, receive, send)
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """
+        Pick "br" or "gzip" from an Accept-Encoding header by q-value, preferring brotli on ties
+    """
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip().lower()] = weight
+
+    available = ("br", "gzip") if brotli is not None else ("gzip",)
+    encoding = max(available, key=lambda e: weights.get(e, weights.get("*", 0.0)))
+    return encoding if weights.get(encoding, weights.get("*", 0.0)) > 0 else None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class CompressionMiddleware:
+    """
+        Compress complete JSON and text responses of at least `minimum_size`
+        bytes with the encoding the client prefers.
+
+        Streamed responses (more than one body message) pass through untouched,
+        so deltas reach the client as soon as they are produced.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        start = None
+
+        async def send_compressed(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                content_type = Headers(raw=message["headers"]).get("content-type", "")
+                if content_type.startswith(COMPRESSIBLE_TYPES) and not content_type.startswith(STREAMING_TYPES):
+                    # Held back until the first body shows whether the response is streamed
+                    start = message
+                    return
+            if start is None or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            initial, start = start, None
+            headers = MutableHeaders(raw=initial["headers"])
+            body = message.get("body", b"")
+            if not message.get("more_body", False):
+                headers.add_vary_header("Accept-Encoding")
+                if encoding and len(body) >= self.minimum_size and "content-encoding" not in headers:
+                    if len(body) >= COMPRESS_IN_THREAD_SIZE:
+                        body = await asyncio.to_thread(compress, body, encoding)
+                    else:
+                        body = compress(body, encoding)
+                    headers["Content-Encoding"] = encoding
+                    headers["Content-Length"] = str(len(body))
+                    message = {**message, "body": body}
+            await send(initial)
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,25 @@
+import base64
+from datetime import datetime
+from typing import Tuple
+
+from fastapi import HTTPException
+
+
+def encode_cursor(timestamp: datetime, row_id: str) -> str:
+    """
+        Encode a (timestamp, id) keyset position as an opaque cursor
+    """
+    raw = f"{timestamp.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """
+        Decode a cursor produced by encode_cursor
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        timestamp, row_id = raw.split("|", 1)
+        return datetime.fromisoformat(timestamp), row_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
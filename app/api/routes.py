@@ -1,114 +1,407 @@
   
-from fastapi import APIRouter, Depends, Response, HTTPException, Cookie, Request
-from sqlalchemy.orm import Session
-from typing import Optional
+from fastapi import APIRouter, Depends, Response, HTTPException, Cookie, Request, BackgroundTasks, Query
+from fastapi.responses import StreamingResponse, ORJSONResponse
+from sqlalchemy import select, func, or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
+import asyncio
+import time
+from sqlalchemy.orm import selectinload
+from typing import Optional
 import uuid
+import json
 
 from ..db.database import get_db
-from ..models.database import User, Conversation, Message
-from ..models.schema import QueryRequest, QueryResponse
-from ..services.llm_service import get_llm_response
-from ..models.schema import ConversationSchema, MessageSchema
+from ..models.database import Conversation, Message, Job
+from ..models.schema import QueryRequest, QueryResponse, BatchQueryRequest
+from ..services import llm_service
+from ..services.admission import AdmissionRejected, rate_limiter, llm_limiter
+from ..services.conversation_service import resolve_conversation, save_exchange, save_exchanges, Exchange
+from ..services.context import refresh_summary_task, with_passages
+from ..services.provider_router import ProviderUnavailable
+from ..services.jobs import job_pool, submit_job, FINISHED_STATUSES
+from ..services.metrics import stage_timer
+from ..services.search import search_messages
+from ..services.sessions import sessions
+from .middleware import client_key
+from .pagination import encode_cursor, decode_cursor
+from ..models.schema import ConversationSchema, ConversationSummarySchema, MessagePageSchema, JobSchema, SearchResultSchema
+from ..core.config import settings
 from typing import List
 
 router = APIRouter()
 
+# Characters of the latest message shown in conversation listings
+CONVERSATION_PREVIEW_LENGTH = 120
+
 @router.post("/query", response_model=QueryResponse)
 async def process_query(
     request: QueryRequest,
     response: Response,
-    db: Session = Depends(get_db),
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db),
     user_id: Optional[str] = Cookie(None)
 ):
     """
-    Process a user query and return an LLM-generated response
+    Process a user query and return an LLM-generated response.
+
+    With async_mode the query is queued instead and a 202 with the job is
+    returned straight away; poll GET /api/jobs/{id} for the answer.
     """
-    
+    if request.async_mode:
+        return await queue_query(request, db, user_id)
+
     # Generate or retrieve user ID
     if not user_id:
         user_id = str(uuid.uuid4())
-        response_content = await handle_query(request.query, request.conversation_id, request.conversation_title, user_id, db)
+        response_content = await handle_query(request.query, request.conversation_id, request.conversation_title, user_id, db, request.bypass_cache, background_tasks)
         # Set cookie in response header
         response.set_cookie(key="user_id", value=user_id, httponly=True, secure=True, samesite="none", max_age=31536000)  # 1 year
         response_content.cookie = {"user_id": user_id}
         return response_content
     else:
-        return await handle_query(request.query, request.conversation_id, request.conversation_title, user_id, db)
+        return await handle_query(request.query, request.conversation_id, request.conversation_title, user_id, db, request.bypass_cache, background_tasks)
+
+async def queue_query(request: QueryRequest, db: AsyncSession, user_id: Optional[str]):
+    new_user = not user_id
+    if new_user:
+        user_id = str(uuid.uuid4())
+
+    job = await submit_job(request.query, request.conversation_id, request.conversation_title, user_id, request.bypass_cache, db)
+
+    response = ORJSONResponse(
+        content=JobSchema.model_validate(job).model_dump(),
+        status_code=202,
+        headers={"Location": f"/api/jobs/{job.id}"},
+    )
+    if new_user:
+        response.set_cookie(key="user_id", value=user_id, httponly=True, secure=True, samesite="none", max_age=31536000)  # 1 year
+    return response
+
+def schedule_summary_refresh(target, db: AsyncSession, background_tasks: Optional[BackgroundTasks]):
+    """
+        Fold turns that left the context window into the rolling summary after responding
+    """
+    if background_tasks is not None and target.context and target.context.needs_summary:
+        background_tasks.add_task(refresh_summary_task, target.conversation_id, target.context.window_start, db.bind)
 
-async def handle_query(query: str, conversation_id: str, conversation_title: str, user_id: str, db: Session):
+def provider_unavailable(error: ProviderUnavailable) -> HTTPException:
+    headers = {"Retry-After": str(max(1, round(error.retry_after)))} if error.retry_after else None
+    return HTTPException(status_code=503, detail=str(error), headers=headers)
+
+async def handle_query(query: str, conversation_id: str, conversation_title: str, user_id: str, db: AsyncSession, bypass_cache: bool = False, background_tasks: Optional[BackgroundTasks] = None):
     try:
-        # Check if user exists, create if not
-        user = db.query(User).filter(User.id == user_id).first()
-        if not user:
-            user = User(id=user_id)
-            db.add(user)
-            db.commit()
-                    
-        if conversation_id:
-            conversation = db.query(Conversation).filter(
-                Conversation.id == conversation_id,
-                Conversation.user_id == user_id
-            ).first()
-
-            if not conversation:
-                raise HTTPException(status_code=404, detail="Conversation not found")
-            
-            #Update the conversation with the conversation title if it exists
-            if conversation_title and conversation.title != conversation_title:
-                conversation.title = conversation_title
-                conversation.updated_at = datetime.utcnow()
-                db.commit()
-        else:
-            conversation = Conversation(
-                user_id=user_id,
-                title=conversation_title,
-                )
-            db.add(conversation)
-            db.commit()
-        
-        # Store user message
-        user_message = Message(
-            conversation_id=conversation.id,
-            role="user",
-            content=query
-        )
-        db.add(user_message)
-        db.commit()
-        
-        # Get LLM response
-        llm_response = await get_llm_response(query)
-        
-        # Store assistant message
-        assistant_message = Message(
-            conversation_id=conversation.id,
-            role="ai",
-            content=llm_response
-        )
-        db.add(assistant_message)
-        db.commit()
-        
+        # Only read-only validation happens before the LLM call
+        with stage_timer("db_read"):
+            target = await resolve_conversation(conversation_id, user_id, db)
+        with stage_timer("retrieval"):
+            target.context = with_passages(target.context, query, None if target.is_new else target.conversation_id)
+
+        # Get LLM response; a new conversation may reuse the answer to a paraphrased question
+        answer = await llm_service.get_cached_llm_response(query, context=target.context, bypass_cache=bypass_cache, semantic=target.is_new)
+
+        # Store user, conversation and both messages in one transaction
+        with stage_timer("db_write"):
+            await save_exchange(target, user_id, conversation_title, query, answer, db)
+        schedule_summary_refresh(target, db, background_tasks)
+
         return QueryResponse(
-            response=llm_response,
-            conversation_id=conversation.id
+            response=answer.text,
+            conversation_id=target.conversation_id,
+            cached=answer.cached,
         )
+    except HTTPException:
+        raise
+    except ProviderUnavailable as e:
+        raise provider_unavailable(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/query/stream")
+async def process_query_stream(
+    request: QueryRequest,
+    http_request: Request,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db),
+    user_id: Optional[str] = Cookie(None)
+):
+    """
+    Process a user query and stream the LLM response as it is generated.
+
+    Responds with server-sent events when the client accepts text/event-stream,
+    otherwise with newline-delimited JSON chunks.
+    """
+    new_user = not user_id
+    if new_user:
+        user_id = str(uuid.uuid4())
+
+    try:
+        with stage_timer("db_read"):
+            target = await resolve_conversation(request.conversation_id, user_id, db)
+        with stage_timer("retrieval"):
+            target.context = with_passages(target.context, request.query, None if target.is_new else target.conversation_id)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/conversations", response_model=List[ConversationSchema])
+    sse = "text/event-stream" in http_request.headers.get("accept", "")
+
+    def encode(event: str, data: dict) -> str:
+        if sse:
+            return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        return json.dumps({"type": event, **data}) + "\n"
+
+    async def event_stream():
+        answer = llm_service.Answer("")
+        try:
+            async for delta in llm_service.stream_cached_llm_response(
+                request.query,
+                context=target.context,
+                bypass_cache=request.bypass_cache,
+                semantic=target.is_new,
+                answer=answer,
+            ):
+                yield encode("delta", {"text": delta})
+
+            # Persist the exchange in a single write once the stream completes.
+            # The request-scoped session has already been released by FastAPI at this
+            # point, but a closed Session can be reused and is closed again below.
+            with stage_timer("db_write"):
+                await save_exchange(target, user_id, request.conversation_title, request.query, answer, db)
+            yield encode("done", {"conversation_id": target.conversation_id, "cached": answer.cached})
+        except Exception as e:
+            yield encode("error", {"detail": str(e)})
+        finally:
+            await db.close()
+
+    # Runs once the stream has been fully sent
+    schedule_summary_refresh(target, db, background_tasks)
+
+    response = StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream" if sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    if new_user:
+        response.set_cookie(key="user_id", value=user_id, httponly=True, secure=True, samesite="none", max_age=31536000)  # 1 year
+    return response
+
+@router.post("/query/batch")
+async def process_query_batch(
+    request: BatchQueryRequest,
+    http_request: Request,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db),
+    user_id: Optional[str] = Cookie(None)
+):
+    """
+    Answer a list of queries concurrently and stream the results as NDJSON.
+
+    Each item produces a "result" or "error" line, tagged with its index, as
+    soon as it finishes; a final "done" line follows once everything is saved.
+    Answers go through the response cache and request coalescing, and are
+    persisted in bulk. Every item is charged to the client's rate limit, waiting
+    for a token for up to BATCH_RATE_LIMIT_WAIT into the batch, and holds an
+    LLM concurrency slot while it waits for its answer, like a single query would.
+    """
+    if len(request.queries) > settings.BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=413, detail=f"A batch may contain at most {settings.BATCH_MAX_QUERIES} queries")
+
+    new_user = not user_id
+    if new_user:
+        user_id = str(uuid.uuid4())
+
+    parallel = asyncio.Semaphore(settings.BATCH_MAX_PARALLEL)
+    client = client_key(http_request)
+    deadline = time.monotonic() + settings.BATCH_RATE_LIMIT_WAIT
+
+    async def answer(index: int, item: QueryRequest):
+        try:
+            async with parallel:
+                await rate_limiter.acquire(client, deadline)
+                # Each item reads through its own session so they can run concurrently
+                async with AsyncSession(db.bind, expire_on_commit=False) as session:
+                    target = await resolve_conversation(item.conversation_id, user_id, session)
+                target.context = with_passages(target.context, item.query, None if target.is_new else target.conversation_id)
+                async with llm_limiter.slot():
+                    answer = await llm_service.get_cached_llm_response(item.query, context=target.context, bypass_cache=item.bypass_cache, semantic=target.is_new)
+                return index, Exchange(target, item.conversation_title, item.query, answer, datetime.utcnow()), None
+        except HTTPException as e:
+            return index, None, (e.status_code, e.detail)
+        except AdmissionRejected as e:
+            return index, None, (e.status_code, e.detail)
+        except ProviderUnavailable as e:
+            return index, None, (503, str(e))
+        except Exception as e:
+            return index, None, (500, str(e))
+
+    def line(event: str, data: dict) -> str:
+        return json.dumps({"type": event, **data}) + "\n"
+
+    async def result_stream():
+        tasks = [asyncio.ensure_future(answer(i, item)) for i, item in enumerate(request.queries)]
+        pending, saved, failed = [], 0, 0
+
+        async def flush():
+            nonlocal saved, failed
+            batch = pending[:]
+            pending.clear()
+            try:
+                await save_exchanges([exchange for _, exchange in batch], user_id, db)
+                saved += len(batch)
+                for _, exchange in batch:
+                    schedule_summary_refresh(exchange.target, db, background_tasks)
+                return []
+            except Exception as e:
+                failed += len(batch)
+                return [line("error", {"index": index, "status": 500, "detail": f"Failed to save: {e}"}) for index, _ in batch]
+
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                index, exchange, error = await next_done
+                if error is not None:
+                    failed += 1
+                    yield line("error", {"index": index, "status": error[0], "detail": error[1]})
+                    continue
+
+                pending.append((index, exchange))
+                yield line("result", {
+                    "index": index,
+                    "response": exchange.answer.text,
+                    "conversation_id": exchange.target.conversation_id,
+                    "cached": exchange.answer.cached,
+                })
+                if len(pending) >= settings.BATCH_WRITE_SIZE:
+                    for error in await flush():
+                        yield error
+
+            for error in await flush():
+                yield error
+            yield line("done", {"saved": saved, "failed": failed})
+        finally:
+            for task in tasks:
+                task.cancel()
+            await db.close()
+
+    response = StreamingResponse(
+        result_stream(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    if new_user:
+        response.set_cookie(key="user_id", value=user_id, httponly=True, secure=True, samesite="none", max_age=31536000)  # 1 year
+    return response
+
+@router.get("/jobs/{job_id}", response_model=JobSchema)
+async def get_job(
+    job_id: str,
+    wait: float = Query(0, ge=0, description="Seconds to wait for the job to finish (long-poll)"),
+    user_id: Optional[str] = Cookie(None),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Return a queued query's status, and its answer once it has finished
+    """
+    if not user_id:
+        raise HTTPException(status_code=401, detail="User ID required")
+
+    deadline = asyncio.get_running_loop().time() + min(wait, settings.JOB_MAX_WAIT)
+    while True:
+        job = (await db.execute(
+            select(Job).filter(Job.id == job_id, Job.user_id == user_id).execution_options(populate_existing=True)
+        )).scalars().first()
+        # Release the connection between checks
+        await db.commit()
+
+        if not job:
+            raise HTTPException(status_code=404, detail="Job not found")
+
+        remaining = deadline - asyncio.get_running_loop().time()
+        if job.status in FINISHED_STATUSES or remaining <= 0:
+            return job
+        await job_pool.wait(job_id, min(remaining, settings.JOB_POLL_INTERVAL))
+
+@router.get("/conversations", response_model=List[ConversationSummarySchema])
 async def get_conversations(
     request: Request,
+    response: Response,
     user_id: Optional[str] = Cookie(None),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: AsyncSession = Depends(get_db)
 ):
+    """
+    List the user's conversations, most recently updated first.
+
+    Returns lightweight summaries; the cursor for the next page is sent in the
+    X-Next-Cursor header and passed back as ?cursor=.
+    """
     if not user_id:
         return []
+
+    message_count = (
+        select(func.count(Message.id))
+        .where(Message.conversation_id == Conversation.id)
+        .correlate(Conversation)
+        .scalar_subquery()
+    )
+    last_message_preview = (
+        select(func.substr(Message.content, 1, CONVERSATION_PREVIEW_LENGTH))
+        .where(Message.conversation_id == Conversation.id)
+        .correlate(Conversation)
+        .order_by(Message.created_at.desc(), Message.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+
+    stmt = select(
+        Conversation.id,
+        Conversation.title,
+        Conversation.created_at,
+        Conversation.updated_at,
+        message_count.label("message_count"),
+        last_message_preview.label("last_message_preview"),
+    ).filter(Conversation.user_id == user_id)
+
+    if cursor:
+        updated_at, conversation_id = decode_cursor(cursor)
+        stmt = stmt.filter(or_(
+            Conversation.updated_at < updated_at,
+            and_(Conversation.updated_at == updated_at, Conversation.id < conversation_id),
+        ))
+
+    # Fetch one extra row to know whether another page exists
+    stmt = stmt.order_by(Conversation.updated_at.desc(), Conversation.id.desc()).limit(limit + 1)
+
     try:
-        conversations = db.query(Conversation).filter(
-            Conversation.user_id == user_id
-        ).order_by(Conversation.updated_at.desc()).all()
-    
-        return conversations
+        rows = (await db.execute(stmt)).all()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(rows[-1].updated_at, rows[-1].id)
+
+    return [ConversationSummarySchema(**row._mapping) for row in rows]
+
+
+@router.get("/search", response_model=List[SearchResultSchema])
+async def search_conversations(
+    q: str = Query(..., min_length=1, max_length=500),
+    user_id: Optional[str] = Cookie(None),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Search the user's messages and return the matching conversations, best
+    match first, each with a highlighted snippet of its best matching message.
+    """
+    if not user_id:
+        return []
+
+    try:
+        return await search_messages(q, user_id, limit, db)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -117,17 +410,83 @@ async def get_conversations(
 async def get_conversation(
     conversation_id: str,
     user_id: Optional[str] = Cookie(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     if not user_id:
         raise HTTPException(status_code=401, detail="User ID required")
     
-    conversation = db.query(Conversation).filter(
-        Conversation.id == conversation_id,
-        Conversation.user_id == user_id
-    ).first()
+    conversation = (await db.execute(
+        select(Conversation)
+        .filter(Conversation.id == conversation_id, Conversation.user_id == user_id)
+        .options(selectinload(Conversation.messages))
+    )).scalars().first()
     
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
     
     return conversation
+
+
+
+@router.get("/conversations/{conversation_id}/messages", response_model=MessagePageSchema)
+async def get_conversation_messages(
+    conversation_id: str,
+    user_id: Optional[str] = Cookie(None),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Page through a conversation's messages in chronological order.
+
+    Without a cursor the newest messages are returned. ?before= loads the page
+    preceding a cursor; ?after= returns only messages newer than a cursor, so
+    clients can poll incrementally.
+    """
+    if not user_id:
+        raise HTTPException(status_code=401, detail="User ID required")
+    if before and after:
+        raise HTTPException(status_code=400, detail="Use either before or after, not both")
+
+    if not await sessions.owns(conversation_id, user_id, db):
+        raise HTTPException(status_code=404, detail="Conversation not found")
+
+    stmt = select(Message).filter(Message.conversation_id == conversation_id)
+
+    if after:
+        created_at, message_id = decode_cursor(after)
+        stmt = stmt.filter(or_(
+            Message.created_at > created_at,
+            and_(Message.created_at == created_at, Message.id > message_id),
+        )).order_by(Message.created_at, Message.id)
+    else:
+        if before:
+            created_at, message_id = decode_cursor(before)
+            stmt = stmt.filter(or_(
+                Message.created_at < created_at,
+                and_(Message.created_at == created_at, Message.id < message_id),
+            ))
+        stmt = stmt.order_by(Message.created_at.desc(), Message.id.desc())
+
+    # Fetch one extra row to know whether another page exists
+    messages = list((await db.execute(stmt.limit(limit + 1))).scalars().all())
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+    if not after:
+        messages.reverse()
+
+    before_cursor = None
+    if has_more and not after:
+        before_cursor = encode_cursor(messages[0].created_at, messages[0].id)
+
+    after_cursor = after
+    if messages:
+        after_cursor = encode_cursor(messages[-1].created_at, messages[-1].id)
+
+    # The rows are validated once, straight into the response model
+    return {
+        "messages": messages,
+        "before_cursor": before_cursor,
+        "after_cursor": after_cursor,
+    }
@@ -0,0 +1,170 @@
+"""
+    Measure the hot lookup queries with and without the schema indexes.
+
+    Seeds a throwaway database with N users, conversations and messages, then
+    times the conversation listing, message paging and context queries first
+    without the indexes and again after creating them.
+
+    Usage (from the repository root):
+        python -m app.benchmarks.db_indexes --users 1000 --conversations 10 --messages 100
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, select, func, insert
+from sqlalchemy.pool import NullPool
+
+from app.models.database import Base, User, Conversation, Message
+
+
+def seed(engine, users: int, conversations: int, messages: int, batch_size: int = 10000):
+    """
+        Bulk insert users, conversations per user and messages per conversation
+    """
+    start = datetime.utcnow() - timedelta(days=365)
+    user_ids, conversation_ids = [], []
+    user_rows, conversation_rows, message_rows = [], [], []
+
+    def flush(conn, force=False):
+        for table, rows in ((User, user_rows), (Conversation, conversation_rows), (Message, message_rows)):
+            if rows and (force or len(rows) >= batch_size):
+                conn.execute(insert(table), rows)
+                rows.clear()
+
+    with engine.begin() as conn:
+        for _ in range(users):
+            user_id = str(uuid.uuid4())
+            user_ids.append(user_id)
+            user_rows.append({"id": user_id, "created_at": start, "last_seen": start})
+
+            for _ in range(conversations):
+                conversation_id = str(uuid.uuid4())
+                conversation_ids.append(conversation_id)
+                created = start + timedelta(seconds=random.randint(0, 365 * 86400))
+                conversation_rows.append({
+                    "id": conversation_id,
+                    "user_id": user_id,
+                    "title": "Benchmark conversation",
+                    "created_at": created,
+                    "updated_at": created + timedelta(seconds=messages * 30),
+                })
+
+                for i in range(messages):
+                    message_rows.append({
+                        "id": str(uuid.uuid4()),
+                        "conversation_id": conversation_id,
+                        "role": "user" if i % 2 == 0 else "ai",
+                        "content": f"Benchmark message {i} about contracts and leases.",
+                        "created_at": created + timedelta(seconds=i * 30),
+                    })
+            flush(conn)
+        flush(conn, force=True)
+
+    return user_ids, conversation_ids
+
+
+def list_conversations(conn, user_id: str):
+    message_count = (
+        select(func.count(Message.id))
+        .where(Message.conversation_id == Conversation.id)
+        .correlate(Conversation)
+        .scalar_subquery()
+    )
+    stmt = (
+        select(Conversation.id, Conversation.title, Conversation.updated_at, message_count)
+        .filter(Conversation.user_id == user_id)
+        .order_by(Conversation.updated_at.desc(), Conversation.id.desc())
+        .limit(50)
+    )
+    return conn.execute(stmt).all()
+
+
+def latest_messages(conn, conversation_id: str):
+    stmt = (
+        select(Message.id, Message.role, Message.content, Message.created_at)
+        .filter(Message.conversation_id == conversation_id)
+        .order_by(Message.created_at.desc(), Message.id.desc())
+        .limit(50)
+    )
+    return conn.execute(stmt).all()
+
+
+QUERIES = {
+    "list_conversations": ("users", list_conversations),
+    "latest_messages": ("conversations", latest_messages),
+}
+
+
+def time_queries(engine, ids: dict, samples: int) -> dict:
+    """
+        Run each query against random ids and return latency percentiles in milliseconds
+    """
+    results = {}
+    with engine.connect() as conn:
+        for name, (kind, query) in QUERIES.items():
+            timings = []
+            for _ in range(samples):
+                key = random.choice(ids[kind])
+                started = time.perf_counter()
+                query(conn, key)
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            results[name] = {
+                "p50": statistics.median(timings),
+                "p95": timings[int(len(timings) * 0.95) - 1],
+            }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", default="./index_benchmark.db", help="SQLite file to create (deleted first)")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--conversations", type=int, default=10, help="conversations per user")
+    parser.add_argument("--messages", type=int, default=100, help="messages per conversation")
+    parser.add_argument("--samples", type=int, default=200, help="timed queries per measurement")
+    args = parser.parse_args()
+
+    if os.path.exists(args.database):
+        os.remove(args.database)
+    engine = create_engine(f"sqlite:///{args.database}", poolclass=NullPool)
+
+    indexes = [index for table in Base.metadata.sorted_tables for index in table.indexes]
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for index in indexes:
+            index.drop(conn)
+
+    total = args.users * args.conversations * args.messages
+    print(f"Seeding {args.users} users, {args.users * args.conversations} conversations, {total} messages...")
+    started = time.perf_counter()
+    user_ids, conversation_ids = seed(engine, args.users, args.conversations, args.messages)
+    print(f"Seeded in {time.perf_counter() - started:.1f}s")
+
+    ids = {"users": user_ids, "conversations": conversation_ids}
+    before = time_queries(engine, ids, args.samples)
+
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        for index in indexes:
+            index.create(conn)
+    print(f"Created {len(indexes)} indexes in {time.perf_counter() - started:.1f}s")
+    after = time_queries(engine, ids, args.samples)
+
+    print(f"\n{'query':<20} {'p50 before':>12} {'p50 after':>12} {'p95 before':>12} {'p95 after':>12}")
+    for name in QUERIES:
+        print(
+            f"{name:<20} {before[name]['p50']:>10.2f}ms {after[name]['p50']:>10.2f}ms "
+            f"{before[name]['p95']:>10.2f}ms {after[name]['p95']:>10.2f}ms"
+        )
+
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
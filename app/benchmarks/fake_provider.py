@@ -0,0 +1,145 @@
+"""
+    A local stand-in for the Anthropic Messages API, for load tests.
+
+    Answers POST /v1/messages, both plain and streamed, with filler text. Time to
+    first token is drawn from a log-normal distribution, tokens then arrive at a
+    fixed rate, and a share of requests fail with 529 (overloaded) or 500, so the
+    app's pooling, retries and streaming behave as they would against the real API.
+
+    Usage (from the repository root):
+        python -m app.benchmarks.fake_provider --port 9100 --ttft 0.4 --tokens-per-second 80
+"""
+import argparse
+import asyncio
+import json
+import random
+import uuid
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+WORDS = "the tenant shall pay rent and keep the premises in good repair under the lease".split()
+
+# Tokens sent per streamed delta
+TOKENS_PER_DELTA = 4
+
+
+class FakeProvider:
+    def __init__(self, ttft: float, ttft_sigma: float, tokens_per_second: float, output_tokens: int, error_rate: float):
+        self.ttft = ttft
+        self.ttft_sigma = ttft_sigma
+        self.tokens_per_second = tokens_per_second
+        self.output_tokens = output_tokens
+        self.error_rate = error_rate
+        self._cached_prefixes = set()
+
+    def first_token_delay(self) -> float:
+        # Log-normal with the given median: most calls are quick, with a long tail
+        return random.lognormvariate(0, self.ttft_sigma) * self.ttft
+
+    def failure(self):
+        if random.random() >= self.error_rate:
+            return None
+        if random.random() < 0.5:
+            return JSONResponse({"type": "error", "error": {"type": "overloaded_error", "message": "Overloaded"}}, status_code=529)
+        return JSONResponse({"type": "error", "error": {"type": "api_error", "message": "Internal server error"}}, status_code=500)
+
+    def usage(self, body: dict) -> dict:
+        """
+            Input token usage, with the system prefix up to its last cache_control
+            block counted as a cache write the first time and a cache read after that
+        """
+        input_tokens = len(json.dumps(body)) // 4
+        system = body.get("system")
+        marked = [i for i, block in enumerate(system) if block.get("cache_control")] if isinstance(system, list) else []
+        if not marked:
+            return {"input_tokens": input_tokens}
+
+        prefix = json.dumps(system[:marked[-1] + 1], sort_keys=True)
+        cached = len(prefix) // 4
+        kind = "cache_read_input_tokens" if prefix in self._cached_prefixes else "cache_creation_input_tokens"
+        self._cached_prefixes.add(prefix)
+        return {"input_tokens": max(0, input_tokens - cached), kind: cached}
+
+    def tokens(self):
+        count = max(1, int(random.gauss(self.output_tokens, self.output_tokens * 0.25)))
+        return [random.choice(WORDS) + " " for _ in range(count)]
+
+    async def messages(self, request: Request):
+        body = await request.json()
+        usage = self.usage(body)
+        failure = self.failure()
+        if failure is not None:
+            await asyncio.sleep(self.first_token_delay())
+            return failure
+
+        tokens = self.tokens()
+        message = {
+            "id": f"msg_{uuid.uuid4().hex}",
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model", "fake"),
+            "stop_reason": None,
+            "stop_sequence": None,
+        }
+
+        if not body.get("stream"):
+            await asyncio.sleep(self.first_token_delay() + len(tokens) / self.tokens_per_second)
+            return JSONResponse({
+                **message,
+                "content": [{"type": "text", "text": "".join(tokens)}],
+                "stop_reason": "end_turn",
+                "usage": {**usage, "output_tokens": len(tokens)},
+            })
+
+        def event(name: str, data: dict) -> str:
+            return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+        async def stream():
+            yield event("message_start", {"type": "message_start", "message": {
+                **message, "content": [], "usage": {**usage, "output_tokens": 1},
+            }})
+            await asyncio.sleep(self.first_token_delay())
+            yield event("content_block_start", {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}})
+            for start in range(0, len(tokens), TOKENS_PER_DELTA):
+                delta = "".join(tokens[start:start + TOKENS_PER_DELTA])
+                yield event("content_block_delta", {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": delta}})
+                await asyncio.sleep(TOKENS_PER_DELTA / self.tokens_per_second)
+            yield event("content_block_stop", {"type": "content_block_stop", "index": 0})
+            yield event("message_delta", {
+                "type": "message_delta",
+                "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                "usage": {"output_tokens": len(tokens)},
+            })
+            yield event("message_stop", {"type": "message_stop"})
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+def build_app(provider: FakeProvider) -> Starlette:
+    return Starlette(routes=[Route("/v1/messages", provider.messages, methods=["POST"])])
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--ttft", type=float, default=0.4, help="median seconds to first token")
+    parser.add_argument("--ttft-sigma", type=float, default=0.5, help="log-normal spread of the time to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=80)
+    parser.add_argument("--output-tokens", type=int, default=200, help="mean tokens per answer")
+    parser.add_argument("--error-rate", type=float, default=0.01, help="share of requests that fail with 529 or 500")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=9100)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    provider = FakeProvider(args.ttft, args.ttft_sigma, args.tokens_per_second, args.output_tokens, args.error_rate)
+    uvicorn.run(build_app(provider), host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
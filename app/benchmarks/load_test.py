@@ -0,0 +1,381 @@
+"""
+    Drive the API at a target request rate against a fake LLM provider.
+
+    Starts app.benchmarks.fake_provider and the API (uvicorn, on a throwaway
+    SQLite database) as subprocesses, then sends an open-loop mix of /api/query,
+    /api/query/stream and /api/conversations requests from a pool of cookie
+    identified users. Reports throughput, latency percentiles per scenario, time
+    to first token for streams, and the DB stage and event-loop lag histograms
+    scraped from /metrics.
+
+    Results can be saved as a named baseline and compared on a later run; the
+    exit status is 1 when a comparison finds a regression.
+
+    Usage (from the repository root):
+        python -m app.benchmarks.load_test --rps 20 --duration 30 --save main
+        python -m app.benchmarks.load_test --rps 20 --duration 30 --compare main
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from collections import defaultdict
+
+import httpx
+from prometheus_client.parser import text_string_to_metric_families
+
+from app.benchmarks import fake_provider
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_DIR = os.path.dirname(APP_DIR)
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+METRICS_DIR = os.path.join(APP_DIR, "load_test_metrics")
+
+QUESTIONS = [
+    "What are the obligations of a tenant under a lease?",
+    "How is a contract formed under Kenyan law?",
+    "What remedies exist for breach of contract?",
+    "How do I register a company?",
+    "What is the limitation period for a civil claim?",
+    "Can a landlord evict a tenant without notice?",
+]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values, q: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))]
+
+
+def check_running(*processes):
+    for process in processes:
+        if process.poll() is not None:
+            raise RuntimeError(f"{process.args[2]} exited early with status {process.returncode}")
+
+
+async def wait_until_ready(url: str, *processes, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            check_running(*processes)
+            try:
+                await client.get(url)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def start_servers(args) -> tuple:
+    provider_port, app_port = free_port(), free_port()
+    provider_args = [
+        "--port", str(provider_port),
+        "--ttft", str(args.ttft),
+        "--ttft-sigma", str(args.ttft_sigma),
+        "--tokens-per-second", str(args.tokens_per_second),
+        "--output-tokens", str(args.output_tokens),
+        "--error-rate", str(args.error_rate),
+    ]
+    env = {**os.environ, "PYTHONPATH": REPO_DIR}
+    provider = subprocess.Popen([sys.executable, "-m", "app.benchmarks.fake_provider", *provider_args], cwd=REPO_DIR, env=env)
+
+    database = os.path.join(APP_DIR, "load_test.db")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(database + suffix):
+            os.remove(database + suffix)
+
+    app_env = {
+        **env,
+        "DATABASE_URL": f"sqlite:///{database}",
+        "LLM_PROVIDER": "claude",
+        "LLM_API_KEY": "load-test",
+        "CLAUDE_BASE_URL": f"http://127.0.0.1:{provider_port}",
+        "LLM_FALLBACK_PROVIDERS": "",
+        "RESPONSE_CACHE_BACKEND": "memory" if args.cache else "none",
+        "RATE_LIMIT_BACKEND": "none",
+        "JOB_WORKERS": "0",
+        # Workers would all migrate the same fresh database at once
+        "DB_MIGRATE_ON_STARTUP": "false",
+    }
+    if args.workers > 1:
+        # Aggregate /metrics over every worker, not just the one scraped
+        shutil.rmtree(METRICS_DIR, ignore_errors=True)
+        os.makedirs(METRICS_DIR)
+        app_env["PROMETHEUS_MULTIPROC_DIR"] = METRICS_DIR
+
+    try:
+        subprocess.run([sys.executable, "-m", "app.db.migrate"], cwd=REPO_DIR, env=app_env, check=True)
+    except subprocess.CalledProcessError:
+        provider.terminate()
+        raise
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(app_port), "--workers", str(args.workers), "--log-level", "warning"],
+        cwd=APP_DIR,
+        env=app_env,
+    )
+    return provider, server, f"http://127.0.0.1:{provider_port}", f"http://127.0.0.1:{app_port}"
+
+
+class VirtualUser:
+    def __init__(self):
+        self.user_id = str(uuid.uuid4())
+        self.conversation_id = None
+
+    def query_body(self) -> dict:
+        body = {"query": random.choice(QUESTIONS) + f" ({uuid.uuid4().hex[:6]})"}
+        if self.conversation_id:
+            body["conversation_id"] = self.conversation_id
+        return body
+
+
+class LoadTest:
+    def __init__(self, base_url: str, users: int):
+        self.base_url = base_url
+        self.users = [VirtualUser() for _ in range(users)]
+        self.latencies = defaultdict(list)
+        self.ttft = []
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    async def query(self, client: httpx.AsyncClient, user: VirtualUser):
+        response = await client.post("/api/query", json=user.query_body(), cookies={"user_id": user.user_id})
+        if response.status_code == 200:
+            user.conversation_id = user.conversation_id or response.json()["conversation_id"]
+        return response.status_code
+
+    async def stream(self, client: httpx.AsyncClient, user: VirtualUser, started: float):
+        async with client.stream("POST", "/api/query/stream", json=user.query_body(), cookies={"user_id": user.user_id}) as response:
+            first = True
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                event = json.loads(line)
+                if event["type"] == "delta" and first:
+                    self.ttft.append(time.perf_counter() - started)
+                    first = False
+                elif event["type"] == "done":
+                    user.conversation_id = user.conversation_id or event["conversation_id"]
+                elif event["type"] == "error":
+                    return "stream-error"
+            return response.status_code
+
+    async def conversations(self, client: httpx.AsyncClient, user: VirtualUser):
+        response = await client.get("/api/conversations", cookies={"user_id": user.user_id})
+        return response.status_code
+
+    async def one(self, client: httpx.AsyncClient, scenario: str):
+        user = random.choice(self.users)
+        started = time.perf_counter()
+        try:
+            if scenario == "query":
+                status = await self.query(client, user)
+            elif scenario == "stream":
+                status = await self.stream(client, user, started)
+            else:
+                status = await self.conversations(client, user)
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        self.statuses[scenario][str(status)] += 1
+        if status == 200:
+            self.latencies[scenario].append(time.perf_counter() - started)
+
+    async def run(self, rps: float, duration: float, mix: dict, max_inflight: int) -> float:
+        """
+            Open loop: requests start on a Poisson schedule whether or not earlier ones have finished
+        """
+        scenarios, weights = zip(*mix.items())
+        limits = httpx.Limits(max_connections=max_inflight, max_keepalive_connections=max_inflight)
+        async with httpx.AsyncClient(base_url=self.base_url, limits=limits, timeout=120) as client:
+            tasks = []
+            started = time.perf_counter()
+            next_at = started
+            while next_at - started < duration:
+                delay = next_at - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.create_task(self.one(client, random.choices(scenarios, weights)[0])))
+                next_at += random.expovariate(rps)
+            await asyncio.gather(*tasks)
+            return time.perf_counter() - started
+
+
+def histogram_summary(metrics_text: str, name: str, labels: dict = None) -> dict:
+    """
+        Mean and approximate p95 of a Prometheus histogram, from its cumulative buckets
+    """
+    buckets, total, count = [], 0.0, 0.0
+    for family in text_string_to_metric_families(metrics_text):
+        if family.name != name:
+            continue
+        for sample in family.samples:
+            if labels and any(sample.labels.get(k) != v for k, v in labels.items()):
+                continue
+            if sample.name.endswith("_bucket"):
+                buckets.append((float(sample.labels["le"]), sample.value))
+            elif sample.name.endswith("_sum"):
+                total += sample.value
+            elif sample.name.endswith("_count"):
+                count += sample.value
+    return {"count": count, "sum": total, "buckets": sorted(buckets)}
+
+
+def histogram_delta(before: dict, after: dict) -> dict:
+    buckets_before = dict(before["buckets"])
+    count = after["count"] - before["count"]
+    summary = {"count": int(count), "mean": (after["sum"] - before["sum"]) / count if count else None, "p95": None}
+    for bound, value in after["buckets"]:
+        if count and value - buckets_before.get(bound, 0) >= 0.95 * count:
+            summary["p95"] = bound
+            break
+    return summary
+
+
+async def scrape(client: httpx.AsyncClient) -> dict:
+    text = (await client.get("/metrics")).text
+    return {
+        "db_read": histogram_summary(text, "query_stage_duration_seconds", {"stage": "db_read"}),
+        "db_write": histogram_summary(text, "query_stage_duration_seconds", {"stage": "db_write"}),
+        "event_loop_lag": histogram_summary(text, "event_loop_lag_seconds"),
+    }
+
+
+def report(load: LoadTest, elapsed: float, server_before: dict, server_after: dict) -> dict:
+    results = {"elapsed": elapsed, "scenarios": {}, "server": {}}
+    for scenario, statuses in load.statuses.items():
+        latencies = load.latencies[scenario]
+        results["scenarios"][scenario] = {
+            "requests": sum(statuses.values()),
+            "ok": len(latencies),
+            "throughput": len(latencies) / elapsed,
+            "p50": percentile(latencies, 0.50),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99),
+            "statuses": dict(statuses),
+        }
+    if load.ttft:
+        results["scenarios"]["stream"]["ttft_p50"] = percentile(load.ttft, 0.50)
+        results["scenarios"]["stream"]["ttft_p95"] = percentile(load.ttft, 0.95)
+    for name in server_after:
+        results["server"][name] = histogram_delta(server_before[name], server_after[name])
+    return results
+
+
+def ms(value) -> str:
+    return "-" if value is None else f"{value * 1000:.1f}ms"
+
+
+def print_results(results: dict):
+    print(f"\n{'scenario':<14} {'ok/sent':>10} {'req/s':>8} {'p50':>10} {'p95':>10} {'p99':>10}  statuses")
+    for scenario, r in sorted(results["scenarios"].items()):
+        print(
+            f"{scenario:<14} {r['ok']:>5}/{r['requests']:<4} {r['throughput']:>8.2f} "
+            f"{ms(r['p50']):>10} {ms(r['p95']):>10} {ms(r['p99']):>10}  {r['statuses']}"
+        )
+        if "ttft_p50" in r:
+            print(f"{'  first token':<14} {'':>10} {'':>8} {ms(r['ttft_p50']):>10} {ms(r['ttft_p95']):>10}")
+    print(f"\n{'server':<14} {'samples':>10} {'mean':>10} {'p95 <=':>10}")
+    for name, r in results["server"].items():
+        print(f"{name:<14} {r['count']:>10} {ms(r['mean']):>10} {ms(r['p95']):>10}")
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> bool:
+    """
+        Print the change against a baseline; returns True when something regressed beyond the tolerance
+    """
+    regressed = False
+    print(f"\nAgainst baseline (tolerance {tolerance:.0%}):")
+    for scenario, r in sorted(results["scenarios"].items()):
+        base = baseline["scenarios"].get(scenario)
+        if not base:
+            continue
+        for metric, higher_is_worse in (("p50", True), ("p95", True), ("p99", True), ("throughput", False)):
+            if r.get(metric) is None or not base.get(metric):
+                continue
+            change = (r[metric] - base[metric]) / base[metric]
+            worse = change > tolerance if higher_is_worse else change < -tolerance
+            regressed |= worse
+            flag = "  REGRESSION" if worse else ""
+            print(f"  {scenario:<14} {metric:<10} {base[metric]:>10.4f} -> {r[metric]:>10.4f} ({change:+.1%}){flag}")
+    return regressed
+
+
+async def run(args) -> dict:
+    provider, server, provider_url, app_url = start_servers(args)
+    try:
+        await wait_until_ready(app_url + "/", server, provider)
+        load = LoadTest(app_url, args.users)
+        mix = dict((name, float(weight)) for name, weight in (part.split("=") for part in args.mix.split(",")))
+
+        async with httpx.AsyncClient(base_url=app_url) as client:
+            if args.warmup:
+                print(f"Warming up for {args.warmup}s...")
+                await load.run(args.rps, args.warmup, mix, args.max_inflight)
+                check_running(server, provider)
+                load.latencies.clear()
+                load.ttft.clear()
+                load.statuses.clear()
+
+            before = await scrape(client)
+            print(f"Driving {app_url} at {args.rps} req/s for {args.duration}s (mix {mix})...")
+            elapsed = await load.run(args.rps, args.duration, mix, args.max_inflight)
+            check_running(server, provider)
+            after = await scrape(client)
+
+        return report(load, elapsed, before, after)
+    finally:
+        for process in (server, provider):
+            process.terminate()
+            process.wait(timeout=10)
+        shutil.rmtree(METRICS_DIR, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rps", type=float, default=10, help="target request rate")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of measured load")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds of unmeasured load first")
+    parser.add_argument("--users", type=int, default=50, help="distinct user_id cookies")
+    parser.add_argument("--mix", default="query=0.5,stream=0.2,conversations=0.3", help="scenario weights")
+    parser.add_argument("--max-inflight", type=int, default=200, help="client connection limit")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--cache", action="store_true", help="leave the response cache on")
+    parser.add_argument("--save", metavar="NAME", help="save the results as a baseline")
+    parser.add_argument("--compare", metavar="NAME", help="compare against a saved baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    fake_provider.add_arguments(parser)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    results["config"] = {k: v for k, v in vars(args).items() if k not in ("save", "compare")}
+    print_results(results)
+
+    regressed = False
+    if args.compare:
+        with open(os.path.join(BASELINE_DIR, f"{args.compare}.json")) as f:
+            regressed = compare(results, json.load(f), args.tolerance)
+
+    if args.save:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        path = os.path.join(BASELINE_DIR, f"{args.save}.json")
+        with open(path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved baseline to {path}")
+
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
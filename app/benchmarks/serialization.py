@@ -0,0 +1,114 @@
+"""
+    Measure how a large conversation is serialized and how many bytes it takes on the wire.
+
+    Builds an in-memory conversation of N markdown-heavy messages and times
+    each step of the GET /api/conversations/{id} response: validating the ORM
+    rows into ConversationSchema, dumping the model, and rendering it with the
+    standard library json encoder (the previous JSONResponse) or orjson (the
+    ORJSONResponse default). Then reports the body size uncompressed, with
+    gzip and, when the brotli package is installed, with brotli.
+
+    Usage (from the repository root):
+        python -m app.benchmarks.serialization --messages 500
+"""
+import argparse
+import json
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import orjson
+
+from app.api.middleware import brotli, compress
+from app.models.database import Conversation, Message
+from app.models.schema import ConversationSchema
+
+ANSWER = """## Short answer
+
+A landlord may keep part of the **security deposit** only for unpaid rent or
+damage *beyond normal wear and tear*.
+
+### What to check
+
+1. The lease's deposit clause and any move-in inspection report
+2. Whether an itemized list of deductions was sent in time
+3. Local rules on interest and return deadlines
+
+> This is general information, not legal advice.
+
+| Deduction | Usually allowed |
+|-----------|-----------------|
+| Unpaid rent | Yes |
+| Faded paint | No |
+"""
+
+
+def build_conversation(messages: int) -> Conversation:
+    created = datetime.utcnow() - timedelta(days=1)
+    conversation = Conversation(id=str(uuid.uuid4()), user_id=str(uuid.uuid4()), title="Deposit dispute", created_at=created)
+    conversation.messages = [
+        Message(
+            id=str(uuid.uuid4()),
+            conversation_id=conversation.id,
+            role="user" if i % 2 == 0 else "ai",
+            content=f"Can my landlord keep the deposit for item {i}?" if i % 2 == 0 else ANSWER,
+            created_at=created + timedelta(seconds=i * 30),
+            prompt_version=None if i % 2 == 0 else "answer@1",
+        )
+        for i in range(messages)
+    ]
+    return conversation
+
+
+def render_json(content) -> bytes:
+    # What starlette's JSONResponse does
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def timed(fn, samples: int):
+    """
+        Run `fn` repeatedly and return its last result and median time in milliseconds
+    """
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return result, statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=500, help="messages in the conversation")
+    parser.add_argument("--samples", type=int, default=50, help="timed runs per step")
+    args = parser.parse_args()
+
+    conversation = build_conversation(args.messages)
+
+    model, validate_ms = timed(lambda: ConversationSchema.model_validate(conversation), args.samples)
+    content, dump_ms = timed(lambda: model.model_dump(mode="json"), args.samples)
+    body, json_ms = timed(lambda: render_json(content), args.samples)
+    orjson_body, orjson_ms = timed(lambda: orjson.dumps(content), args.samples)
+    assert json.loads(body) == orjson.loads(orjson_body)
+
+    print(f"Conversation with {args.messages} messages\n")
+    print(f"{'step':<28} {'median':>10}")
+    print(f"{'validate from rows':<28} {validate_ms:>8.2f}ms")
+    print(f"{'model_dump':<28} {dump_ms:>8.2f}ms")
+    print(f"{'render with json':<28} {json_ms:>8.2f}ms")
+    print(f"{'render with orjson':<28} {orjson_ms:>8.2f}ms")
+    print(f"{'total before / after':<28} {validate_ms + dump_ms + json_ms:>8.2f}ms / {validate_ms + dump_ms + orjson_ms:.2f}ms")
+
+    print(f"\n{'encoding':<28} {'bytes':>10} {'ratio':>8} {'compress':>10}")
+    print(f"{'identity':<28} {len(orjson_body):>10} {1:>8.2f}")
+    encodings = ["gzip"] + (["br"] if brotli is not None else [])
+    for encoding in encodings:
+        compressed, compress_ms = timed(lambda: compress(orjson_body, encoding), args.samples)
+        print(f"{encoding:<28} {len(compressed):>10} {len(compressed) / len(orjson_body):>8.2f} {compress_ms:>8.2f}ms")
+    if brotli is None:
+        print("(install brotli to measure br)")
+
+
+if __name__ == "__main__":
+    main()
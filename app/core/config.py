@@ -15,6 +15,132 @@ class Settings(BaseSettings):
     LLM_API_KEY: str = os.getenv("LLM_API_KEY", "")
     LLM_PROVIDER: str = os.getenv("LLM_PROVIDER", "gemini")
     LLM_MODEL: str = os.getenv("LLM_MODEL", "claude-3-sonnet-20240229")
+    GEMINI_MODEL: str = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+
+    # Model routing: queries are classified as simple, standard or complex, and
+    # each tier gets its own model (empty: LLM_MODEL / GEMINI_MODEL) and max_tokens
+    MODEL_ROUTING: bool = os.getenv("MODEL_ROUTING", "true").lower() == "true"
+    # "heuristic", or "package.module:function" returning a tier for (query, context)
+    MODEL_ROUTING_CLASSIFIER: str = os.getenv("MODEL_ROUTING_CLASSIFIER", "heuristic")
+    CLAUDE_MODEL_SIMPLE: str = os.getenv("CLAUDE_MODEL_SIMPLE", "")
+    CLAUDE_MODEL_COMPLEX: str = os.getenv("CLAUDE_MODEL_COMPLEX", "")
+    GEMINI_MODEL_SIMPLE: str = os.getenv("GEMINI_MODEL_SIMPLE", "")
+    GEMINI_MODEL_COMPLEX: str = os.getenv("GEMINI_MODEL_COMPLEX", "")
+    MAX_TOKENS_SIMPLE: int = int(os.getenv("MAX_TOKENS_SIMPLE", "512"))
+    MAX_TOKENS_STANDARD: int = int(os.getenv("MAX_TOKENS_STANDARD", "1024"))
+    MAX_TOKENS_COMPLEX: int = int(os.getenv("MAX_TOKENS_COMPLEX", "2048"))
+
+    # Shared HTTP connection pool used by the provider clients
+    LLM_MAX_CONNECTIONS: int = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    LLM_TIMEOUT: float = float(os.getenv("LLM_TIMEOUT", "60"))
+
+    # Per-provider keys, falling back to LLM_API_KEY
+    CLAUDE_API_KEY: str = os.getenv("CLAUDE_API_KEY", "")
+    GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY", "")
+    # Point the Claude client elsewhere, e.g. at app.benchmarks.fake_provider
+    CLAUDE_BASE_URL: str = os.getenv("CLAUDE_BASE_URL", "")
+
+    # Mark prompt prefixes for Claude prompt caching and keep Gemini system
+    # instructions in context caches that live this many seconds
+    PROMPT_CACHE: bool = os.getenv("PROMPT_CACHE", "true").lower() == "true"
+    # Shorter prefixes are not cached by Anthropic, so they are left unmarked
+    PROMPT_CACHE_MIN_TOKENS: int = int(os.getenv("PROMPT_CACHE_MIN_TOKENS", "1024"))
+    GEMINI_CONTEXT_CACHE_TTL: float = float(os.getenv("GEMINI_CONTEXT_CACHE_TTL", "3600"))
+
+    # Provider routing: comma-separated fallbacks tried after LLM_PROVIDER
+    LLM_FALLBACK_PROVIDERS: str = os.getenv("LLM_FALLBACK_PROVIDERS", "")
+    # Seconds allowed for the first token; a full response also gets the time
+    # to generate its max_tokens at LLM_MIN_TOKENS_PER_SECOND
+    LLM_TIMEOUT_CLAUDE: float = float(os.getenv("LLM_TIMEOUT_CLAUDE", "30"))
+    LLM_TIMEOUT_GEMINI: float = float(os.getenv("LLM_TIMEOUT_GEMINI", "30"))
+    LLM_MIN_TOKENS_PER_SECOND: float = float(os.getenv("LLM_MIN_TOKENS_PER_SECOND", "20"))
+    LLM_MAX_RETRIES: int = int(os.getenv("LLM_MAX_RETRIES", "2"))
+    LLM_RETRY_BACKOFF: float = float(os.getenv("LLM_RETRY_BACKOFF", "0.5"))
+    LLM_RETRY_BACKOFF_MAX: float = float(os.getenv("LLM_RETRY_BACKOFF_MAX", "8"))
+    LLM_BREAKER_FAILURES: int = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+    LLM_BREAKER_RESET: float = float(os.getenv("LLM_BREAKER_RESET", "30"))
+    # Start the next provider when the current one passes its observed p95
+    LLM_HEDGE: bool = os.getenv("LLM_HEDGE", "false").lower() == "true"
+    LLM_HEDGE_MIN_SAMPLES: int = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+
+    # Admission control for the LLM endpoints. Rate limits: "memory" (per worker),
+    # "sqlite" (shared by workers) or "none"; concurrency and queue are per worker
+    RATE_LIMIT_BACKEND: str = os.getenv("RATE_LIMIT_BACKEND", "memory")
+    RATE_LIMIT_PATH: str = os.getenv("RATE_LIMIT_PATH", "./rate_limits.db")
+    RATE_LIMIT_PER_MINUTE: float = float(os.getenv("RATE_LIMIT_PER_MINUTE", "20"))
+    RATE_LIMIT_BURST: float = float(os.getenv("RATE_LIMIT_BURST", "10"))
+    # Comma-separated addresses of reverse proxies whose X-Forwarded-For is trusted
+    # when identifying clients; requests from anyone else are keyed by their peer address
+    TRUSTED_PROXIES: str = os.getenv("TRUSTED_PROXIES", "")
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+    LLM_MAX_QUEUE: int = int(os.getenv("LLM_MAX_QUEUE", "64"))
+    LLM_QUEUE_TIMEOUT: float = float(os.getenv("LLM_QUEUE_TIMEOUT", "10"))
+
+    # Compress complete responses of at least this many bytes with brotli (when
+    # installed) or gzip, as negotiated by Accept-Encoding; streams are never compressed
+    COMPRESSION_MIN_SIZE: int = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+
+    # Response cache: "memory" (per worker), "sqlite" (shared by workers) or "none"
+    RESPONSE_CACHE_BACKEND: str = os.getenv("RESPONSE_CACHE_BACKEND", "memory")
+    RESPONSE_CACHE_TTL: float = float(os.getenv("RESPONSE_CACHE_TTL", "86400"))
+    RESPONSE_CACHE_MAXSIZE: int = int(os.getenv("RESPONSE_CACHE_MAXSIZE", "1024"))
+    RESPONSE_CACHE_PATH: str = os.getenv("RESPONSE_CACHE_PATH", "./response_cache.db")
+
+    # Serve a stored answer to a paraphrased question in a new conversation when
+    # the embeddings' cosine similarity reaches the threshold (per worker)
+    SEMANTIC_CACHE: bool = os.getenv("SEMANTIC_CACHE", "false").lower() == "true"
+    SEMANTIC_CACHE_THRESHOLD: float = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.9"))
+    SEMANTIC_CACHE_MAXSIZE: int = int(os.getenv("SEMANTIC_CACHE_MAXSIZE", "10000"))
+    SEMANTIC_CACHE_TTL: float = float(os.getenv("SEMANTIC_CACHE_TTL", "86400"))
+
+    # POST /api/query/batch: items per batch, concurrent LLM calls, rows per bulk write
+    BATCH_MAX_QUERIES: int = int(os.getenv("BATCH_MAX_QUERIES", "500"))
+    BATCH_MAX_PARALLEL: int = int(os.getenv("BATCH_MAX_PARALLEL", "8"))
+    # How long into a batch its items may wait for rate-limit tokens before they are refused with a 429
+    BATCH_RATE_LIMIT_WAIT: float = float(os.getenv("BATCH_RATE_LIMIT_WAIT", "120"))
+    BATCH_WRITE_SIZE: int = int(os.getenv("BATCH_WRITE_SIZE", "50"))
+
+    # Apply Alembic migrations when a worker starts; turn off when several
+    # workers share a database and run `python -m app.db.migrate` before starting them
+    DB_MIGRATE_ON_STARTUP: bool = os.getenv("DB_MIGRATE_ON_STARTUP", "true").lower() == "true"
+
+    # Known user ids and conversation owners cached per worker, and how often
+    # buffered last_seen times are written
+    USER_CACHE_SIZE: int = int(os.getenv("USER_CACHE_SIZE", "100000"))
+    USER_CACHE_TTL: float = float(os.getenv("USER_CACHE_TTL", "600"))
+    LAST_SEEN_FLUSH_INTERVAL: float = float(os.getenv("LAST_SEEN_FLUSH_INTERVAL", "30"))
+
+    # Background jobs for queries submitted with async_mode
+    JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", "4"))
+    JOB_POLL_INTERVAL: float = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+    JOB_LEASE_SECONDS: float = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+    JOB_MAX_ATTEMPTS: int = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+    JOB_MAX_WAIT: float = float(os.getenv("JOB_MAX_WAIT", "30"))
+
+    # Conversation history sent with follow-up questions
+    CONTEXT_MAX_MESSAGES: int = int(os.getenv("CONTEXT_MAX_MESSAGES", "20"))
+    CONTEXT_TOKEN_BUDGET_CLAUDE: int = int(os.getenv("CONTEXT_TOKEN_BUDGET_CLAUDE", "4000"))
+    CONTEXT_TOKEN_BUDGET_GEMINI: int = int(os.getenv("CONTEXT_TOKEN_BUDGET_GEMINI", "8000"))
+    CONTEXT_SUMMARY_BATCH: int = int(os.getenv("CONTEXT_SUMMARY_BATCH", "20"))
+    CONTEXT_SUMMARY_MAX_TOKENS: int = int(os.getenv("CONTEXT_SUMMARY_MAX_TOKENS", "512"))
+
+    # Retrieval over the local statute and case law index
+    RETRIEVAL_INDEX_DIR: str = os.getenv("RETRIEVAL_INDEX_DIR", "./retrieval_index")
+    RETRIEVAL_TOP_K: int = int(os.getenv("RETRIEVAL_TOP_K", "4"))
+    RETRIEVAL_CHUNK_CHARS: int = int(os.getenv("RETRIEVAL_CHUNK_CHARS", "1500"))
+    RETRIEVAL_USE_VECTORS: bool = os.getenv("RETRIEVAL_USE_VECTORS", "false").lower() == "true"
+    # Postings buffered in memory while building an index before a block is spilled to disk
+    RETRIEVAL_INDEX_BLOCK_POSTINGS: int = int(os.getenv("RETRIEVAL_INDEX_BLOCK_POSTINGS", "1000000"))
+
+    # "hashing" for the built-in local embedder, or "package.module:function"
+    EMBEDDING_FUNCTION: str = os.getenv("EMBEDDING_FUNCTION", "hashing")
+    EMBEDDING_DIM: int = int(os.getenv("EMBEDDING_DIM", "256"))
+
+    # Documents uploaded to conversations
+    DOCUMENT_STORAGE_DIR: str = os.getenv("DOCUMENT_STORAGE_DIR", "./uploads")
+    DOCUMENT_MAX_BYTES: int = int(os.getenv("DOCUMENT_MAX_BYTES", str(200 * 1024 * 1024)))
+    INGESTION_WORKERS: int = int(os.getenv("INGESTION_WORKERS", "2"))
 
     class Config:
         env_file = ".env"
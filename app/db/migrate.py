@@ -0,0 +1,57 @@
+"""
+    Bring the database schema up to date with the Alembic migrations, which
+    are the source of truth for the schema.
+
+    The API runs this once per process at startup. With several workers, set
+    DB_MIGRATE_ON_STARTUP=false and migrate once before starting them:
+        python -m app.db.migrate
+"""
+import os
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, inspect
+
+from app.db.database import SYNC_DATABASE_URL
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), "..", "migrations")
+
+# Revision matching the tables create_all produced before migrations were used
+INITIAL_REVISION = "b30505c63843"
+
+_migrated = set()
+
+
+def alembic_config(url: str = SYNC_DATABASE_URL) -> Config:
+    # No ini file, so alembic leaves the application's logging alone
+    config = Config()
+    config.set_main_option("script_location", MIGRATIONS_DIR)
+    config.set_main_option("sqlalchemy.url", url)
+    return config
+
+
+def upgrade(url: str = SYNC_DATABASE_URL):
+    """
+        Migrate a database to the latest revision, once per process
+    """
+    if url in _migrated:
+        return
+    config = alembic_config(url)
+
+    engine = create_engine(url)
+    try:
+        with engine.connect() as connection:
+            tables = inspect(connection).get_table_names()
+    finally:
+        engine.dispose()
+    if "users" in tables and "alembic_version" not in tables:
+        # Created by create_all before migrations were used
+        command.stamp(config, INITIAL_REVISION)
+
+    command.upgrade(config, "head")
+    _migrated.add(url)
+
+
+if __name__ == "__main__":
+    upgrade()
+    print("Database is at the latest revision")
@@ -1,28 +1,81 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.routes import router as api_router
+from app.api.documents import router as documents_router
+from app.api.middleware import AdmissionMiddleware, CompressionMiddleware, LastSeenMiddleware, MetricsMiddleware
 from app.core.config import settings
-from app.models.database import Base
-from app.db.database import engine
+from app.db.database import async_engine
+from app.services.llm_service import clients
+from app.services.retrieval import retriever
+from app.services.ingestion import ingestion_pool
+from app.services.admission import llm_limiter
+from app.services.jobs import job_pool
+from app.services.sessions import sessions
+from app.services import metrics
 
-Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.DB_MIGRATE_ON_STARTUP:
+        from app.db import migrate
+
+        # The migrations own the schema; they run off the event loop
+        await asyncio.to_thread(migrate.upgrade)
+    # Provider clients are shared by every request for the worker's lifetime
+    await clients.start()
+    # The retrieval index is loaded once per worker, not per request
+    retriever.load()
+    llm_limiter.start()
+    job_pool.start(async_engine)
+    sessions.start(async_engine)
+    loop_monitor = asyncio.create_task(metrics.monitor_event_loop())
+    yield
+    loop_monitor.cancel()
+    await job_pool.close()
+    await sessions.close()
+    await ingestion_pool.close()
+    retriever.close()
+    await clients.close()
 
 app = FastAPI(
     title="Legal Assistant AI aPI",
     description="API for legal assistant AI application",
     version="1.0.0.0",
+    lifespan=lifespan,
+    # orjson serializes the (message-heavy) response models much faster than json
+    default_response_class=ORJSONResponse,
 )
 
+# Innermost, so the metrics include the time spent compressing
+app.add_middleware(CompressionMiddleware, minimum_size=settings.COMPRESSION_MIN_SIZE)
+
+app.add_middleware(LastSeenMiddleware)
+
+# Added before CORS so rejected requests still carry CORS headers
+app.add_middleware(AdmissionMiddleware)
+
+# Wraps admission control, so rejected requests are measured too
+app.add_middleware(MetricsMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.CORS_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Retry-After"],
 )
 
 app.include_router(api_router, prefix="/api")
+app.include_router(documents_router, prefix="/api")
 
 @app.get("/")
 async def root():
     return {"message": "Welcome to the legal assistant AI API"}
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    payload, content_type = metrics.render()
+    return Response(content=payload, media_type=content_type)
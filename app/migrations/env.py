@@ -1,3 +1,5 @@
+import os
+import sys
 from logging.config import fileConfig
 
 from sqlalchemy import engine_from_config
@@ -5,6 +7,12 @@ from sqlalchemy import pool
 
 from alembic import context
 
+# Make the app package importable when alembic is run from the app directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from app.db.database import SYNC_DATABASE_URL
+from app.models.database import Base
+
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
@@ -18,7 +26,19 @@ if config.config_file_name is not None:
 # for 'autogenerate' support
 # from myapp import mymodel
 # target_metadata = mymodel.Base.metadata
-target_metadata = None
+target_metadata = Base.metadata
+
+# Migrations always run on the sync driver; fall back to the app's DATABASE_URL
+# when alembic.ini still holds the placeholder URL.
+if config.get_main_option("sqlalchemy.url", "").startswith("driver://"):
+    config.set_main_option("sqlalchemy.url", SYNC_DATABASE_URL)
+
+
+
+def include_name(name, type_, parent_names):
+    # The full-text search tables are managed by hand (see 3d05063f91a7)
+    return not (type_ == "table" and name.startswith("messages_fts"))
+
 
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
@@ -44,6 +64,7 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        include_name=include_name,
     )
 
     with context.begin_transaction():
@@ -65,7 +86,7 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata, include_name=include_name
         )
 
         with context.begin_transaction():
@@ -0,0 +1,64 @@
+"""message search
+
+Revision ID: 3d05063f91a7
+Revises: 072d9d5bbff0
+Create Date: 2026-10-18 09:03:40.822870
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3d05063f91a7'
+down_revision: Union[str, None] = '072d9d5bbff0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        op.execute(
+            "CREATE VIRTUAL TABLE messages_fts USING fts5("
+            "content, owner, conversation_id UNINDEXED, tokenize='porter unicode61')"
+        )
+        op.execute(
+            "CREATE TRIGGER messages_fts_insert AFTER INSERT ON messages BEGIN "
+            "INSERT INTO messages_fts (rowid, content, owner, conversation_id) "
+            "SELECT new.rowid, new.content, conversations.user_id, new.conversation_id "
+            "FROM conversations WHERE conversations.id = new.conversation_id; END"
+        )
+        op.execute(
+            "CREATE TRIGGER messages_fts_delete AFTER DELETE ON messages BEGIN "
+            "DELETE FROM messages_fts WHERE rowid = old.rowid; END"
+        )
+        op.execute(
+            "CREATE TRIGGER messages_fts_update AFTER UPDATE OF content ON messages BEGIN "
+            "UPDATE messages_fts SET content = new.content WHERE rowid = old.rowid; END"
+        )
+        op.execute(
+            "INSERT INTO messages_fts (rowid, content, owner, conversation_id) "
+            "SELECT messages.rowid, messages.content, conversations.user_id, messages.conversation_id "
+            "FROM messages JOIN conversations ON conversations.id = messages.conversation_id"
+        )
+    elif dialect == "postgresql":
+        op.execute(
+            "ALTER TABLE messages ADD COLUMN search_vector tsvector "
+            "GENERATED ALWAYS AS (to_tsvector('english', coalesce(content, ''))) STORED"
+        )
+        op.create_index("ix_messages_search_vector", "messages", ["search_vector"], postgresql_using="gin")
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        op.execute("DROP TRIGGER messages_fts_update")
+        op.execute("DROP TRIGGER messages_fts_delete")
+        op.execute("DROP TRIGGER messages_fts_insert")
+        op.execute("DROP TABLE messages_fts")
+    elif dialect == "postgresql":
+        op.drop_index("ix_messages_search_vector", table_name="messages")
+        op.execute("ALTER TABLE messages DROP COLUMN search_vector")
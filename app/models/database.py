@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Text, DateTime, ForeignKey, create_engine
+from sqlalchemy import Column, String, Text, DateTime, ForeignKey, Index, Integer, Boolean, DDL, create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 import datetime
@@ -20,10 +20,18 @@ class Conversation(Base):
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = Column(String, ForeignKey("users.id"))
     title = Column(String, nullable=True)
+    # Rolling summary of the turns that no longer fit in the context window
+    summary = Column(Text, nullable=True)
+    summary_until = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
     user = relationship("User", back_populates="conversations")
-    messages = relationship("Message", back_populates="conversation")
+    messages = relationship("Message", back_populates="conversation", order_by="(Message.created_at, Message.id)")
+
+    __table_args__ = (
+        # Newest-first conversation listing for a user
+        Index("ix_conversations_user_id_updated_at", user_id, updated_at.desc()),
+    )
 
 class Message(Base):
     __tablename__ = "messages"
@@ -33,4 +41,74 @@ class Message(Base):
     role = Column(String)  # "user" or "ai"
     content = Column(Text)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    # Prompt template that produced an "ai" message, e.g. "answer@1"
+    prompt_version = Column(String, nullable=True)
+    # Model tier, model and LLM time of a generated "ai" message; null when served from a cache
+    route = Column(String, nullable=True)
+    model = Column(String, nullable=True)
+    latency_ms = Column(Integer, nullable=True)
     conversation = relationship("Conversation", back_populates="messages")
+
+    __table_args__ = (
+        # Keyset pagination of a conversation's messages
+        Index("ix_messages_conversation_id_created_at", "conversation_id", "created_at", "id"),
+    )
+
+# Full-text index over message content for SQLite, kept current by triggers.
+# Migration 3d05063f91a7 creates the same objects (and a tsvector column on Postgres);
+# these hooks cover databases built with create_all.
+MESSAGE_SEARCH_DDL = (
+    "CREATE VIRTUAL TABLE messages_fts USING fts5("
+    "content, owner, conversation_id UNINDEXED, tokenize='porter unicode61')",
+    "CREATE TRIGGER messages_fts_insert AFTER INSERT ON messages BEGIN "
+    "INSERT INTO messages_fts (rowid, content, owner, conversation_id) "
+    "SELECT new.rowid, new.content, conversations.user_id, new.conversation_id "
+    "FROM conversations WHERE conversations.id = new.conversation_id; END",
+    "CREATE TRIGGER messages_fts_delete AFTER DELETE ON messages BEGIN "
+    "DELETE FROM messages_fts WHERE rowid = old.rowid; END",
+    "CREATE TRIGGER messages_fts_update AFTER UPDATE OF content ON messages BEGIN "
+    "UPDATE messages_fts SET content = new.content WHERE rowid = old.rowid; END",
+)
+
+for statement in MESSAGE_SEARCH_DDL:
+    event.listen(Message.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+
+class Document(Base):
+    __tablename__ = "documents"
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    conversation_id = Column(String, ForeignKey("conversations.id"), index=True)
+    filename = Column(String)
+    content_type = Column(String, nullable=True)
+    size = Column(Integer, default=0)
+    path = Column(String)
+    status = Column(String, default="pending")  # "pending", "processing", "indexed" or "failed"
+    error = Column(Text, nullable=True)
+    chunk_count = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    # Not a foreign key: a new user's row is only written once their first answer is saved
+    user_id = Column(String)
+    conversation_id = Column(String, nullable=True)
+    conversation_title = Column(String, nullable=True)
+    query = Column(Text)
+    bypass_cache = Column(Boolean, default=False)
+    status = Column(String, default="queued")  # "queued", "running", "succeeded" or "failed"
+    response = Column(Text, nullable=True)
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, default=0)
+    # A running job whose lease has expired is picked up again by another worker
+    lease_until = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # Oldest claimable job first
+        Index("ix_jobs_status_created_at", "status", "created_at"),
+    )
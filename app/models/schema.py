@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import Optional, List
 from datetime import datetime
 
@@ -6,25 +6,97 @@ class QueryRequest(BaseModel):
     query: str
     conversation_id: Optional[str] = None
     conversation_title: Optional[str] = None
+    bypass_cache: bool = False
+    # Queue the query and return a job to poll instead of waiting for the answer
+    async_mode: bool = False
+
+class BatchQueryRequest(BaseModel):
+    queries: List[QueryRequest]
 
 class QueryResponse(BaseModel):
     response: str
     conversation_id: Optional[str] = None
     cookie: Optional[dict] = None
+    # True when the answer was served from the response or semantic cache
+    cached: bool = False
 
 class MessageSchema(BaseModel):
+    id: Optional[str] = None
     role: str
     content: str
     created_at: datetime
-    
-    class Config:
-        orm_mode = True
+    prompt_version: Optional[str] = None
+    route: Optional[str] = None
+    model: Optional[str] = None
+    latency_ms: Optional[int] = None
+
+    model_config = ConfigDict(from_attributes=True)
 
 class ConversationSchema(BaseModel):
     id: str
     title: Optional[str]
     created_at: datetime
     messages: List[MessageSchema]
-    
-    class Config:
-        orm_mode = True
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class ConversationSummarySchema(BaseModel):
+    id: str
+    title: Optional[str]
+    created_at: datetime
+    updated_at: Optional[datetime]
+    message_count: int
+    last_message_preview: Optional[str] = None
+
+
+class MessagePageSchema(BaseModel):
+    messages: List[MessageSchema]
+    # Pass as ?before= to load older messages; None when there are none
+    before_cursor: Optional[str] = None
+    # Pass as ?after= to poll for messages newer than this page
+    after_cursor: Optional[str] = None
+
+
+class DocumentSchema(BaseModel):
+    id: str
+    conversation_id: str
+    filename: str
+    content_type: Optional[str] = None
+    size: int
+    status: str
+    error: Optional[str] = None
+    chunk_count: int
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class JobSchema(BaseModel):
+    id: str
+    status: str
+    conversation_id: Optional[str] = None
+    response: Optional[str] = None
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class SearchResultSchema(BaseModel):
+    conversation_id: str
+    title: Optional[str] = None
+    updated_at: Optional[datetime] = None
+    # The best matching message in the conversation
+    message_id: str
+    role: str
+    created_at: datetime
+    # Excerpt of that message with the matched terms wrapped in **
+    snippet: str
+    # Matching messages in the conversation
+    hits: int
+    # Relevance of the best match; higher is better
+    rank: float
@@ -0,0 +1,233 @@
+import asyncio
+import math
+import random
+import sqlite3
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Optional, Tuple
+
+from app.core.config import settings
+
+
+class AdmissionRejected(Exception):
+    """
+        Raised when a request is turned away; carries the HTTP status and a retry hint
+    """
+
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+def refill(tokens: float, updated_at: float, now: float, rate: float, burst: float) -> Tuple[float, float]:
+    """
+        Take one token from a bucket; returns the tokens left and the seconds to
+        wait before a token is available (0 when one was taken)
+    """
+    tokens = min(burst, tokens + (now - updated_at) * rate)
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / rate
+
+
+class MemoryRateLimitBackend:
+    """
+        Token buckets held in this worker's memory
+    """
+
+    def __init__(self, maxsize: int = 100000):
+        self._buckets = {}
+        self._maxsize = maxsize
+
+    async def take(self, key: str, rate: float, burst: float) -> float:
+        now = time.time()
+        tokens, updated_at = self._buckets.pop(key, (burst, now))
+        tokens, wait = refill(tokens, updated_at, now, rate, burst)
+        # Re-inserting keeps the dict ordered from least to most recently seen
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self._maxsize:
+            del self._buckets[next(iter(self._buckets))]
+        return wait
+
+    async def clear(self):
+        self._buckets.clear()
+
+
+class SQLiteRateLimitBackend:
+    """
+        Token buckets stored in a SQLite table so every gunicorn worker on the host shares them
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limits ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def _take(self, key: str, rate: float, burst: float) -> float:
+        with self._lock:
+            conn = self._connect()
+            # Take the write lock up front so workers cannot interleave read-modify-write
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                row = conn.execute("SELECT tokens, updated_at FROM rate_limits WHERE key = ?", (key,)).fetchone()
+                tokens, wait = refill(*(row or (burst, now)), now, rate, burst)
+                conn.execute(
+                    "INSERT OR REPLACE INTO rate_limits (key, tokens, updated_at) VALUES (?, ?, ?)",
+                    (key, tokens, now),
+                )
+                if random.random() < 0.01:
+                    conn.execute("DELETE FROM rate_limits WHERE updated_at < ?", (now - burst / rate,))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            return wait
+
+    def _clear(self):
+        with self._lock:
+            self._connect().execute("DELETE FROM rate_limits")
+
+    async def take(self, key: str, rate: float, burst: float) -> float:
+        return await asyncio.to_thread(self._take, key, rate, burst)
+
+    async def clear(self):
+        await asyncio.to_thread(self._clear)
+
+
+class RateLimiter:
+    """
+        Per-client token bucket limiter over a pluggable backend
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend
+
+    async def check(self, key: str):
+        """
+            Take a token for the client or raise a 429
+        """
+        if self.backend is None:
+            return
+        rate = settings.RATE_LIMIT_PER_MINUTE / 60
+        try:
+            wait = await self.backend.take(key, rate, settings.RATE_LIMIT_BURST)
+        except Exception as e:
+            # Fail open: an unavailable limiter store must not take the API down
+            print(f"Error checking rate limit: {e}")
+            return
+        if wait > 0:
+            raise AdmissionRejected(429, "Too many requests", wait)
+
+    async def acquire(self, key: str, deadline: float):
+        """
+            Wait for a token for the client, or raise a 429 if none is available
+            before `deadline` (a time.monotonic() value)
+        """
+        if self.backend is None:
+            return
+        rate = settings.RATE_LIMIT_PER_MINUTE / 60
+        while True:
+            try:
+                wait = await self.backend.take(key, rate, settings.RATE_LIMIT_BURST)
+            except Exception as e:
+                print(f"Error checking rate limit: {e}")
+                return
+            if wait <= 0:
+                return
+            if time.monotonic() + wait > deadline:
+                raise AdmissionRejected(429, "Too many requests", wait)
+            # Other waiters may take the refilled token first, so try again after sleeping
+            await asyncio.sleep(wait)
+
+    async def clear(self):
+        if self.backend is not None:
+            await self.backend.clear()
+
+
+class ConcurrencyLimiter:
+    """
+        Caps concurrent LLM-bound requests in this worker behind a bounded wait queue.
+
+        Requests beyond the cap wait for a slot; once the queue is full, or a
+        wait exceeds the timeout, they are rejected with a 503 instead.
+    """
+
+    def __init__(self):
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.limit = 0
+        self.active = 0
+        self.waiting = 0
+        # Moving average of how long a slot is held, used for the retry hint
+        self._hold_time = 1.0
+
+    def start(self):
+        self.limit = settings.LLM_MAX_CONCURRENCY
+        self._semaphore = asyncio.Semaphore(self.limit)
+        self.active = 0
+        self.waiting = 0
+
+    def retry_after(self) -> float:
+        return self._hold_time * (self.waiting + 1) / max(self.limit, 1)
+
+    @asynccontextmanager
+    async def slot(self):
+        if self._semaphore is None:
+            self.start()
+
+        if self.active + self.waiting >= self.limit + settings.LLM_MAX_QUEUE:
+            raise AdmissionRejected(503, "Server is busy", self.retry_after())
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), settings.LLM_QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise AdmissionRejected(503, "Server is busy", self.retry_after())
+        finally:
+            self.waiting -= 1
+
+        self.active += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+            self._hold_time = 0.9 * self._hold_time + 0.1 * (time.monotonic() - started)
+
+
+def retry_after_header(seconds: float) -> str:
+    return str(max(1, math.ceil(seconds)))
+
+
+def build_rate_limiter() -> RateLimiter:
+    """
+        Create the rate limiter for the backend selected in settings
+    """
+    backend = settings.RATE_LIMIT_BACKEND
+    if backend == "memory":
+        return RateLimiter(MemoryRateLimitBackend())
+    elif backend == "sqlite":
+        return RateLimiter(SQLiteRateLimitBackend(settings.RATE_LIMIT_PATH))
+    elif backend == "none":
+        return RateLimiter()
+    else:
+        raise NotImplementedError(f"Rate limit backend {backend} not implemented")
+
+
+rate_limiter = build_rate_limiter()
+llm_limiter = ConcurrencyLimiter()
@@ -0,0 +1,203 @@
+import asyncio
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from cachetools import TTLCache
+
+from app.core.config import settings
+
+
+def normalize_query(query: str) -> str:
+    """
+        Normalize a query so trivially different phrasings share a cache entry
+    """
+    query = re.sub(r"\s+", " ", query).strip().casefold()
+    return query.rstrip("?.! ")
+
+
+def make_cache_key(query: str, provider: str, model: str, system_prompt: str, params: dict) -> str:
+    """
+        Build a cache key from everything that influences the generated answer
+    """
+    payload = json.dumps(
+        {
+            "query": normalize_query(query),
+            "provider": provider,
+            "model": model,
+            "system": system_prompt,
+            "params": params,
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MemoryCacheBackend:
+    """
+        In-process LRU cache with a per-entry TTL
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def get(self, key: str) -> Optional[str]:
+        return self._cache.get(key)
+
+    async def set(self, key: str, value: str):
+        self._cache[key] = value
+
+    async def clear(self):
+        self._cache.clear()
+
+
+class SQLiteCacheBackend:
+    """
+        Cache stored in a SQLite table so every gunicorn worker on the host shares it
+    """
+
+    def __init__(self, path: str, maxsize: int, ttl: float):
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT value, created_at FROM response_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl:
+                conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+                conn.commit()
+                return None
+            conn.execute("UPDATE response_cache SET last_access = ? WHERE key = ?", (now, key))
+            conn.commit()
+            return row[0]
+
+    def _set(self, key: str, value: str):
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, created_at, last_access) "
+                "VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            # Drop expired rows and anything beyond the size bound, least recently used first
+            conn.execute("DELETE FROM response_cache WHERE created_at < ?", (now - self.ttl,))
+            conn.execute(
+                "DELETE FROM response_cache WHERE key IN ("
+                "SELECT key FROM response_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.maxsize,),
+            )
+            conn.commit()
+
+    def _clear(self):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM response_cache")
+            conn.commit()
+
+    async def get(self, key: str) -> Optional[str]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value: str):
+        await asyncio.to_thread(self._set, key, value)
+
+    async def clear(self):
+        await asyncio.to_thread(self._clear)
+
+
+class ResponseCache:
+    """
+        Response cache front-end that counts hits and misses for any backend
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    async def get(self, key: str) -> Optional[str]:
+        if self.backend is None:
+            return None
+        try:
+            value = await self.backend.get(key)
+        except Exception as e:
+            print(f"Error reading response cache: {e}")
+            value = None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: str):
+        if self.backend is None:
+            return
+        try:
+            await self.backend.set(key, value)
+        except Exception as e:
+            print(f"Error writing response cache: {e}")
+
+    async def clear(self):
+        self.hits = 0
+        self.misses = 0
+        if self.backend is not None:
+            await self.backend.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+
+def build_response_cache() -> ResponseCache:
+    """
+        Create the response cache for the backend selected in settings
+    """
+    backend = settings.RESPONSE_CACHE_BACKEND
+    if backend == "memory":
+        return ResponseCache(MemoryCacheBackend(settings.RESPONSE_CACHE_MAXSIZE, settings.RESPONSE_CACHE_TTL))
+    elif backend == "sqlite":
+        return ResponseCache(SQLiteCacheBackend(
+            settings.RESPONSE_CACHE_PATH, settings.RESPONSE_CACHE_MAXSIZE, settings.RESPONSE_CACHE_TTL
+        ))
+    elif backend == "none":
+        return ResponseCache()
+    else:
+        raise NotImplementedError(f"Response cache backend {backend} not implemented")
+
+
+response_cache = build_response_cache()
@@ -0,0 +1,103 @@
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, Dict
+
+
+class SingleFlight:
+    """
+        Coalesce concurrent calls that share a key into one upstream call.
+
+        Every caller awaits the same task, so they all get its result or its
+        exception. A caller being cancelled does not cancel the shared call.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable]):
+        future = self._calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fn())
+            self._calls[key] = future
+            future.add_done_callback(lambda f: self._forget(key, f))
+        return await asyncio.shield(future)
+
+    def _forget(self, key: str, future: asyncio.Future):
+        if self._calls.get(key) is future:
+            del self._calls[key]
+        # Mark the exception as retrieved even if every waiter was cancelled
+        if not future.cancelled():
+            future.exception()
+
+
+class _Broadcast:
+    """
+        Pump one async iterator into a buffer that any number of subscribers replay
+    """
+
+    def __init__(self, source: AsyncIterator):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self._condition = asyncio.Condition()
+        self.task = asyncio.ensure_future(self._pump(source))
+
+    async def _pump(self, source: AsyncIterator):
+        try:
+            async for chunk in source:
+                async with self._condition:
+                    self.chunks.append(chunk)
+                    self._condition.notify_all()
+        except Exception as e:
+            self.error = e
+        finally:
+            async with self._condition:
+                self.done = True
+                self._condition.notify_all()
+
+    async def subscribe(self):
+        position = 0
+        while True:
+            async with self._condition:
+                await self._condition.wait_for(lambda: self.done or len(self.chunks) > position)
+                chunks = self.chunks[position:]
+                done = self.done
+
+            for chunk in chunks:
+                yield chunk
+            position += len(chunks)
+
+            if done and position >= len(self.chunks):
+                if self.error is not None:
+                    raise self.error
+                return
+
+
+class StreamFanout:
+    """
+        Share one upstream stream between concurrent subscribers with the same key.
+
+        Subscribers that join late first receive the chunks already produced.
+    """
+
+    def __init__(self):
+        self._streams: Dict[str, _Broadcast] = {}
+
+    def __len__(self) -> int:
+        return len(self._streams)
+
+    async def subscribe(self, key: str, fn: Callable[[], AsyncIterator]):
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            broadcast = _Broadcast(fn())
+            self._streams[key] = broadcast
+            broadcast.task.add_done_callback(lambda _: self._forget(key, broadcast))
+
+        async for chunk in broadcast.subscribe():
+            yield chunk
+
+    def _forget(self, key: str, broadcast: _Broadcast):
+        if self._streams.get(key) is broadcast:
+            del self._streams[key]
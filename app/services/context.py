@@ -0,0 +1,163 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Optional
+import hashlib
+import json
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.config import settings
+from ..models.database import Conversation, Message
+from .retrieval import retriever
+
+
+@dataclass
+class ConversationContext:
+    """
+        Earlier turns of a conversation that fit in the provider's token budget
+    """
+    history: List[dict] = field(default_factory=list)
+    summary: Optional[str] = None
+    # Passages retrieved from the legal corpus for the current query
+    passages: List[dict] = field(default_factory=list)
+    # Oldest message kept verbatim; everything before it belongs in the summary
+    window_start: Optional[datetime] = None
+    # True when there are turns older than the window that the summary does not cover yet
+    needs_summary: bool = False
+
+    def fingerprint(self) -> str:
+        """
+            Stable digest of the context, used in response cache keys
+        """
+        if not self.history and not self.summary and not self.passages:
+            return ""
+        passages = [(p.get("source"), p.get("section"), p["text"]) for p in self.passages]
+        payload = json.dumps({"history": self.history, "summary": self.summary, "passages": passages}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def estimate_tokens(text: str) -> int:
+    """
+        Cheap token estimate (roughly four characters per token)
+    """
+    return len(text) // 4 + 1
+
+
+def token_budget(provider: str) -> int:
+    if provider == "claude":
+        return settings.CONTEXT_TOKEN_BUDGET_CLAUDE
+    return settings.CONTEXT_TOKEN_BUDGET_GEMINI
+
+
+async def build_context(
+    conversation_id: str,
+    summary: Optional[str],
+    summary_until: Optional[datetime],
+    db: AsyncSession,
+    provider: Optional[str] = None,
+) -> ConversationContext:
+    """
+        Load the most recent messages of a conversation and fit them into the token budget.
+
+        Only messages newer than the stored summary are read, newest first and
+        bounded by CONTEXT_MAX_MESSAGES, so the cost does not grow with the
+        length of the conversation.
+    """
+    stmt = select(Message.role, Message.content, Message.created_at).filter(
+        Message.conversation_id == conversation_id
+    )
+    if summary_until is not None:
+        stmt = stmt.filter(Message.created_at > summary_until)
+    stmt = stmt.order_by(Message.created_at.desc(), Message.id.desc()).limit(settings.CONTEXT_MAX_MESSAGES)
+    rows = (await db.execute(stmt)).all()
+
+    budget = token_budget(provider or settings.LLM_PROVIDER)
+    if summary:
+        budget -= estimate_tokens(summary)
+
+    kept = []
+    for row in rows:
+        cost = estimate_tokens(row.content or "")
+        if cost > budget:
+            break
+        budget -= cost
+        kept.append(row)
+
+    # Anything we could not keep, or could not even load, must be folded into the summary
+    needs_summary = len(kept) < len(rows) or len(rows) == settings.CONTEXT_MAX_MESSAGES
+    kept.reverse()
+
+    return ConversationContext(
+        history=[{"role": row.role, "content": row.content} for row in kept],
+        summary=summary,
+        window_start=kept[0].created_at if kept else None,
+        needs_summary=needs_summary,
+    )
+
+
+def with_passages(context: Optional[ConversationContext], query: str, conversation_id: Optional[str] = None) -> Optional[ConversationContext]:
+    """
+        Attach the top passages from the retrieval indexes for the query, if any
+    """
+    passages = retriever.search(query, conversation_id=conversation_id)
+    if not passages:
+        return context
+    context = context or ConversationContext()
+    context.passages = passages
+    return context
+
+
+async def refresh_summary(conversation_id: str, window_start: Optional[datetime], db: AsyncSession):
+    """
+        Fold turns that fell out of the context window into the conversation's rolling summary.
+
+        Only messages newer than the previous summary are summarized, in bounded
+        batches, so the summary is extended incrementally rather than rebuilt.
+    """
+    from . import llm_service
+
+    row = (await db.execute(
+        select(Conversation.summary, Conversation.summary_until).filter(Conversation.id == conversation_id)
+    )).first()
+    if row is None:
+        return
+
+    stmt = select(Message.role, Message.content, Message.created_at).filter(
+        Message.conversation_id == conversation_id
+    )
+    if row.summary_until is not None:
+        stmt = stmt.filter(Message.created_at > row.summary_until)
+    if window_start is not None:
+        stmt = stmt.filter(Message.created_at < window_start)
+    stmt = stmt.order_by(Message.created_at, Message.id).limit(settings.CONTEXT_SUMMARY_BATCH)
+    messages = (await db.execute(stmt)).all()
+    await db.commit()
+    if not messages:
+        return
+
+    summary = await llm_service.summarize_conversation(
+        row.summary,
+        [{"role": m.role, "content": m.content} for m in messages],
+    )
+
+    # Only apply the new summary if no other worker extended it in the meantime
+    current = Conversation.summary_until.is_(None) if row.summary_until is None else Conversation.summary_until == row.summary_until
+    await db.execute(
+        update(Conversation)
+        .where(Conversation.id == conversation_id, current)
+        .values(summary=summary, summary_until=messages[-1].created_at, updated_at=Conversation.updated_at)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+
+
+async def refresh_summary_task(conversation_id: str, window_start: Optional[datetime], bind):
+    """
+        Background task wrapper that runs refresh_summary on its own session
+    """
+    try:
+        async with AsyncSession(bind, expire_on_commit=False) as db:
+            await refresh_summary(conversation_id, window_start, db)
+    except Exception as e:
+        print(f"Error refreshing conversation summary: {e}")
@@ -0,0 +1,212 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional
+import uuid
+
+from fastapi import HTTPException
+from sqlalchemy import select, update, insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models.database import User, Conversation, Message
+from .context import ConversationContext, build_context
+from .llm_service import Answer
+from .prompts import ANSWER, prompts
+from .sessions import sessions
+
+
+@dataclass
+class QueryTarget:
+    """
+        Result of the read-only validation done before a query reaches the LLM
+    """
+    conversation_id: str
+    is_new: bool
+    title: Optional[str] = None
+    received_at: Optional[datetime] = None
+    context: Optional[ConversationContext] = None
+
+
+async def resolve_conversation(conversation_id: Optional[str], user_id: str, db: AsyncSession) -> QueryTarget:
+    """
+        Check that the conversation belongs to the user and load its recent
+        history, without writing anything.
+
+        A new conversation gets its id up front so it can be returned to the
+        client before anything is persisted.
+    """
+    received_at = datetime.utcnow()
+
+    if not conversation_id:
+        return QueryTarget(conversation_id=str(uuid.uuid4()), is_new=True, received_at=received_at)
+
+    row = (await db.execute(
+        select(Conversation.id, Conversation.title, Conversation.summary, Conversation.summary_until).filter(
+            Conversation.id == conversation_id,
+            Conversation.user_id == user_id
+        )
+    )).first()
+
+    context = None
+    if row:
+        # The conversation's user row exists, and its owner never changes
+        sessions.add_user(user_id)
+        sessions.add_owner(row.id, user_id)
+        context = await build_context(row.id, row.summary, row.summary_until, db)
+
+    # End the read transaction so no connection is held across the LLM wait
+    await db.commit()
+
+    if not row:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+
+    return QueryTarget(conversation_id=row.id, is_new=False, title=row.title, received_at=received_at, context=context)
+
+
+async def upsert_user(user_id: str, db: AsyncSession):
+    """
+        Insert the user if it does not exist yet, without failing on concurrent inserts
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        stmt = sqlite.insert(User).values(id=user_id).on_conflict_do_nothing(index_elements=["id"])
+    elif dialect == "postgresql":
+        stmt = postgresql.insert(User).values(id=user_id).on_conflict_do_nothing(index_elements=["id"])
+    else:
+        if await db.get(User, user_id) is None:
+            db.add(User(id=user_id))
+        return
+
+    now = datetime.utcnow()
+    await db.execute(stmt.values(created_at=now, last_seen=now))
+
+
+async def save_exchange(
+    target: QueryTarget,
+    user_id: str,
+    conversation_title: Optional[str],
+    query: str,
+    answer: Answer,
+    db: AsyncSession,
+):
+    """
+        Persist the user, conversation and both messages of one exchange in a single transaction
+    """
+    try:
+        if not sessions.known_user(user_id):
+            await upsert_user(user_id, db)
+
+        if target.is_new:
+            db.add(Conversation(id=target.conversation_id, user_id=user_id, title=conversation_title))
+        elif conversation_title and target.title != conversation_title:
+            await db.execute(
+                update(Conversation)
+                .where(Conversation.id == target.conversation_id)
+                .values(title=conversation_title, updated_at=datetime.utcnow())
+            )
+
+        db.add_all([
+            Message(
+                conversation_id=target.conversation_id,
+                role="user",
+                content=query,
+                created_at=target.received_at,
+            ),
+            Message(
+                conversation_id=target.conversation_id,
+                role="ai",
+                content=answer.text,
+                created_at=datetime.utcnow(),
+                prompt_version=prompts.get(ANSWER).id,
+                route=answer.route,
+                model=answer.model,
+                latency_ms=answer.latency_ms,
+            ),
+        ])
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+
+    sessions.add_user(user_id)
+    sessions.add_owner(target.conversation_id, user_id)
+
+
+@dataclass
+class Exchange:
+    """
+        One answered query waiting to be persisted
+    """
+    target: QueryTarget
+    conversation_title: Optional[str]
+    query: str
+    answer: Answer
+    answered_at: datetime
+
+
+async def save_exchanges(exchanges: List[Exchange], user_id: str, db: AsyncSession):
+    """
+        Persist many exchanges for one user in a single transaction, using one
+        multi-row INSERT for the new conversations and one for all the messages
+    """
+    if not exchanges:
+        return
+    try:
+        if not sessions.known_user(user_id):
+            await upsert_user(user_id, db)
+
+        conversations = [
+            {
+                "id": e.target.conversation_id,
+                "user_id": user_id,
+                "title": e.conversation_title,
+                "created_at": e.target.received_at,
+                "updated_at": e.answered_at,
+            }
+            for e in exchanges if e.target.is_new
+        ]
+        if conversations:
+            await db.execute(insert(Conversation).values(conversations))
+
+        for e in exchanges:
+            if not e.target.is_new and e.conversation_title and e.target.title != e.conversation_title:
+                await db.execute(
+                    update(Conversation)
+                    .where(Conversation.id == e.target.conversation_id)
+                    .values(title=e.conversation_title, updated_at=e.answered_at)
+                )
+
+        prompt_version = prompts.get(ANSWER).id
+        messages = []
+        for e in exchanges:
+            messages.append({
+                "id": str(uuid.uuid4()),
+                "conversation_id": e.target.conversation_id,
+                "role": "user",
+                "content": e.query,
+                "created_at": e.target.received_at,
+                "prompt_version": None,
+                "route": None,
+                "model": None,
+                "latency_ms": None,
+            })
+            messages.append({
+                "id": str(uuid.uuid4()),
+                "conversation_id": e.target.conversation_id,
+                "role": "ai",
+                "content": e.answer.text,
+                "created_at": e.answered_at,
+                "prompt_version": prompt_version,
+                "route": e.answer.route,
+                "model": e.answer.model,
+                "latency_ms": e.answer.latency_ms,
+            })
+        await db.execute(insert(Message).values(messages))
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+
+    sessions.add_user(user_id)
+    for e in exchanges:
+        sessions.add_owner(e.target.conversation_id, user_id)
@@ -0,0 +1,64 @@
+import hashlib
+import importlib
+import re
+from typing import Callable, List
+
+import numpy as np
+
+from app.core.config import settings
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def hashing_embedder(texts: List[str], dim: int = None) -> np.ndarray:
+    """
+        Local embedding using the hashing trick over word unigrams and bigrams.
+
+        Needs no model download; returns L2-normalised float32 rows.
+    """
+    dim = dim or settings.EMBEDDING_DIM
+    matrix = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        words = TOKEN_RE.findall(text.lower())
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        for feature in features:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            sign = 1.0 if value & 1 else -1.0
+            matrix[row, (value >> 1) % dim] += sign
+    return normalize(matrix)
+
+
+def normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32)
+
+
+_embedder = None
+
+
+def get_embedder() -> Callable[[List[str]], np.ndarray]:
+    """
+        Return the embedding function selected by EMBEDDING_FUNCTION.
+
+        "hashing" selects the built-in embedder; anything else is imported as
+        "package.module:function" and must map a list of texts to a 2-D array.
+    """
+    global _embedder
+    if _embedder is None:
+        name = settings.EMBEDDING_FUNCTION
+        if name == "hashing":
+            _embedder = hashing_embedder
+        else:
+            module_name, _, attr = name.partition(":")
+            fn = getattr(importlib.import_module(module_name), attr)
+            _embedder = lambda texts: normalize(np.asarray(fn(texts), dtype=np.float32))
+    return _embedder
+
+
+def embed(texts: List[str]) -> np.ndarray:
+    """
+        Embed texts with the configured embedding function
+    """
+    return get_embedder()(texts)
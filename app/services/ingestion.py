@@ -0,0 +1,177 @@
+"""
+    Background ingestion of documents attached to a conversation.
+
+    Text extraction and section chunking run in a process pool so they never
+    block the event loop. Documents are read page by page (PDF) or line by line
+    (text), and chunks are appended to a file as they are produced, so memory
+    stays flat regardless of document size. Each conversation gets its own
+    retrieval index, rebuilt from the chunk files of its indexed documents.
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Dict, Iterator, List
+
+from sqlalchemy import select, update, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.database import Document
+from app.services.retrieval import build_index, chunk_lines
+
+TEXT_EXTENSIONS = (".txt", ".md")
+SUPPORTED_EXTENSIONS = TEXT_EXTENSIONS + (".pdf",)
+
+# pypdf caches every parsed object on the reader, so it is reopened every few pages
+PDF_PAGES_PER_READER = 25
+
+
+def iter_document_lines(path: str) -> Iterator[str]:
+    """
+        Yield the text of a document line by line
+    """
+    if path.lower().endswith(".pdf"):
+        from pypdf import PdfReader
+
+        page_count = len(PdfReader(path).pages)
+        for start in range(0, page_count, PDF_PAGES_PER_READER):
+            reader = PdfReader(path)
+            for number in range(start, min(start + PDF_PAGES_PER_READER, page_count)):
+                text = reader.pages[number].extract_text() or ""
+                for line in text.splitlines(keepends=True):
+                    yield line
+                yield "\n"
+            del reader
+    else:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            yield from f
+
+
+def chunk_document(path: str, chunks_path: str, source: str) -> int:
+    """
+        Extract and chunk a document into a JSON lines file; runs in a worker process
+    """
+    count = 0
+    with open(chunks_path, "w", encoding="utf-8") as out:
+        for chunk in chunk_lines(iter_document_lines(path), source):
+            out.write(json.dumps(chunk) + "\n")
+            count += 1
+    return count
+
+
+def iter_chunk_files(paths) -> Iterator[dict]:
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+
+
+def rebuild_conversation_index(chunk_paths, index_dir: str) -> int:
+    """
+        Rebuild a conversation's index from its documents' chunk files; runs in a worker process
+    """
+    return build_index(iter_chunk_files(chunk_paths), index_dir)
+
+
+def conversation_index_dir(conversation_id: str) -> str:
+    return os.path.join(settings.RETRIEVAL_INDEX_DIR, "conversations", conversation_id)
+
+
+def chunks_path(document: Document) -> str:
+    return f"{document.path}.chunks.jsonl"
+
+
+class IngestionPool:
+    """
+        Process pool plus the asyncio tasks that track each document's ingestion
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._tasks = set()
+        # Per-conversation lock and the number of tasks holding or awaiting it
+        self._index_locks: Dict[str, List] = {}
+
+    def start(self):
+        if self._executor is None:
+            # Forking the running server would copy its threads, locks and open connections
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            self._executor = ProcessPoolExecutor(
+                max_workers=settings.INGESTION_WORKERS, mp_context=multiprocessing.get_context(method)
+            )
+
+    async def close(self):
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def submit(self, document_id: str, bind):
+        """
+            Schedule ingestion of an uploaded document without waiting for it
+        """
+        self.start()
+        task = asyncio.create_task(self._ingest(document_id, bind))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    @asynccontextmanager
+    async def _index_lock(self, conversation_id: str):
+        """
+            Serialize index rebuilds of one conversation; the lock is dropped once nobody needs it
+        """
+        entry = self._index_locks.setdefault(conversation_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._index_locks[conversation_id]
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    async def _ingest(self, document_id: str, bind):
+        async with AsyncSession(bind, expire_on_commit=False) as db:
+            document = await db.get(Document, document_id)
+            if document is None:
+                return
+            conversation_id = document.conversation_id
+            try:
+                await self._set_status(db, document_id, status="processing")
+                count = await self._run(chunk_document, document.path, chunks_path(document), document.filename)
+
+                # Rebuilds of one conversation's index must not interleave
+                async with self._index_lock(conversation_id):
+                    documents = (await db.execute(
+                        select(Document).filter(
+                            Document.conversation_id == conversation_id,
+                            or_(Document.status == "indexed", Document.id == document_id)
+                        ).order_by(Document.created_at)
+                    )).scalars().all()
+                    await db.commit()
+                    await self._run(
+                        rebuild_conversation_index,
+                        [chunks_path(d) for d in documents],
+                        conversation_index_dir(conversation_id),
+                    )
+                    await self._set_status(db, document_id, status="indexed", chunk_count=count)
+            except Exception as e:
+                print(f"Error ingesting document {document_id}: {e}")
+                await db.rollback()
+                await self._set_status(db, document_id, status="failed", error=str(e))
+
+    async def _set_status(self, db: AsyncSession, document_id: str, **values):
+        await db.execute(update(Document).where(Document.id == document_id).values(**values))
+        await db.commit()
+
+
+ingestion_pool = IngestionPool()
@@ -0,0 +1,247 @@
+"""
+    Durable background jobs for queries submitted with async_mode.
+
+    Jobs live in the jobs table of the application database, so they survive
+    restarts and can be picked up by any worker process. Each process runs a
+    small pool of asyncio workers that claim the oldest queued job with a
+    conditional UPDATE, answer it and store the result. A job whose worker died
+    is claimed again once its lease expires, until it has used up
+    JOB_MAX_ATTEMPTS; then it is marked failed.
+
+    Workers normally run inside every API process. To run them separately, set
+    JOB_WORKERS=0 for the API and start:
+        python -m app.services.jobs
+"""
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import select, update, or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.database import Job
+from app.services import llm_service
+from app.services.context import refresh_summary_task, with_passages
+from app.services.conversation_service import resolve_conversation, save_exchange
+from app.services.provider_router import ProviderUnavailable
+
+FINISHED_STATUSES = ("succeeded", "failed")
+
+
+def claimable(now: datetime):
+    return or_(
+        Job.status == "queued",
+        and_(Job.status == "running", Job.lease_until < now, Job.attempts < settings.JOB_MAX_ATTEMPTS),
+    )
+
+
+def abandoned(now: datetime):
+    # Leases that expired on the last allowed attempt: the job keeps crashing or hanging its worker
+    return and_(Job.status == "running", Job.lease_until < now, Job.attempts >= settings.JOB_MAX_ATTEMPTS)
+
+
+class JobWorkerPool:
+    """
+        asyncio workers that process queued jobs from the database
+    """
+
+    def __init__(self):
+        self._bind = None
+        self._workers = []
+        self._wakeup: Optional[asyncio.Event] = None
+        # Per-job event and the number of local waiters on it
+        self._finished: Dict[str, List] = {}
+        # Monotonic time of the next sweep for abandoned jobs
+        self._next_sweep = 0.0
+
+    def start(self, bind, workers: Optional[int] = None):
+        """
+            Start the workers against an engine
+        """
+        self._bind = bind
+        self._wakeup = asyncio.Event()
+        self._next_sweep = 0.0
+        for _ in range(settings.JOB_WORKERS if workers is None else workers):
+            self._workers.append(asyncio.create_task(self._work()))
+
+    async def close(self):
+        for worker in self._workers:
+            worker.cancel()
+        if self._workers:
+            await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def notify(self):
+        """
+            Wake an idle worker after a job has been queued in this process
+        """
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def wait(self, job_id: str, timeout: float):
+        """
+            Wait until a job finishes in this process, or the timeout passes
+        """
+        entry = self._finished.setdefault(job_id, [asyncio.Event(), 0])
+        entry[1] += 1
+        try:
+            await asyncio.wait_for(entry[0].wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            entry[1] -= 1
+            # Jobs finished elsewhere, or unknown ids, must not leave their event behind
+            if entry[1] == 0 and self._finished.get(job_id) is entry:
+                del self._finished[job_id]
+
+    async def _work(self):
+        while True:
+            try:
+                self._wakeup.clear()
+                job = await self._claim()
+                if job is None:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), settings.JOB_POLL_INTERVAL)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error in job worker: {e}")
+                await asyncio.sleep(settings.JOB_POLL_INTERVAL)
+
+    async def _claim(self) -> Optional[Job]:
+        """
+            Take the oldest claimable job; the conditional UPDATE makes sure only one worker gets it.
+
+            Abandoned jobs are failed at most once per lease period, so idle
+            polls only read.
+        """
+        async with AsyncSession(self._bind, expire_on_commit=False) as db:
+            while True:
+                now = datetime.utcnow()
+                if time.monotonic() >= self._next_sweep:
+                    self._next_sweep = time.monotonic() + settings.JOB_LEASE_SECONDS
+                    await db.execute(
+                        update(Job).where(abandoned(now)).values(
+                            status="failed",
+                            error="Job did not finish within its attempts",
+                            finished_at=now,
+                        )
+                    )
+                job_id = (await db.execute(
+                    select(Job.id).filter(claimable(now)).order_by(Job.created_at).limit(1)
+                )).scalar()
+                if job_id is None:
+                    await db.commit()
+                    return None
+
+                claimed = await db.execute(
+                    update(Job)
+                    .where(Job.id == job_id, claimable(now))
+                    .values(
+                        status="running",
+                        started_at=now,
+                        lease_until=now + timedelta(seconds=settings.JOB_LEASE_SECONDS),
+                        attempts=Job.attempts + 1,
+                    )
+                )
+                await db.commit()
+                if claimed.rowcount == 1:
+                    return await db.get(Job, job_id, populate_existing=True)
+
+    async def _run(self, job: Job):
+        async with AsyncSession(self._bind, expire_on_commit=False) as db:
+            try:
+                target = await resolve_conversation(job.conversation_id, job.user_id, db)
+                target.context = with_passages(target.context, job.query, None if target.is_new else target.conversation_id)
+                answer = await llm_service.get_cached_llm_response(job.query, context=target.context, bypass_cache=job.bypass_cache, semantic=target.is_new)
+                response = answer.text
+
+                # The job's result is committed with the exchange itself
+                await db.execute(
+                    update(Job).where(Job.id == job.id).values(
+                        status="succeeded",
+                        conversation_id=target.conversation_id,
+                        response=response,
+                        finished_at=datetime.utcnow(),
+                    )
+                )
+                await save_exchange(target, job.user_id, job.conversation_title, job.query, answer, db)
+            except ProviderUnavailable as e:
+                if job.attempts < settings.JOB_MAX_ATTEMPTS:
+                    await self._finish(db, job.id, status="queued", error=str(e))
+                    return
+                await self._finish(db, job.id, status="failed", error=str(e), finished_at=datetime.utcnow())
+                return
+            except HTTPException as e:
+                await self._finish(db, job.id, status="failed", error=str(e.detail), finished_at=datetime.utcnow())
+                return
+            except Exception as e:
+                print(f"Error processing job {job.id}: {e}")
+                await self._finish(db, job.id, status="failed", error=str(e), finished_at=datetime.utcnow())
+                return
+            finally:
+                self._signal(job.id)
+
+        if target.context and target.context.needs_summary:
+            await refresh_summary_task(target.conversation_id, target.context.window_start, self._bind)
+
+    async def _finish(self, db: AsyncSession, job_id: str, **values):
+        await db.rollback()
+        await db.execute(update(Job).where(Job.id == job_id).values(**values))
+        await db.commit()
+
+    def _signal(self, job_id: str):
+        entry = self._finished.pop(job_id, None)
+        if entry is not None:
+            entry[0].set()
+
+
+job_pool = JobWorkerPool()
+
+
+async def submit_job(query: str, conversation_id: Optional[str], conversation_title: Optional[str], user_id: str, bypass_cache: bool, db: AsyncSession) -> Job:
+    """
+        Queue a query for the workers and return the job row
+    """
+    job = Job(
+        user_id=user_id,
+        conversation_id=conversation_id,
+        conversation_title=conversation_title,
+        query=query,
+        bypass_cache=bypass_cache,
+        status="queued",
+        attempts=0,
+        created_at=datetime.utcnow(),
+    )
+    db.add(job)
+    await db.commit()
+    job_pool.notify()
+    return job
+
+
+async def main():
+    from app.db.database import async_engine
+
+    from app.services.retrieval import retriever
+
+    job_pool.start(async_engine, workers=settings.JOB_WORKERS or 1)
+    await llm_service.clients.start()
+    retriever.load()
+    print(f"Processing jobs with {len(job_pool._workers)} workers")
+    try:
+        await asyncio.gather(*job_pool._workers)
+    finally:
+        await job_pool.close()
+        retriever.close()
+        await llm_service.clients.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,88 +1,651 @@
+"""
+    LLM provider calls.
+
+    The provider SDKs are imported on first use, so a process only loads the
+    SDKs of the providers it routes to (LLM_PROVIDER and LLM_FALLBACK_PROVIDERS),
+    and only when the clients are started, not when this module is imported.
+"""
+import asyncio
 import os
-import anthropic
+import sys
+import httpx
 from app.core.config import settings
-# from google.generativeai import genai
-from google import genai
-from google.genai.types import GenerationConfig, GenerateContentConfig
+from app.services.cache import response_cache, make_cache_key
+from app.services.coalescing import SingleFlight, StreamFanout
+from app.services.context import ConversationContext, estimate_tokens
+from app.services.prompts import ANSWER, EPHEMERAL, SUMMARY, PromptTemplate, cacheable, prompts
+from app.services.provider_router import ProviderRouter
+from app.services.semantic_cache import semantic_cache
+from app.services.metrics import LLM_ROUTE_LATENCY, STAGE_LATENCY, record_usage, stage_timer
+from app.services.model_routing import Route, choose_route
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+
+class ProviderClients:
+    """
+        Registry of long-lived async provider clients.
+
+        Clients are built once at application startup and share a bounded
+        HTTP connection pool, so concurrent queries reuse connections instead
+        of opening a new client per call.
+    """
+
+    def __init__(self):
+        self._http_client = None
+        self._clients = {}
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=settings.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+        )
+
+    async def start(self, providers=None):
+        """
+            Build the async clients for the given providers (defaults to the routed ones)
+        """
+        self._http_client = httpx.AsyncClient(
+            limits=self._limits(),
+            timeout=httpx.Timeout(settings.LLM_TIMEOUT),
+        )
+
+        for provider in providers or router.providers():
+            try:
+                self._clients[provider] = self._build(provider)
+            except Exception as e:
+                print(f"Error creating {provider} client: {e}")
+
+    def _api_key(self, provider: str) -> str:
+        return getattr(settings, f"{provider.upper()}_API_KEY", "") or settings.LLM_API_KEY
+
+    def _build(self, provider: str):
+        if provider == "claude":
+            import anthropic
+
+            return anthropic.AsyncAnthropic(
+                api_key=self._api_key(provider),
+                base_url=settings.CLAUDE_BASE_URL or None,
+                http_client=self._http_client,
+                # Retries are left to the provider router
+                max_retries=0,
+            )
+        elif provider == "gemini":
+            from google import genai
+            from google.genai.types import HttpOptions
+
+            # genai owns its httpx client, so give it the same pool bounds and
+            # leave room for the router's timeout on the longest answers
+            timeout = max(settings.LLM_TIMEOUT, router.timeout(provider, settings.MAX_TOKENS_COMPLEX))
+            return genai.Client(
+                api_key=self._api_key(provider),
+                http_options=HttpOptions(
+                    timeout=int(timeout * 1000),
+                    async_client_args={"limits": self._limits()},
+                ),
+            ).aio
+        else:
+            raise NotImplementedError(f"LLM provider {provider} not implemented")
+
+    def get(self, provider: str):
+        """
+            Return the client for a provider, creating it on first use
+        """
+        client = self._clients.get(provider)
+        if client is None:
+            if self._http_client is None:
+                raise Exception("LLM clients have not been started")
+            client = self._clients[provider] = self._build(provider)
+        return client
+
+    async def close(self):
+        """
+            Close every provider client and the shared connection pool
+        """
+        for provider, client in self._clients.items():
+            try:
+                if provider == "gemini":
+                    aclose = getattr(client, "aclose", None)
+                    if aclose is not None:
+                        await aclose()
+                    else:
+                        await client._api_client._async_httpx_client.aclose()
+            except Exception as e:
+                print(f"Error closing {provider} client: {e}")
+        self._clients = {}
+
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
 
-async def get_llm_response(query: str) -> str:
+
+# HTTP statuses worth retrying on the same provider
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+        Whether an error is transient: timeouts, connection failures, rate limits and 5xx
+    """
+    if isinstance(error, (TimeoutError, ConnectionError, httpx.TransportError)):
+        return True
+    # An SDK that was never imported cannot have raised the error
+    anthropic = sys.modules.get("anthropic")
+    if anthropic is not None and isinstance(error, anthropic.APIConnectionError):
+        return True
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    return isinstance(status, int) and (status in RETRYABLE_STATUS_CODES or status >= 500)
+
+
+clients = ProviderClients()
+router = ProviderRouter(retryable=is_retryable)
+
+# Identical concurrent queries share one upstream call or stream
+inflight_requests = SingleFlight()
+inflight_streams = StreamFanout()
+
+
+ANSWER_PROMPT = prompts.get(ANSWER)
+SUMMARY_PROMPT = prompts.get(SUMMARY)
+
+class GeminiContextCache:
     """
-        Get a response from th eLLM based on the provided configured settings
+        Explicit Gemini context caches holding each template's system instruction.
+
+        A cache is created per model and template version on first use, and
+        created again a little before its TTL runs out. Gemini refuses to cache
+        content below a minimum token count; when creation fails the instruction
+        is sent inline until the TTL has passed. Each process keeps its own caches.
     """
 
-    if settings.LLM_PROVIDER == "claude":
-        return await get_claude_response(query)
-    elif settings.LLM_PROVIDER == 'gemini':
-        return await get_gemini_response(query)
+    def __init__(self):
+        self._entries = {}
+        self._locks = {}
+
+    async def name(self, client, model: str, template: PromptTemplate) -> Optional[str]:
+        ttl = settings.GEMINI_CONTEXT_CACHE_TTL
+        if not settings.PROMPT_CACHE or ttl <= 0:
+            return None
+
+        key = (model, template.id)
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] > time.monotonic():
+            return entry[0]
+
+        async with self._locks.setdefault(key, asyncio.Lock()):
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                return entry[0]
+            from google.genai.types import CreateCachedContentConfig
+
+            try:
+                cached = await client.caches.create(model=model, config=CreateCachedContentConfig(
+                    system_instruction=template.system("gemini"),
+                    ttl=f"{int(ttl)}s",
+                    display_name=template.id,
+                ))
+                name = cached.name
+            except Exception as e:
+                print(f"Gemini context cache unavailable for {template.id}: {e}")
+                name = None
+            self._entries[key] = (name, time.monotonic() + ttl * 0.9)
+            return name
+
+    def invalidate(self, model: str, template: PromptTemplate):
+        self._entries.pop((model, template.id), None)
+
+    def clear(self):
+        self._entries.clear()
+
+
+gemini_caches = GeminiContextCache()
+
+
+def _transcript(history) -> str:
+    lines = []
+    for message in history:
+        speaker = "User" if message["role"] == "user" else "Assistant"
+        lines.append(f"{speaker}: {message['content']}")
+    return "\n\n".join(lines)
+
+
+def _with_passages(query: str, context: Optional[ConversationContext]) -> str:
+    if not context or not context.passages:
+        return query
+    sources = []
+    for number, passage in enumerate(context.passages, start=1):
+        heading = " - ".join(part for part in (passage.get("source"), passage.get("section")) if part)
+        sources.append(f"[{number}] {heading}\n{passage['text']}")
+    return (
+        "Use the following excerpts from Kenyan legal documents where they are relevant, "
+        "and cite them by number.\n\n" + "\n\n".join(sources) + f"\n\nQuestion: {query}"
+    )
+
+
+def _claude_messages(query: str, context: Optional[ConversationContext]) -> list:
+    # Claude expects alternating turns that start with the user
+    query = _with_passages(query, context)
+    messages = []
+    for message in (context.history if context else []):
+        role = "user" if message["role"] == "user" else "assistant"
+        if messages and messages[-1]["role"] == role:
+            messages[-1]["content"] += "\n\n" + message["content"]
+        elif messages or role == "user":
+            messages.append({"role": role, "content": message["content"]})
+
+    if messages and messages[-1]["role"] == "user":
+        messages[-1]["content"] += "\n\n" + query
     else:
-        raise NotImplementedError(f"LLM provider {settings.LLM_PROVIDER} not implemented")
-    
-async def get_claude_response(query: str) -> str:
+        messages.append({"role": "user", "content": query})
+    return messages
+
+
+def _cache_history(messages: list, system: list, context: Optional[ConversationContext]) -> list:
+    # Mark the turn before the query so the next turn reads the history prefix
+    # from the prompt cache. A window about to slide (or be summarized) would
+    # change that prefix, so nothing is written that could never be read.
+    if len(messages) < 2 or context is None or context.needs_summary:
+        return messages
+    prefix = sum(estimate_tokens(block["text"]) for block in system)
+    prefix += sum(estimate_tokens(message["content"]) for message in messages[:-1])
+    if cacheable(prefix):
+        previous = messages[-2]
+        previous["content"] = [{"type": "text", "text": previous["content"], "cache_control": EPHEMERAL}]
+    return messages
+
+
+def _claude_request(query: str, context: Optional[ConversationContext] = None, template: PromptTemplate = ANSWER_PROMPT, max_tokens: int = 1024, model: Optional[str] = None) -> dict:
+    system = template.claude_system(context.summary if context else None)
+    return dict(
+        model=model or settings.LLM_MODEL,
+        system=system,
+        max_tokens=max_tokens,
+        messages=_cache_history(_claude_messages(query, context), system, context)
+    )
+
+
+def _gemini_request(query: str, context: Optional[ConversationContext] = None, template: PromptTemplate = ANSWER_PROMPT, max_tokens: int = 1024, cached_content: Optional[str] = None, model: Optional[str] = None) -> dict:
+    parts = []
+    if context and context.summary:
+        parts.append(f"Summary of the earlier conversation: {context.summary}")
+    if context and context.history:
+        parts.append(_transcript(context.history))
+    parts.append(f"User: {_with_passages(query, context)}")
+
+    from google.genai.types import GenerateContentConfig
+
+    return dict(
+        model=model or settings.GEMINI_MODEL,
+        contents="\n\n".join(parts),
+        config=GenerateContentConfig(
+            # A cached instruction replaces the inline one
+            system_instruction=None if cached_content else template.system("gemini"),
+            cached_content=cached_content,
+            temperature=0.3,
+            max_output_tokens=max_tokens,
+            top_p=0.8,
+            top_k=40,
+        )
+    )
+
+
+async def _gemini_call(client, query: str, context: Optional[ConversationContext] = None, template: PromptTemplate = ANSWER_PROMPT, max_tokens: int = 1024, stream: bool = False, model: Optional[str] = None):
+    """
+        Start a Gemini call, using the template's context cache when there is one
+    """
+    model = model or settings.GEMINI_MODEL
+    cached_content = await gemini_caches.name(client, model, template)
+    request = _gemini_request(query, context, template, max_tokens, cached_content, model)
+    try:
+        if stream:
+            return await client.models.generate_content_stream(**request)
+        return await client.models.generate_content(**request)
+    except Exception:
+        if cached_content:
+            # The cache may have expired early; create it again on the next call
+            gemini_caches.invalidate(model, template)
+        raise
+
+
+def response_cache_key(query: str, context: Optional[ConversationContext] = None, route: Optional[Route] = None) -> str:
+    """
+        Cache key for a query under the configured provider, its routed model, prompt, parameters and history
+    """
+    route = route or choose_route(query, context)
+    provider = settings.LLM_PROVIDER
+    if provider == "claude":
+        request = _claude_request("", max_tokens=route.max_tokens, model=route.model(provider))
+        request.pop("system")
+    else:
+        request = _gemini_request("", max_tokens=route.max_tokens, model=route.model(provider))
+        request["config"] = request["config"].model_dump(exclude_none=True, exclude={"system_instruction", "cached_content"})
+    model = request.pop("model")
+    request.pop("messages", None)
+    request.pop("contents", None)
+    request["context"] = context.fingerprint() if context else ""
+    return make_cache_key(query, provider, model, ANSWER_PROMPT.id, request)
+
+
+@dataclass
+class Answer:
+    text: str
+    # "exact" or "semantic" when served from a cache
+    cache: Optional[str] = None
+    similarity: Optional[float] = None
+    # For generated answers: the routed tier, the model that answered and the LLM time
+    route: Optional[str] = None
+    model: Optional[str] = None
+    latency_ms: Optional[int] = None
+
+    @property
+    def cached(self) -> bool:
+        return self.cache is not None
+
+
+class SemanticLookup:
+    """
+        Semantic cache access for one query, embedding it at most once
+    """
+
+    def __init__(self, query: str, enabled: bool, route: Route):
+        self.query = query
+        self.enabled = enabled and settings.SEMANTIC_CACHE
+        self.scope = semantic_scope(route) if self.enabled else None
+        self._vector = None
+
+    def vector(self):
+        if self._vector is None:
+            self._vector = semantic_cache.embed(self.query)
+        return self._vector
+
+    # Embedding and the similarity search are CPU work, so they run in a thread
+    async def get(self) -> Optional[Answer]:
+        if not self.enabled:
+            return None
+        try:
+            hit = await asyncio.to_thread(lambda: semantic_cache.lookup(self.vector(), self.scope))
+        except Exception as e:
+            print(f"Error reading semantic cache: {e}")
+            return None
+        return Answer(hit[0], cache="semantic", similarity=hit[1]) if hit else None
+
+    async def set(self, response: str):
+        if not self.enabled:
+            return
+        try:
+            await asyncio.to_thread(lambda: semantic_cache.add(self.vector(), self.scope, response))
+        except Exception as e:
+            print(f"Error writing semantic cache: {e}")
+
+
+def semantic_scope(route: Route) -> str:
+    # The provider, routed model, prompt and parameters, without a query or context
+    return response_cache_key("", route=route)
+
+
+async def lookup_cached_response(key: str, semantic: SemanticLookup) -> Optional[Answer]:
+    cached = await response_cache.get(key)
+    if cached is not None:
+        return Answer(cached, cache="exact")
+    return await semantic.get()
+
+
+async def get_cached_llm_response(query: str, context: Optional[ConversationContext] = None, bypass_cache: bool = False, semantic: bool = False) -> Answer:
+    """
+        Get a response from the response cache, falling back to the LLM on a miss.
+
+        With `semantic`, a stored answer to a near-identical question is also
+        accepted; only pass it for questions that do not depend on a
+        conversation's history or documents.
+    """
+    route = choose_route(query, context)
+    key = response_cache_key(query, context, route)
+    lookup = SemanticLookup(query, semantic, route)
+    if not bypass_cache:
+        cached = await lookup_cached_response(key, lookup)
+        if cached is not None:
+            return cached
+
+    async def fetch():
+        answer = Answer("", route=route.tier, model=route.model(settings.LLM_PROVIDER))
+        started = time.perf_counter()
+        answer.text = await get_llm_response(query, context=context, route=route, answer=answer)
+        _record_latency(answer, started)
+        await response_cache.set(key, answer.text)
+        await lookup.set(answer.text)
+        return answer
+
+    return await inflight_requests.do(key, fetch)
+
+
+async def stream_cached_llm_response(
+    query: str,
+    context: Optional[ConversationContext] = None,
+    bypass_cache: bool = False,
+    semantic: bool = False,
+    answer: Optional[Answer] = None,
+):
+    """
+        Stream a cached response as a single delta, or stream and cache a fresh one.
+
+        When given, `answer` is filled in with the full text and where it came from.
+    """
+    answer = answer if answer is not None else Answer("")
+    route = choose_route(query, context)
+    key = response_cache_key(query, context, route)
+    lookup = SemanticLookup(query, semantic, route)
+    if not bypass_cache:
+        cached = await lookup_cached_response(key, lookup)
+        if cached is not None:
+            answer.text, answer.cache, answer.similarity = cached.text, cached.cache, cached.similarity
+            yield cached.text
+            return
+
+    answer.route = route.tier
+    answer.model = route.model(settings.LLM_PROVIDER)
+    started = time.perf_counter()
+
+    async def fetch():
+        parts = []
+        async for delta in stream_llm_response(query, context=context, route=route, answer=answer):
+            parts.append(delta)
+            yield delta
+        response = "".join(parts)
+        await response_cache.set(key, response)
+        await lookup.set(response)
+
+    parts = []
+    async for delta in inflight_streams.subscribe(key, fetch):
+        parts.append(delta)
+        yield delta
+    answer.text = "".join(parts)
+    _record_latency(answer, started)
+
+
+def _record_latency(answer: Answer, started: float):
+    seconds = time.perf_counter() - started
+    LLM_ROUTE_LATENCY.labels(answer.route).observe(seconds)
+    answer.latency_ms = round(seconds * 1000)
+
+
+async def get_llm_response(query: str, context: Optional[ConversationContext] = None, route: Optional[Route] = None, answer: Optional[Answer] = None) -> str:
+    """
+        Get a response from th eLLM based on the provided configured settings.
+
+        The query is routed to a model tier first; `answer`, when given,
+        receives the model of the provider that answered.
+    """
+    route = route or choose_route(query, context)
+
+    # Tag results with their provider, since a hedged loser may finish as well
+    async def call(provider: str):
+        return provider, await get_provider_response(provider, query, context, route)
+
+    with stage_timer("llm_total"):
+        provider, text = await router.call(call, max_tokens=route.max_tokens)
+    if answer is not None:
+        answer.model = route.model(provider)
+    return text
+
+async def get_provider_response(provider: str, query: str, context: Optional[ConversationContext] = None, route: Optional[Route] = None) -> str:
+    route = route or choose_route(query, context)
+    if provider == "claude":
+        return await get_claude_response(query, context, route)
+    elif provider == 'gemini':
+        return await get_gemini_response(query, context, route)
+    else:
+        raise NotImplementedError(f"LLM provider {provider} not implemented")
+
+def record_claude_usage(usage):
+    if usage is not None:
+        record_usage(
+            "claude", usage.input_tokens, usage.output_tokens,
+            cache_read=getattr(usage, "cache_read_input_tokens", None),
+            cache_write=getattr(usage, "cache_creation_input_tokens", None),
+        )
+
+def record_gemini_usage(usage):
+    if usage is not None:
+        record_usage("gemini", usage.prompt_token_count, usage.candidates_token_count, cache_read=usage.cached_content_token_count)
+
+async def get_claude_response(query: str, context: Optional[ConversationContext] = None, route: Optional[Route] = None) -> str:
     """
         Get a response from Claude API
     """
+    route = route or choose_route(query, context)
 
     try:
-        client = anthropic.Anthropic(api_key=settings.LLM_API_KEY)
-
-        system_prompt="""You are a helpful legal assistant AI that provides information about legal concepts, procedures, and documents in accordance to Kenya's laws. 
-        Provide a clear, concise and accurate information. Format your response with markdown for readability. 
-        Include relevant sections with headins when appropriate. 
-        Always clarify that you are providing general information and not legal advice."""
+        client = clients.get("claude")
 
         # Call the Claude API
-        response = client.messages.create(
-            model=settings.LLM_MODEL,
-            system=system_prompt,
-            max_tokens=1024,
-            messages=[
-                {"role": "user", "content": query}
-            ]
-        )
+        response = await client.messages.create(**_claude_request(query, context, max_tokens=route.max_tokens, model=route.model("claude")))
+        record_claude_usage(response.usage)
 
         return response.content[0].text
-    
+
     except Exception as e:
-        # Log the error and return a generic error message
+        # Log and re-raise so the router can decide whether to retry
         print(f"Error getting claude response: {e}")
-        raise Exception("Failed to get response from LLM service")
-    
+        raise
 
-async def get_gemini_response(query: str) -> str:
+
+async def get_gemini_response(query: str, context: Optional[ConversationContext] = None, route: Optional[Route] = None) -> str:
     """
         Get a response from Gemini API
     """
+    route = route or choose_route(query, context)
 
     try:
-        # Configure gemini
-        client = genai.Client(api_key=settings.LLM_API_KEY)
-    
-
-        # System instructions
-        system_instructions = (
-            "You are a helpful legal assistant AI that provides information about legal "
-            "concepts, procedures, and documents in accordance with Kenya's laws.\n\n"
-            "Provide clear, concise, and accurate information. Format your response with markdown for readability.\n\n"
-            "Include relevant sections with headings when appropriate.\n\n"
-            "Always clarify that you are providing general information and not legal advice."
-        )
+        client = clients.get("gemini")
 
-        prompt = f"System: {system_instructions}\n\nUser: {query}"
-
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=prompt,
-            config=GenerateContentConfig(
-                temperature=0.3,
-                max_output_tokens=1024,
-                top_p=0.8,
-                top_k=40,
-            )
-        )
+        response = await _gemini_call(client, query, context, max_tokens=route.max_tokens, model=route.model("gemini"))
+        record_gemini_usage(response.usage_metadata)
 
         return response.candidates[0].content.parts[0].text
-    
+
     except Exception as e:
-        # Log the error and return a generic error message
+        # Log and re-raise so the router can decide whether to retry
         print(f"Error getting gemini response: {e}")
-        raise Exception("Failed to get response from LLM service")
\ No newline at end of file
+        raise
+
+
+async def stream_llm_response(query: str, context: Optional[ConversationContext] = None, route: Optional[Route] = None, answer: Optional[Answer] = None):
+    """
+        Stream response text deltas from the configured LLM as they arrive
+    """
+    route = route or choose_route(query, context)
+
+    async def call(provider: str):
+        async for delta in stream_provider_response(provider, query, context, route):
+            yield provider, delta
+
+    started = time.perf_counter()
+    first = True
+    async for provider, delta in router.stream(call):
+        if first:
+            STAGE_LATENCY.labels("llm_ttft").observe(time.perf_counter() - started)
+            if answer is not None:
+                answer.model = route.model(provider)
+            first = False
+        yield delta
+    STAGE_LATENCY.labels("llm_total").observe(time.perf_counter() - started)
+
+
+def stream_provider_response(provider: str, query: str, context: Optional[ConversationContext] = None, route: Optional[Route] = None):
+    route = route or choose_route(query, context)
+    if provider == "claude":
+        return stream_claude_response(query, context, route)
+    elif provider == 'gemini':
+        return stream_gemini_response(query, context, route)
+    else:
+        raise NotImplementedError(f"LLM provider {provider} not implemented")
+
+
+async def stream_claude_response(query: str, context: Optional[ConversationContext] = None, route: Optional[Route] = None):
+    """
+        Stream a response from Claude API
+    """
+    route = route or choose_route(query, context)
+
+    try:
+        client = clients.get("claude")
+
+        async with client.messages.stream(**_claude_request(query, context, max_tokens=route.max_tokens, model=route.model("claude"))) as stream:
+            async for text in stream.text_stream:
+                yield text
+            record_claude_usage((await stream.get_final_message()).usage)
+
+    except Exception as e:
+        print(f"Error streaming claude response: {e}")
+        raise
+
+
+async def stream_gemini_response(query: str, context: Optional[ConversationContext] = None, route: Optional[Route] = None):
+    """
+        Stream a response from Gemini API
+    """
+    route = route or choose_route(query, context)
+
+    try:
+        client = clients.get("gemini")
+
+        usage = None
+        async for chunk in await _gemini_call(client, query, context, stream=True, max_tokens=route.max_tokens, model=route.model("gemini")):
+            usage = chunk.usage_metadata or usage
+            if chunk.text:
+                yield chunk.text
+        record_gemini_usage(usage)
+
+    except Exception as e:
+        print(f"Error streaming gemini response: {e}")
+        raise
+
+
+async def summarize_conversation(summary: Optional[str], history: list) -> str:
+    """
+        Extend a conversation's rolling summary with turns that left the context window
+    """
+    prompt = f"Existing summary:\n{summary or 'None'}\n\nNew turns:\n{_transcript(history)}"
+
+    async def summarize(provider: str) -> str:
+        if provider == "claude":
+            response = await clients.get("claude").messages.create(
+                **_claude_request(prompt, template=SUMMARY_PROMPT, max_tokens=settings.CONTEXT_SUMMARY_MAX_TOKENS)
+            )
+            record_claude_usage(response.usage)
+            return response.content[0].text
+        elif provider == 'gemini':
+            response = await _gemini_call(
+                clients.get("gemini"), prompt, template=SUMMARY_PROMPT, max_tokens=settings.CONTEXT_SUMMARY_MAX_TOKENS
+            )
+            record_gemini_usage(response.usage_metadata)
+            return response.candidates[0].content.parts[0].text
+        else:
+            raise NotImplementedError(f"LLM provider {provider} not implemented")
+
+    try:
+        return await router.call(summarize, max_tokens=settings.CONTEXT_SUMMARY_MAX_TOKENS)
+    except Exception as e:
+        print(f"Error summarizing conversation: {e}")
+        raise
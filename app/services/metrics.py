@@ -0,0 +1,155 @@
+"""
+    Prometheus metrics.
+
+    Hot-path metrics are plain counters and histograms. Values that already
+    exist elsewhere (cache hit counts, pool and queue sizes, breaker states) are
+    read only when /metrics is scraped, so they add nothing to a request.
+
+    Under gunicorn set PROMETHEUS_MULTIPROC_DIR so counters and histograms
+    from every worker are aggregated; the scrape-time gauges then describe the
+    worker that served the scrape.
+"""
+import asyncio
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, REGISTRY, generate_latest
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route, including the full body of streamed responses",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+
+STAGE_LATENCY = Histogram(
+    "query_stage_duration_seconds",
+    "Time spent in each stage of answering a query",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+
+LLM_ROUTE_LATENCY = Histogram(
+    "llm_route_duration_seconds",
+    "Time to a full LLM answer by routed model tier",
+    ["tier"],
+    buckets=LATENCY_BUCKETS,
+)
+
+LLM_TOKENS = Counter(
+    "llm_tokens_total",
+    "Tokens reported by the LLM providers",
+    ["provider", "kind"],
+)
+
+LLM_ERRORS = Counter(
+    "llm_errors_total",
+    "Failed LLM provider attempts",
+    ["provider", "retryable"],
+)
+
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds",
+    "How late the event loop wakes a sleeping task",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """
+        Observe how long the block takes under the given query stage
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.labels(stage).observe(time.perf_counter() - started)
+
+
+def record_usage(provider: str, input_tokens, output_tokens, cache_read=None, cache_write=None):
+    """
+        Count a call's tokens. Prompt-cache reads and writes are counted under
+        their own kinds; Claude excludes them from input, Gemini includes reads in it.
+    """
+    for kind, tokens in (("input", input_tokens), ("output", output_tokens), ("cache_read", cache_read), ("cache_write", cache_write)):
+        if tokens:
+            LLM_TOKENS.labels(provider, kind).inc(tokens)
+
+
+async def monitor_event_loop(interval: float = 0.25):
+    """
+        Sleep in a loop and record how late each wake-up is; blocking work on the loop shows up as lag
+    """
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(0.0, time.perf_counter() - started - interval))
+
+
+class StateCollector:
+    """
+        Gauges read from the services' own state at scrape time
+    """
+
+    def describe(self):
+        # Nothing to check at registration; collect() imports the services lazily
+        return []
+
+    def collect(self):
+        from app.db.database import async_engine
+        from app.services.admission import llm_limiter
+        from app.services.cache import response_cache
+        from app.services.llm_service import router
+        from app.services.semantic_cache import semantic_cache
+
+        stats = response_cache.stats()
+        requests = CounterMetricFamily("response_cache_requests", "Response cache lookups", labels=["result"])
+        requests.add_metric(["hit"], stats["hits"])
+        requests.add_metric(["miss"], stats["misses"])
+        yield requests
+        yield GaugeMetricFamily("response_cache_hit_ratio", "Share of response cache lookups that hit", value=stats["hit_ratio"])
+
+        semantic = CounterMetricFamily("semantic_cache_requests", "Semantic cache lookups after an exact miss", labels=["result"])
+        semantic.add_metric(["hit"], semantic_cache.hits)
+        semantic.add_metric(["miss"], semantic_cache.misses)
+        yield semantic
+        yield GaugeMetricFamily("semantic_cache_entries", "Answers held by the semantic cache", value=len(semantic_cache))
+
+        pool = async_engine.pool
+        if hasattr(pool, "checkedout"):
+            yield GaugeMetricFamily("db_pool_checked_out", "Database connections in use", value=pool.checkedout())
+            yield GaugeMetricFamily("db_pool_size", "Database connections the pool keeps open", value=pool.size())
+            yield GaugeMetricFamily("db_pool_overflow", "Database connections opened beyond the pool size", value=max(pool.overflow(), 0))
+
+        yield GaugeMetricFamily("llm_slots_in_use", "Concurrent LLM-bound requests", value=llm_limiter.active)
+        yield GaugeMetricFamily("llm_slots_limit", "Maximum concurrent LLM-bound requests", value=llm_limiter.limit)
+        yield GaugeMetricFamily("llm_queue_waiting", "Requests waiting for an LLM slot", value=llm_limiter.waiting)
+
+        breakers = GaugeMetricFamily("llm_circuit_open", "1 while a provider's circuit breaker is open", labels=["provider"])
+        for provider in router.providers():
+            breakers.add_metric([provider], 1 if router.breaker(provider).state == "open" else 0)
+        yield breakers
+
+
+REGISTRY.register(StateCollector())
+
+
+def render() -> tuple:
+    """
+        Return the exposition payload and its content type
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(StateCollector())
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
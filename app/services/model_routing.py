@@ -0,0 +1,87 @@
+"""
+    Route each query to a model tier by its complexity.
+
+    A cheap local classifier sorts queries into "simple" (short definitional
+    questions), "complex" (multi-part or procedural questions) and
+    "standard" (everything else). Each tier has its own model per provider
+    (CLAUDE_MODEL_<TIER>, GEMINI_MODEL_<TIER>, falling back to LLM_MODEL and
+    GEMINI_MODEL) and its own max_tokens (MAX_TOKENS_<TIER>).
+
+    MODEL_ROUTING_CLASSIFIER selects the classifier: "heuristic" for the
+    built-in one, or "package.module:function" mapping (query, context) to a
+    tier name.
+"""
+import importlib
+import re
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from app.core.config import settings
+from app.services.context import ConversationContext
+
+TIERS = ("simple", "standard", "complex")
+
+DEFINITION_RE = re.compile(r"^\s*(what\s+(is|are|does|do)\b|what's\b|define\b|definition\s+of\b|meaning\s+of\b|who\s+is\b)", re.IGNORECASE)
+PROCEDURE_RE = re.compile(
+    r"\b(how\s+(do|can|should|would|to)|steps?|procedures?|process|draft|compare|difference\s+between"
+    r"|appeal|requirements?|what\s+happens\s+if|explain\s+why)\b",
+    re.IGNORECASE,
+)
+# Conjunctions, list markers and line breaks that separate the parts of a question
+PART_RE = re.compile(r"\b(and|also|then)\b|[;\n]|(^|\s)\d+[.)]", re.IGNORECASE)
+
+# Longest question still treated as a simple definition
+SIMPLE_MAX_WORDS = 12
+# Shortest question always treated as complex
+COMPLEX_MIN_WORDS = 60
+
+
+def heuristic_classifier(query: str, context: Optional[ConversationContext] = None) -> str:
+    words = len(query.split())
+    parts = len(PART_RE.findall(query)) + max(0, query.count("?") - 1)
+    procedural = bool(PROCEDURE_RE.search(query))
+
+    if words >= COMPLEX_MIN_WORDS or parts >= 3 or (procedural and parts >= 1):
+        return "complex"
+    if words <= SIMPLE_MAX_WORDS and not procedural and parts == 0 and DEFINITION_RE.match(query):
+        return "simple"
+    return "standard"
+
+
+@dataclass(frozen=True)
+class Route:
+    tier: str
+    max_tokens: int
+
+    def model(self, provider: str) -> str:
+        default = settings.LLM_MODEL if provider == "claude" else getattr(settings, f"{provider.upper()}_MODEL", "")
+        return getattr(settings, f"{provider.upper()}_MODEL_{self.tier.upper()}", "") or default
+
+
+_classifier = None
+
+
+def get_classifier() -> Callable[[str, Optional[ConversationContext]], str]:
+    global _classifier
+    if _classifier is None:
+        name = settings.MODEL_ROUTING_CLASSIFIER
+        if name == "heuristic":
+            _classifier = heuristic_classifier
+        else:
+            module_name, _, attr = name.partition(":")
+            _classifier = getattr(importlib.import_module(module_name), attr)
+    return _classifier
+
+
+def route_for(tier: str) -> Route:
+    return Route(tier, getattr(settings, f"MAX_TOKENS_{tier.upper()}"))
+
+
+def choose_route(query: str, context: Optional[ConversationContext] = None) -> Route:
+    """
+        Pick the model tier for a query; everything is "standard" with routing off
+    """
+    if not settings.MODEL_ROUTING:
+        return route_for("standard")
+    tier = get_classifier()(query, context)
+    return route_for(tier if tier in TIERS else "standard")
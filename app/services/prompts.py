@@ -0,0 +1,115 @@
+"""
+    Versioned prompt templates.
+
+    Templates are registered once at import, with the per-provider pieces built
+    up front, so a request only adds what changes between calls: the summary,
+    the history and the query. Register a new version whenever a prompt's
+    wording changes; the latest version of each name is the one in use. The
+    version is part of the response cache key and is stored on every answer.
+
+    For Claude the system prompt and the conversation summary are marked with
+    cache_control once the prefix they end reaches the minimum cacheable size,
+    so calls that share them read the prefix from Anthropic's prompt cache. Gemini receives the system prompt as a system instruction,
+    which llm_service places in an explicit context cache.
+"""
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+from app.services.context import estimate_tokens
+
+# Anthropic cache breakpoint; the prefix up to a marked block is cached for five minutes
+EPHEMERAL = {"type": "ephemeral"}
+
+
+def cacheable(prefix_tokens: int) -> bool:
+    """
+        Whether a prefix of this many (estimated) tokens is worth a cache breakpoint
+    """
+    return settings.PROMPT_CACHE and prefix_tokens >= settings.PROMPT_CACHE_MIN_TOKENS
+
+
+class PromptTemplate:
+    """
+        One version of a system prompt, with its Claude and Gemini wording
+    """
+
+    def __init__(self, name: str, version: str, claude: str, gemini: Optional[str] = None):
+        self.name = name
+        self.version = version
+        self._system = {"claude": claude, "gemini": gemini or claude}
+        self._claude_tokens = estimate_tokens(claude)
+        self._claude_blocks = {
+            True: {"type": "text", "text": claude, "cache_control": EPHEMERAL},
+            False: {"type": "text", "text": claude},
+        }
+
+    @property
+    def id(self) -> str:
+        return f"{self.name}@{self.version}"
+
+    def system(self, provider: str) -> str:
+        return self._system[provider]
+
+    def claude_system(self, summary: Optional[str] = None) -> List[dict]:
+        """
+            System blocks for a Claude request, each cacheable on its own so the
+            static prompt stays cached when the summary changes
+        """
+        blocks = [self._claude_blocks[cacheable(self._claude_tokens)]]
+        if summary:
+            block = {"type": "text", "text": f"Summary of the earlier conversation:\n{summary}"}
+            if cacheable(self._claude_tokens + estimate_tokens(block["text"])):
+                block["cache_control"] = EPHEMERAL
+            blocks.append(block)
+        return blocks
+
+
+class PromptRegistry:
+    def __init__(self):
+        self._templates: Dict[str, Dict[str, PromptTemplate]] = {}
+        self._current: Dict[str, PromptTemplate] = {}
+
+    def register(self, name: str, version: str, claude: str, gemini: Optional[str] = None) -> PromptTemplate:
+        versions = self._templates.setdefault(name, {})
+        if version in versions:
+            raise ValueError(f"Prompt {name} version {version} is already registered")
+        template = versions[version] = self._current[name] = PromptTemplate(name, version, claude, gemini)
+        return template
+
+    def get(self, name: str, version: Optional[str] = None) -> PromptTemplate:
+        """
+            Return a template, by default its latest version
+        """
+        if version is None:
+            return self._current[name]
+        return self._templates[name][version]
+
+
+prompts = PromptRegistry()
+
+ANSWER = "answer"
+SUMMARY = "summary"
+
+prompts.register(
+    ANSWER, "1",
+    claude="""You are a helpful legal assistant AI that provides information about legal concepts, procedures, and documents in accordance to Kenya's laws.
+        Provide a clear, concise and accurate information. Format your response with markdown for readability.
+        Include relevant sections with headins when appropriate.
+        Always clarify that you are providing general information and not legal advice.""",
+    gemini=(
+        "You are a helpful legal assistant AI that provides information about legal "
+        "concepts, procedures, and documents in accordance with Kenya's laws.\n\n"
+        "Provide clear, concise, and accurate information. Format your response with markdown for readability.\n\n"
+        "Include relevant sections with headings when appropriate.\n\n"
+        "Always clarify that you are providing general information and not legal advice."
+    ),
+)
+
+prompts.register(
+    SUMMARY, "1",
+    claude=(
+        "You maintain a running summary of a conversation between a user and a legal assistant. "
+        "Merge the new turns into the existing summary, keeping the facts, questions and legal "
+        "points that later answers may depend on. Reply with the updated summary only."
+    ),
+)
@@ -0,0 +1,297 @@
+"""
+    Route LLM calls across the configured providers.
+
+    Every attempt runs under its provider's timeout. Retryable errors are retried
+    with full-jitter exponential backoff before the next provider is tried, and a
+    circuit breaker per provider sheds one that keeps failing. With hedging on, a
+    second provider is started when the first has not answered (or, for streams,
+    produced its first token) by its observed p95 latency; the loser is cancelled.
+"""
+import asyncio
+import math
+import random
+import time
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from app.core.config import settings
+from app.services.metrics import LLM_ERRORS
+
+
+class ProviderUnavailable(Exception):
+    """
+        Raised when no provider could serve a call
+    """
+
+    def __init__(self, message: str = "Failed to get response from LLM service", retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+        Opens after consecutive failures and lets a single trial call through
+        once the reset timeout has passed; the trial closes or re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def available(self) -> bool:
+        state = self.state
+        return state == "closed" or (state == "half-open" and not self._trial)
+
+    def allow(self) -> bool:
+        if not self.available():
+            return False
+        if self.state == "half-open":
+            self._trial = True
+        return True
+
+    def retry_after(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self._trial = False
+
+    def release(self):
+        # A cancelled call, or a request the provider rejected, says nothing about its health
+        self._trial = False
+
+
+def is_provider_failure(error: BaseException, retryable: bool) -> bool:
+    """
+        Whether an error reflects on the provider's health (transient, timeout or 5xx)
+        rather than on the request, such as a 400 for a bad prompt
+    """
+    if retryable or isinstance(error, TimeoutError):
+        return True
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    return isinstance(status, int) and status >= 500
+
+
+class LatencyTracker:
+    """
+        Rolling window of recent latencies in seconds
+    """
+
+    def __init__(self, size: int = 200):
+        self._samples = deque(maxlen=size)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, math.ceil(len(ordered) * q) - 1)]
+
+
+async def _first_chunk(source: AsyncIterator):
+    """
+        Wait for a stream's first chunk, closing the stream if that fails or is cancelled
+    """
+    try:
+        first = [await source.__anext__()]
+    except StopAsyncIteration:
+        first = []
+    except BaseException:
+        await source.aclose()
+        raise
+    return source, first
+
+
+class ProviderRouter:
+    """
+        Tries providers in order (LLM_PROVIDER, then LLM_FALLBACK_PROVIDERS) with
+        retries, circuit breaking and optional hedging.
+
+        `retryable` decides which exceptions are worth retrying on the same provider;
+        any failure moves on to the next provider once retries are exhausted.
+    """
+
+    def __init__(self, retryable: Callable[[BaseException], bool]):
+        self._retryable = retryable
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._latencies: Dict[str, LatencyTracker] = {}
+
+    def providers(self) -> List[str]:
+        fallbacks = [p.strip() for p in settings.LLM_FALLBACK_PROVIDERS.split(",") if p.strip()]
+        return list(dict.fromkeys([settings.LLM_PROVIDER] + fallbacks))
+
+    def breaker(self, provider: str) -> CircuitBreaker:
+        breaker = self._breakers.get(provider)
+        if breaker is None:
+            breaker = self._breakers[provider] = CircuitBreaker(settings.LLM_BREAKER_FAILURES, settings.LLM_BREAKER_RESET)
+        return breaker
+
+    def latency(self, provider: str, kind: str) -> LatencyTracker:
+        return self._latencies.setdefault(f"{provider}:{kind}", LatencyTracker())
+
+    def timeout(self, provider: str, max_tokens: int = 0) -> float:
+        """
+            Seconds to wait for a provider's first token, plus the time to
+            generate `max_tokens` when waiting for a full response
+        """
+        first_token = getattr(settings, f"LLM_TIMEOUT_{provider.upper()}", settings.LLM_TIMEOUT)
+        return first_token + max_tokens / settings.LLM_MIN_TOKENS_PER_SECOND
+
+    def hedge_delay(self, provider: str, kind: str) -> Optional[float]:
+        """
+            Observed p95 latency of a provider, once enough samples have been seen
+        """
+        if not settings.LLM_HEDGE:
+            return None
+        tracker = self.latency(provider, kind)
+        if len(tracker) < settings.LLM_HEDGE_MIN_SAMPLES:
+            return None
+        return tracker.percentile(0.95)
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(settings.LLM_RETRY_BACKOFF_MAX, settings.LLM_RETRY_BACKOFF * 2 ** attempt))
+
+    def reset(self):
+        self._breakers.clear()
+        self._latencies.clear()
+
+    async def _attempt(self, provider: str, start: Callable[[str], Awaitable], kind: str, max_tokens: int = 0):
+        """
+            Call one provider, retrying retryable errors while its breaker allows
+        """
+        breaker = self.breaker(provider)
+        for attempt in range(settings.LLM_MAX_RETRIES + 1):
+            if not breaker.allow():
+                raise ProviderUnavailable(f"LLM provider {provider} is unavailable", retry_after=breaker.retry_after())
+
+            started = time.monotonic()
+            try:
+                result = await asyncio.wait_for(start(provider), self.timeout(provider, max_tokens))
+            except asyncio.CancelledError:
+                breaker.release()
+                raise
+            except Exception as e:
+                retryable = self._retryable(e)
+                if is_provider_failure(e, retryable):
+                    breaker.record_failure()
+                else:
+                    breaker.release()
+                LLM_ERRORS.labels(provider, str(retryable).lower()).inc()
+                print(f"LLM provider {provider} failed on attempt {attempt + 1}: {e!r}")
+                if attempt == settings.LLM_MAX_RETRIES or not retryable:
+                    raise
+                await asyncio.sleep(self.backoff(attempt))
+            else:
+                breaker.record_success()
+                self.latency(provider, kind).record(time.monotonic() - started)
+                return result
+
+    async def _race(self, start: Callable[[str], Awaitable], kind: str, discard: Optional[Callable[[object], Awaitable]] = None, max_tokens: int = 0):
+        """
+            Return the first successful result, starting the next provider on
+            failure or, when hedging, once the running one passes its p95
+        """
+        queue = list(self.providers())
+        pending = {}
+        errors = []
+
+        def launch() -> bool:
+            while queue:
+                provider = queue.pop(0)
+                if self.breaker(provider).available():
+                    pending[asyncio.ensure_future(self._attempt(provider, start, kind, max_tokens))] = provider
+                    return True
+            return False
+
+        launch()
+        winner = None
+        try:
+            while pending and winner is None:
+                delay = None
+                if len(pending) == 1 and queue:
+                    delay = self.hedge_delay(next(iter(pending.values())), kind)
+
+                done, _ = await asyncio.wait(pending, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    launch()
+                    continue
+
+                for task in done:
+                    del pending[task]
+                    if task.exception() is not None:
+                        errors.append(task.exception())
+                    elif winner is None:
+                        winner = task
+                    elif discard is not None:
+                        await discard(task.result())
+
+                if winner is None and not pending:
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        if winner is not None:
+            return winner.result()
+
+        retry_after = [self.breaker(p).retry_after() for p in self.providers() if not self.breaker(p).available()]
+        raise ProviderUnavailable(retry_after=min(retry_after) if retry_after else None) from (errors[-1] if errors else None)
+
+    async def call(self, fn: Callable[[str], Awaitable], max_tokens: int = 0):
+        """
+            Return `await fn(provider)` from the first provider that succeeds.
+
+            `max_tokens` is the most the call can generate, and extends each
+            attempt's timeout so long answers are not cut off as failures.
+        """
+        return await self._race(fn, "response", max_tokens=max_tokens)
+
+    async def stream(self, fn: Callable[[str], AsyncIterator]) -> AsyncIterator:
+        """
+            Stream `fn(provider)` from the first provider to produce a chunk.
+
+            Failover and hedging only happen before the first chunk; an error
+            after that ends the stream.
+        """
+        source, first = await self._race(
+            lambda provider: _first_chunk(fn(provider)),
+            "first_token",
+            discard=lambda result: result[0].aclose(),
+        )
+        try:
+            for chunk in first:
+                yield chunk
+            async for chunk in source:
+                yield chunk
+        except Exception as e:
+            print(f"LLM stream failed after the first chunk: {e!r}")
+            raise ProviderUnavailable() from e
+        finally:
+            await source.aclose()
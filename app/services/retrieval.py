@@ -0,0 +1,444 @@
+"""
+    Local retrieval over a corpus of statutes and case law.
+
+    Documents are chunked by section and indexed into a persistent on-disk BM25
+    inverted index, optionally alongside a memory-mapped embedding matrix for
+    cosine search. The index is loaded once per worker and searched in memory.
+
+    Build an index (from the repository root):
+        python -m app.services.retrieval build ./corpus --index-dir ./retrieval_index --embeddings
+"""
+import argparse
+import json
+import math
+import mmap
+import os
+import re
+import shutil
+import time
+from array import array
+from collections import Counter
+from typing import Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.services import embeddings
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was "
+    "were what when where which who will with shall may any such under".split()
+)
+
+# Lines that start a new section: markdown headings, "PART II", "Section 12", "12. Title", ...
+SECTION_RE = re.compile(
+    r"^\s*(?:#{1,6}\s+\S.*"
+    r"|(?:PART|Part|CHAPTER|Chapter|SECTION|Section|ARTICLE|Article|SCHEDULE|Schedule)\s+[0-9IVXLC]+[A-Za-z]?\b.*"
+    r"|\d{1,4}[A-Z]?\.\s+[A-Z].{0,120})$"
+)
+
+CORPUS_EXTENSIONS = (".txt", ".md")
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+def chunk_lines(lines: Iterable[str], source: str, max_chars: Optional[int] = None) -> Iterator[dict]:
+    """
+        Split a document into section chunks as its lines are read.
+
+        Sections longer than max_chars are split on paragraph boundaries. Only
+        the current section is held in memory.
+    """
+    max_chars = max_chars or settings.RETRIEVAL_CHUNK_CHARS
+    section = None
+    buffer = []
+    size = 0
+
+    def emit():
+        text = "".join(buffer).strip()
+        if text:
+            return {"source": source, "section": section, "text": text}
+
+    for line in lines:
+        if SECTION_RE.match(line):
+            chunk = emit()
+            if chunk:
+                yield chunk
+            section = line.strip().lstrip("#").strip()
+            buffer, size = [line], len(line)
+            continue
+
+        if size + len(line) > max_chars and buffer and not line.strip():
+            chunk = emit()
+            if chunk:
+                yield chunk
+            buffer, size = [], 0
+            continue
+
+        buffer.append(line)
+        size += len(line)
+
+        # A single paragraph longer than the limit is cut at the line boundary
+        if size > max_chars * 2:
+            chunk = emit()
+            if chunk:
+                yield chunk
+            buffer, size = [], 0
+
+    chunk = emit()
+    if chunk:
+        yield chunk
+
+
+def iter_corpus(corpus_dir: str) -> Iterator[dict]:
+    """
+        Yield section chunks for every text document under a directory
+    """
+    for root, _, files in os.walk(corpus_dir):
+        for name in sorted(files):
+            if not name.lower().endswith(CORPUS_EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            with open(path, encoding="utf-8", errors="replace") as f:
+                yield from chunk_lines(f, os.path.relpath(path, corpus_dir))
+
+
+def _write_postings_block(tmp_dir: str, number: int, block: tuple) -> str:
+    """
+        Save buffered (term_id, doc_id, tf) postings sorted by term; doc ids stay ascending within a term
+    """
+    term_ids, doc_ids, tfs = (np.frombuffer(column, dtype=column.typecode) for column in block)
+    order = np.argsort(term_ids, kind="stable")
+    path = os.path.join(tmp_dir, f"postings-{number}.npz")
+    np.savez(path, term_ids=term_ids[order], doc_ids=doc_ids[order], tfs=tfs[order])
+    return path
+
+
+def _merge_postings_blocks(tmp_dir: str, blocks: List[str], terms: int):
+    """
+        Merge the spilled blocks into the term-ordered posting arrays, one block in memory at a time
+    """
+    term_counts = np.zeros(terms, dtype=np.int64)
+    for path in blocks:
+        with np.load(path) as block:
+            term_counts += np.bincount(block["term_ids"], minlength=terms)
+
+    term_offsets = np.zeros(terms + 1, dtype=np.int64)
+    np.cumsum(term_counts, out=term_offsets[1:])
+    total = int(term_offsets[-1])
+    np.save(os.path.join(tmp_dir, "term_offsets.npy"), term_offsets)
+
+    open_memmap = np.lib.format.open_memmap
+    doc_ids = open_memmap(os.path.join(tmp_dir, "doc_ids.npy"), mode="w+", dtype=np.int32, shape=(total,))
+    tfs = open_memmap(os.path.join(tmp_dir, "tfs.npy"), mode="w+", dtype=np.float32, shape=(total,))
+
+    # Blocks hold ascending doc ids, so appending each block's run of a term keeps the term's postings sorted
+    cursor = term_offsets[:-1].copy()
+    for path in blocks:
+        with np.load(path) as block:
+            term_ids = block["term_ids"]
+            counts = np.bincount(term_ids, minlength=terms)
+            starts = np.cumsum(counts) - counts
+            positions = cursor[term_ids] + np.arange(len(term_ids)) - starts[term_ids]
+            doc_ids[positions] = block["doc_ids"]
+            tfs[positions] = block["tfs"]
+            cursor += counts
+        os.remove(path)
+
+    doc_ids.flush()
+    tfs.flush()
+    del doc_ids, tfs
+
+
+def build_index(chunks: Iterable[dict], index_dir: str, with_embeddings: bool = False, block_postings: Optional[int] = None) -> int:
+    """
+        Build a BM25 index (and optionally an embedding matrix) from chunks.
+
+        Postings are spilled to disk every `block_postings` entries and merged
+        at the end, so memory does not grow with the size of the corpus. The
+        index is written to a temporary directory and swapped in, so a running
+        worker never sees a partially written index.
+    """
+    block_postings = block_postings or settings.RETRIEVAL_INDEX_BLOCK_POSTINGS
+    tmp_dir = f"{index_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    vocab = {}
+    doc_lengths = array("f")
+    offsets = array("q")
+    embedding_batch = []
+    embedding_rows = []
+    # Postings are buffered as flat arrays and spilled to disk in blocks
+    block = (array("i"), array("i"), array("f"))
+    blocks = []
+
+    def spill():
+        if block[0]:
+            blocks.append(_write_postings_block(tmp_dir, len(blocks), block))
+            for column in block:
+                del column[:]
+
+    with open(os.path.join(tmp_dir, "chunks.jsonl"), "wb") as store:
+        for doc_id, chunk in enumerate(chunks):
+            offsets.append(store.tell())
+            store.write(json.dumps(chunk).encode("utf-8") + b"\n")
+
+            counts = Counter(tokenize(f"{chunk.get('section') or ''} {chunk['text']}"))
+            doc_lengths.append(sum(counts.values()))
+            term_ids, doc_ids, tfs = block
+            for term, tf in counts.items():
+                term_ids.append(vocab.setdefault(term, len(vocab)))
+                doc_ids.append(doc_id)
+                tfs.append(tf)
+            if len(term_ids) >= block_postings:
+                spill()
+
+            if with_embeddings:
+                embedding_batch.append(chunk["text"])
+                if len(embedding_batch) >= 256:
+                    embedding_rows.append(embeddings.embed(embedding_batch))
+                    embedding_batch = []
+        offsets.append(store.tell())
+    spill()
+
+    _merge_postings_blocks(tmp_dir, blocks, len(vocab))
+
+    np.save(os.path.join(tmp_dir, "doc_lengths.npy"), np.asarray(doc_lengths, dtype=np.float32))
+    np.save(os.path.join(tmp_dir, "chunk_offsets.npy"), np.asarray(offsets, dtype=np.int64))
+
+    if with_embeddings:
+        if embedding_batch:
+            embedding_rows.append(embeddings.embed(embedding_batch))
+        matrix = np.vstack(embedding_rows) if embedding_rows else np.zeros((0, settings.EMBEDDING_DIM), dtype=np.float32)
+        np.save(os.path.join(tmp_dir, "embeddings.npy"), matrix.astype(np.float32))
+
+    with open(os.path.join(tmp_dir, "vocab.json"), "w", encoding="utf-8") as f:
+        json.dump(vocab, f)
+    with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "documents": len(doc_lengths),
+            "avg_length": float(np.mean(doc_lengths)) if doc_lengths else 0.0,
+            "embeddings": with_embeddings,
+            "embedding_function": settings.EMBEDDING_FUNCTION if with_embeddings else None,
+        }, f)
+
+    old_dir = f"{index_dir}.old-{os.getpid()}"
+    if os.path.exists(index_dir):
+        os.rename(index_dir, old_dir)
+    os.rename(tmp_dir, index_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return len(doc_lengths)
+
+
+class BM25Index:
+    """
+        Read-only view of an index directory; arrays are memory-mapped
+    """
+
+    def __init__(self, index_dir: str, k1: float = 1.5, b: float = 0.75):
+        self.index_dir = index_dir
+        self.k1 = k1
+        self.b = b
+
+        with open(os.path.join(index_dir, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        with open(os.path.join(index_dir, "vocab.json"), encoding="utf-8") as f:
+            self.vocab = json.load(f)
+
+        def load(name):
+            return np.load(os.path.join(index_dir, name), mmap_mode="r")
+
+        self.term_offsets = load("term_offsets.npy")
+        self.doc_ids = load("doc_ids.npy")
+        self.tfs = load("tfs.npy")
+        self.chunk_offsets = load("chunk_offsets.npy")
+        self.size = int(self.meta["documents"])
+
+        # Per-document BM25 length normalisation is precomputed once
+        doc_lengths = np.asarray(load("doc_lengths.npy"))
+        avg_length = self.meta["avg_length"] or 1.0
+        self.length_norm = (k1 * (1 - b + b * doc_lengths / avg_length)).astype(np.float32)
+
+        self.embeddings = None
+        if self.meta.get("embeddings"):
+            self.embeddings = load("embeddings.npy")
+
+        self._store_file = open(os.path.join(index_dir, "chunks.jsonl"), "rb")
+        self._store = mmap.mmap(self._store_file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+
+    def close(self):
+        if self._store is not None:
+            self._store.close()
+        self._store_file.close()
+
+    def chunk(self, doc_id: int) -> dict:
+        start, end = int(self.chunk_offsets[doc_id]), int(self.chunk_offsets[doc_id + 1])
+        return json.loads(self._store[start:end])
+
+    def bm25(self, query: str, k: int) -> List[tuple]:
+        """
+            Top-k (doc_id, score) pairs by BM25
+        """
+        if not self.size:
+            return []
+        scores = np.zeros(self.size, dtype=np.float32)
+        matched = False
+        for term in set(tokenize(query)):
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+            start, end = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+            ids = self.doc_ids[start:end]
+            tf = self.tfs[start:end]
+            idf = math.log(1 + (self.size - len(ids) + 0.5) / (len(ids) + 0.5))
+            scores[ids] += idf * tf * (self.k1 + 1) / (tf + self.length_norm[ids])
+            matched = True
+        if not matched:
+            return []
+        return _top_k(scores, k)
+
+    def cosine(self, query_vector: np.ndarray, k: int) -> List[tuple]:
+        """
+            Top-k (doc_id, similarity) pairs by cosine similarity over the embedding matrix
+        """
+        if self.embeddings is None or not self.size:
+            return []
+        return _top_k(self.embeddings @ query_vector, k)
+
+
+def _top_k(scores: np.ndarray, k: int) -> List[tuple]:
+    k = min(k, len(scores))
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return [(int(i), float(scores[i])) for i in top if scores[i] > 0]
+
+
+def reciprocal_rank_fusion(rankings: List[List[tuple]], k: int, constant: int = 60) -> List[tuple]:
+    """
+        Merge ranked (doc_id, score) lists by reciprocal rank
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, (doc_id, _) in enumerate(ranking):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (constant + rank + 1)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+class Retriever:
+    """
+        Holds the loaded index for the worker's lifetime, plus the indexes of
+        documents attached to individual conversations
+    """
+
+    def __init__(self):
+        self.index = None
+        # conversation_id -> (meta.json mtime, BM25Index)
+        self._conversation_indexes = {}
+
+    def load(self, index_dir: Optional[str] = None) -> bool:
+        index_dir = index_dir or settings.RETRIEVAL_INDEX_DIR
+        if not os.path.exists(os.path.join(index_dir, "meta.json")):
+            return False
+        self.close()
+        self.index = BM25Index(index_dir)
+        return True
+
+    def close(self):
+        if self.index is not None:
+            self.index.close()
+            self.index = None
+        for _, index in self._conversation_indexes.values():
+            index.close()
+        self._conversation_indexes = {}
+
+    def conversation_index(self, conversation_id: str) -> Optional[BM25Index]:
+        """
+            Index of a conversation's uploaded documents, reloaded when it is rebuilt
+        """
+        index_dir = os.path.join(settings.RETRIEVAL_INDEX_DIR, "conversations", conversation_id)
+        try:
+            mtime = os.stat(os.path.join(index_dir, "meta.json")).st_mtime
+        except OSError:
+            return None
+
+        cached = self._conversation_indexes.get(conversation_id)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        if cached:
+            cached[1].close()
+
+        index = BM25Index(index_dir)
+        self._conversation_indexes[conversation_id] = (mtime, index)
+        return index
+
+    def _search_index(self, index: BM25Index, query: str, k: int) -> List[dict]:
+        ranking = index.bm25(query, k * 2 if index.embeddings is not None else k)
+        if index.embeddings is not None and settings.RETRIEVAL_USE_VECTORS:
+            vector = embeddings.embed([query])[0]
+            ranking = reciprocal_rank_fusion([ranking, index.cosine(vector, k * 2)], k)
+
+        passages = []
+        for doc_id, score in ranking[:k]:
+            chunk = index.chunk(doc_id)
+            chunk["score"] = score
+            passages.append(chunk)
+        return passages
+
+    def search(self, query: str, k: Optional[int] = None, conversation_id: Optional[str] = None) -> List[dict]:
+        """
+            Return the top passages for a query, each with its source, section and score.
+
+            Passages from documents attached to the conversation come first.
+        """
+        k = k or settings.RETRIEVAL_TOP_K
+        passages = []
+        if conversation_id:
+            index = self.conversation_index(conversation_id)
+            if index is not None:
+                passages = self._search_index(index, query, k)
+        if self.index is not None and len(passages) < k:
+            passages += self._search_index(self.index, query, k - len(passages))
+        return passages
+
+
+retriever = Retriever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="index a directory of .txt/.md documents")
+    build.add_argument("corpus_dir")
+    build.add_argument("--index-dir", default=settings.RETRIEVAL_INDEX_DIR)
+    build.add_argument("--embeddings", action="store_true", help="also store an embedding matrix")
+
+    search = commands.add_parser("search", help="query an index")
+    search.add_argument("query")
+    search.add_argument("--index-dir", default=settings.RETRIEVAL_INDEX_DIR)
+    search.add_argument("-k", type=int, default=settings.RETRIEVAL_TOP_K)
+
+    args = parser.parse_args()
+    if args.command == "build":
+        started = time.perf_counter()
+        count = build_index(iter_corpus(args.corpus_dir), args.index_dir, with_embeddings=args.embeddings)
+        print(f"Indexed {count} chunks into {args.index_dir} in {time.perf_counter() - started:.1f}s")
+    else:
+        if not retriever.load(args.index_dir):
+            parser.error(f"No index found in {args.index_dir}")
+        started = time.perf_counter()
+        passages = retriever.search(args.query, args.k)
+        elapsed = (time.perf_counter() - started) * 1000
+        for passage in passages:
+            print(f"[{passage['score']:.3f}] {passage['source']} - {passage.get('section') or ''}")
+            print(f"    {passage['text'][:200]}")
+        print(f"{len(passages)} passages in {elapsed:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
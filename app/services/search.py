@@ -0,0 +1,144 @@
+"""
+    Full-text search over a user's messages.
+
+    SQLite uses the messages_fts FTS5 table and Postgres the search_vector
+    column on messages; both are kept current by the database itself (see
+    migration 3d05063f91a7). Results are grouped per conversation: the best
+    matching message represents it, with a snippet and the number of hits.
+
+    Snippets are only computed for the rows that are returned, so the cost of
+    a search is the index lookup for the user's matching messages.
+"""
+from typing import List
+
+from sqlalchemy import DateTime, Float, Integer, String, bindparam, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Tokens around the match in a SQLite snippet / words in a Postgres headline
+SNIPPET_TOKENS = 16
+
+# Marks the matched terms in a snippet
+HIGHLIGHT_START = "**"
+HIGHLIGHT_END = "**"
+
+_RESULT_COLUMNS = dict(
+    conversation_id=String,
+    title=String,
+    updated_at=DateTime,
+    message_id=String,
+    role=String,
+    created_at=DateTime,
+    snippet=String,
+    hits=Integer,
+    rank=Float,
+)
+
+_SQLITE_RANKED = text("""
+    WITH hits AS (
+        SELECT rowid, conversation_id, bm25(messages_fts, 1.0, 0.0) AS score
+        FROM messages_fts
+        WHERE messages_fts MATCH :match
+    ), ranked AS (
+        SELECT rowid, conversation_id, score,
+            ROW_NUMBER() OVER (PARTITION BY conversation_id ORDER BY score) AS position,
+            COUNT(*) OVER (PARTITION BY conversation_id) AS hits
+        FROM hits
+    )
+    SELECT ranked.rowid, ranked.conversation_id, ranked.hits, -ranked.score AS rank,
+        conversations.title, conversations.updated_at
+    FROM ranked
+    JOIN conversations ON conversations.id = ranked.conversation_id
+    WHERE ranked.position = 1 AND conversations.user_id = :user_id
+    ORDER BY ranked.score
+    LIMIT :limit
+""").columns(rowid=Integer, conversation_id=String, hits=Integer, rank=Float, title=String, updated_at=DateTime)
+
+_SQLITE_SNIPPETS = text(f"""
+    SELECT messages_fts.rowid AS rowid, messages.id AS message_id, messages.role AS role,
+        messages.created_at AS created_at,
+        snippet(messages_fts, 0, '{HIGHLIGHT_START}', '{HIGHLIGHT_END}', '…', {SNIPPET_TOKENS}) AS snippet
+    FROM messages_fts
+    JOIN messages ON messages.rowid = messages_fts.rowid
+    WHERE messages_fts MATCH :match AND messages_fts.rowid IN :rowids
+""").bindparams(bindparam("rowids", expanding=True)).columns(
+    rowid=Integer, message_id=String, role=String, created_at=DateTime, snippet=String
+)
+
+_POSTGRES_SEARCH = text(f"""
+    WITH hits AS (
+        SELECT messages.id, messages.conversation_id, ts_rank(messages.search_vector, query) AS rank,
+            ROW_NUMBER() OVER (
+                PARTITION BY messages.conversation_id
+                ORDER BY ts_rank(messages.search_vector, query) DESC
+            ) AS position,
+            COUNT(*) OVER (PARTITION BY messages.conversation_id) AS hits
+        FROM messages
+        JOIN conversations ON conversations.id = messages.conversation_id,
+            websearch_to_tsquery('english', :q) AS query
+        WHERE conversations.user_id = :user_id AND messages.search_vector @@ query
+    ), best AS (
+        SELECT * FROM hits WHERE position = 1 ORDER BY rank DESC LIMIT :limit
+    )
+    SELECT best.conversation_id, conversations.title, conversations.updated_at,
+        messages.id AS message_id, messages.role, messages.created_at,
+        ts_headline('english', messages.content, websearch_to_tsquery('english', :q),
+            'StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_END}, MaxWords={SNIPPET_TOKENS}, MinWords=5, MaxFragments=1'
+        ) AS snippet,
+        best.hits, best.rank
+    FROM best
+    JOIN messages ON messages.id = best.id
+    JOIN conversations ON conversations.id = best.conversation_id
+    ORDER BY best.rank DESC
+""").columns(**_RESULT_COLUMNS)
+
+
+def fts_match(query: str, user_id: str) -> str:
+    """
+        Build an FTS5 MATCH expression: every word must appear, the last one
+        as a prefix so results show up while the user is still typing, and
+        only the user's own messages are searched
+    """
+    terms = ['"' + word.replace('"', '""') + '"' for word in query.split()]
+    if not terms:
+        return ""
+    terms[-1] += "*"
+    owner = '"' + user_id.replace('"', '""') + '"'
+    return f"owner : {owner} AND content : ({' AND '.join(terms)})"
+
+
+async def search_messages(query: str, user_id: str, limit: int, db: AsyncSession) -> List[dict]:
+    """
+        Return the user's conversations matching the query, best match first
+    """
+    if db.bind.dialect.name == "postgresql":
+        rows = (await db.execute(_POSTGRES_SEARCH, {"q": query, "user_id": user_id, "limit": limit})).all()
+        return [dict(row._mapping) for row in rows]
+
+    match = fts_match(query, user_id)
+    if not match:
+        return []
+
+    ranked = (await db.execute(_SQLITE_RANKED, {"match": match, "user_id": user_id, "limit": limit})).all()
+    if not ranked:
+        return []
+
+    snippets = {
+        row.rowid: row
+        for row in (await db.execute(_SQLITE_SNIPPETS, {"match": match, "rowids": [row.rowid for row in ranked]})).all()
+    }
+
+    results = []
+    for row in ranked:
+        message = snippets[row.rowid]
+        results.append(dict(
+            conversation_id=row.conversation_id,
+            title=row.title,
+            updated_at=row.updated_at,
+            message_id=message.message_id,
+            role=message.role,
+            created_at=message.created_at,
+            snippet=message.snippet,
+            hits=row.hits,
+            rank=row.rank,
+        ))
+    return results
@@ -0,0 +1,109 @@
+"""
+    Semantic answer cache.
+
+    Catches paraphrases that the exact response cache misses ("what does
+    mitigation mean" / "define mitigation"). The embedding of every answered
+    query is kept in a fixed-size NumPy matrix; a lookup is one matrix
+    product against all stored rows, and the best row is served when its
+    cosine similarity reaches SEMANTIC_CACHE_THRESHOLD.
+
+    Rows are written round-robin, so once the matrix is full the oldest entry
+    is replaced; entries older than SEMANTIC_CACHE_TTL are ignored. Answers are
+    only shared between calls with the same scope (provider, model, prompt
+    and parameters), and callers only use the cache for questions that do
+    not depend on a conversation's history or documents.
+
+    Embeddings come from services.embeddings, so EMBEDDING_FUNCTION selects
+    the model. The cache is per worker process and only consulted while
+    SEMANTIC_CACHE is on. Callers use it from worker threads, so reads and
+    writes hold a lock.
+"""
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.embeddings import embed
+
+
+class SemanticCache:
+    def __init__(self, maxsize: int, ttl: float, threshold: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.threshold = threshold
+        self.hits = 0
+        self.misses = 0
+        self._vectors: Optional[np.ndarray] = None
+        self._created = np.full(maxsize, -np.inf)
+        self._scopes = np.full(maxsize, -1, dtype=np.int32)
+        self._answers: List[Optional[str]] = [None] * maxsize
+        self._scope_ids: Dict[str, int] = {}
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def embed(self, query: str) -> np.ndarray:
+        return embed([query])[0]
+
+    def lookup_many(self, vectors: np.ndarray, scope: str) -> List[Optional[Tuple[str, float]]]:
+        """
+            Best stored answer and its similarity for each row of `vectors`, or None below the threshold
+        """
+        # A float64 query would upcast (and copy) the whole matrix for the product
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            scope_id = self._scope_ids.get(scope)
+            if self._vectors is None or scope_id is None:
+                return [None] * len(vectors)
+
+            live = (self._scopes == scope_id) & (self._created >= time.monotonic() - self.ttl)
+            if not live.any():
+                return [None] * len(vectors)
+
+            similarities = self._vectors @ vectors.T
+            similarities[~live] = -np.inf
+            best = similarities.argmax(axis=0)
+
+            results = []
+            for column, row in enumerate(best):
+                similarity = float(similarities[row, column])
+                results.append((self._answers[row], similarity) if similarity >= self.threshold else None)
+            return results
+
+    def lookup(self, vector: np.ndarray, scope: str) -> Optional[Tuple[str, float]]:
+        result = self.lookup_many(vector[np.newaxis, :], scope)[0]
+        with self._lock:
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return result
+
+    def add(self, vector: np.ndarray, scope: str, answer: str):
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.maxsize, vector.shape[0]), dtype=np.float32)
+            row = self._next
+            self._next = (row + 1) % self.maxsize
+            self._vectors[row] = vector
+            self._created[row] = time.monotonic()
+            self._scopes[row] = self._scope_ids.setdefault(scope, len(self._scope_ids))
+            self._answers[row] = answer
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self._created >= time.monotonic() - self.ttl))
+
+    def clear(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self._vectors = None
+            self._created[:] = -np.inf
+            self._scopes[:] = -1
+            self._answers = [None] * self.maxsize
+            self._scope_ids = {}
+            self._next = 0
+
+
+semantic_cache = SemanticCache(settings.SEMANTIC_CACHE_MAXSIZE, settings.SEMANTIC_CACHE_TTL, settings.SEMANTIC_CACHE_THRESHOLD)
@@ -0,0 +1,124 @@
+"""
+    Per-process caches of known users and conversation owners, and buffered
+    last_seen updates.
+
+    A user id is cached once its row is known to exist, so repeat requests
+    skip the insert-if-missing. Conversation owners never change, so an
+    ownership check that succeeded once is answered from memory until the
+    entry expires. last_seen times are collected in memory and written by a
+    background task in one UPDATE per flush interval; a crash loses at most
+    one interval of them. Cookies are not verified, so between flushes at most
+    USER_CACHE_SIZE unknown users are buffered on top of the known ones.
+"""
+import asyncio
+from datetime import datetime
+from typing import Dict, Optional
+
+from cachetools import TTLCache
+from sqlalchemy import case, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.database import Conversation, User
+
+# Users per UPDATE statement when flushing last_seen
+FLUSH_BATCH = 500
+
+
+class SessionCache:
+    def __init__(self):
+        self._users = TTLCache(maxsize=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL)
+        self._owners = TTLCache(maxsize=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL)
+        self._seen: Dict[str, datetime] = {}
+        self._bind = None
+        self._flusher: Optional[asyncio.Task] = None
+
+    def known_user(self, user_id: str) -> bool:
+        return user_id in self._users
+
+    def add_user(self, user_id: str):
+        """
+            Remember a user whose row has been committed
+        """
+        self._users[user_id] = True
+
+    def add_owner(self, conversation_id: str, user_id: str):
+        """
+            Remember a conversation's owner once the conversation has been committed
+        """
+        self._owners[conversation_id] = user_id
+
+    async def owns(self, conversation_id: str, user_id: str, db: AsyncSession) -> bool:
+        """
+            Whether the conversation exists and belongs to the user
+        """
+        owner = self._owners.get(conversation_id)
+        if owner is None:
+            owner = (await db.execute(
+                select(Conversation.user_id).filter(Conversation.id == conversation_id)
+            )).scalar()
+            if owner is None:
+                return False
+            self.add_owner(conversation_id, owner)
+        return owner == user_id
+
+    def touch(self, user_id: str):
+        """
+            Record that the user was seen now; written on the next flush
+        """
+        if user_id not in self._seen and len(self._seen) >= settings.USER_CACHE_SIZE and not self.known_user(user_id):
+            # Random cookies must not grow the buffer without bound
+            return
+        self._seen[user_id] = datetime.utcnow()
+
+    def start(self, bind):
+        """
+            Start flushing last_seen times to the database behind an engine
+        """
+        self._bind = bind
+        self._flusher = asyncio.create_task(self._flush_periodically())
+
+    async def close(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        await self.flush()
+
+    async def flush(self):
+        """
+            Write the buffered last_seen times, one UPDATE per batch of users
+        """
+        if not self._seen or self._bind is None:
+            return
+        seen, self._seen = self._seen, {}
+        items = list(seen.items())
+        try:
+            async with AsyncSession(self._bind) as db:
+                for start in range(0, len(items), FLUSH_BATCH):
+                    batch = dict(items[start:start + FLUSH_BATCH])
+                    await db.execute(
+                        update(User)
+                        .where(User.id.in_(batch))
+                        .values(last_seen=case(batch, value=User.id))
+                        .execution_options(synchronize_session=False)
+                    )
+                await db.commit()
+        except Exception as e:
+            print(f"Error flushing last_seen: {e}")
+            # Keep the times for the next flush unless newer ones arrived meanwhile
+            for user_id, when in seen.items():
+                self._seen.setdefault(user_id, when)
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(settings.LAST_SEEN_FLUSH_INTERVAL)
+            await self.flush()
+
+    def clear(self):
+        self._users.clear()
+        self._owners.clear()
+        self._seen.clear()
+
+
+sessions = SessionCache()
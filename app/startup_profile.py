@@ -0,0 +1,137 @@
+"""
+    Cold-start profile of the API.
+
+    Every run starts a fresh interpreter that imports app.main, runs the
+    application's startup and sends its first requests, timing each step.
+    The slowest imports are listed from `python -X importtime`, along with
+    the provider SDKs loaded by the import alone (there should be none).
+
+    Runs use a scratch SQLite database that is migrated beforehand, so
+    migrations are not part of the timings.
+
+    Usage (from the repository root):
+        python -m app.startup_profile --runs 5
+        python -m app.startup_profile --max-import 1.5 --max-first-request 0.5
+
+    Exits 1 when a limit is exceeded, so it can run in CI.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+PROVIDER_SDKS = ("anthropic", "google.genai")
+
+STEPS = ("import", "startup", "first_request", "first_db_request")
+
+
+def measure() -> dict:
+    """
+        Time one cold start in this process; must run before app.main is imported
+    """
+    started = time.perf_counter()
+    import app.main
+
+    imported = time.perf_counter()
+    sdks = [name for name in PROVIDER_SDKS if name in sys.modules]
+
+    from fastapi.testclient import TestClient
+
+    client = TestClient(app.main.app)
+    before_startup = time.perf_counter()
+    with client:
+        after_startup = time.perf_counter()
+        client.get("/")
+        after_first = time.perf_counter()
+        client.get("/api/conversations", cookies={"user_id": "startup-profile"})
+        after_db = time.perf_counter()
+
+    return {
+        "import": imported - started,
+        "startup": after_startup - before_startup,
+        "first_request": after_first - after_startup,
+        "first_db_request": after_db - after_first,
+        "sdks_at_import": sdks,
+    }
+
+
+def slowest_imports(env: dict, count: int) -> list:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        env=env, capture_output=True, text=True, check=True,
+    )
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # "import time: <self us> | <cumulative us> | <indented module name>"
+        own, cumulative, name = line[len("import time:"):].split("|")
+        imports.append((int(cumulative), int(own), name.rstrip()))
+    imports.sort(reverse=True)
+    # The first entry is app.main itself
+    return imports[1:count + 1]
+
+
+def run(args) -> int:
+    with tempfile.TemporaryDirectory() as scratch:
+        env = dict(os.environ)
+        env.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(scratch, 'startup.db')}")
+        env["DB_MIGRATE_ON_STARTUP"] = "false"
+        env["PYTHONWARNINGS"] = "ignore"
+
+        subprocess.run([sys.executable, "-m", "app.db.migrate"], env=env, check=True, capture_output=True)
+
+        runs = []
+        for _ in range(args.runs):
+            result = subprocess.run(
+                [sys.executable, "-m", "app.startup_profile", "--child"],
+                env=env, capture_output=True, text=True, check=True,
+            )
+            runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+
+        imports = slowest_imports(env, args.top)
+
+    medians = {step: statistics.median(r[step] for r in runs) for step in STEPS}
+
+    print(f"Cold start over {args.runs} runs (median)")
+    for step in STEPS:
+        print(f"  {step:<18} {medians[step] * 1000:>9.1f} ms")
+    print(f"  provider SDKs loaded by import: {', '.join(runs[0]['sdks_at_import']) or 'none'}")
+
+    print("\nSlowest imports (cumulative / self)")
+    for cumulative, own, name in imports:
+        print(f"  {cumulative / 1000:>9.1f} ms {own / 1000:>9.1f} ms  {name}")
+
+    failures = []
+    if args.max_import is not None and medians["import"] > args.max_import:
+        failures.append(f"import took {medians['import']:.3f}s, limit {args.max_import}s")
+    if args.max_first_request is not None and medians["first_request"] > args.max_first_request:
+        failures.append(f"first request took {medians['first_request']:.3f}s, limit {args.max_first_request}s")
+    if runs[0]["sdks_at_import"]:
+        failures.append("provider SDKs were imported by app.main")
+    for failure in failures:
+        print(f"REGRESSION: {failure}")
+    return 1 if failures else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to list")
+    parser.add_argument("--max-import", type=float, help="seconds allowed for importing app.main")
+    parser.add_argument("--max-first-request", type=float, help="seconds allowed for the first request after startup")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure()))
+        return
+    sys.exit(run(args))
+
+
+if __name__ == "__main__":
+    main()
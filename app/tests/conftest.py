@@ -1,6 +1,8 @@
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import NullPool
 from sqlalchemy.orm import sessionmaker
 import os
 import sys
@@ -10,18 +12,33 @@ from alembic import command
 # Add the parent directory to path so we can import the app modules
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+# Use an in-memory SQLite database for testing
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+
+# Point the app (and its startup migrations) at the test database before it is
+# imported, so the suite never touches legal_assistant.db
+os.environ["DATABASE_URL"] = SQLALCHEMY_DATABASE_URL
+# Tests that need job workers start them explicitly against the test engine
+os.environ["JOB_WORKERS"] = "0"
+
+import main
 from app.db.database import Base, get_db
 from app.models.database import User, Conversation, Message
 from main import app
 
-# Use an in-memory SQLite database for testing
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
-
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# The app itself talks to the same database through the async driver.
+# NullPool keeps connections from outliving the TestClient's event loop.
+async_engine = create_async_engine("sqlite+aiosqlite:///./test.db", poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+# The job pool and last_seen flusher started by the lifespan use the test engine too
+main.async_engine = async_engine
+
 def run_migrations():
     """Run migrations to create all tables in the test database"""
     # Get the path to the alembic configuration file
@@ -40,13 +57,15 @@ def run_migrations():
 def setup_test_db():
     """Setup test database once for all tests"""
     # Create fresh database tables using migrations
-    if os.path.exists("./test.db"):
-        os.remove("./test.db")
+    for path in ("./test.db", "./test.db-wal", "./test.db-shm"):
+        if os.path.exists(path):
+            os.remove(path)
     run_migrations()
     yield
     # Clean up after all tests
-    if os.path.exists("./test.db"):
-        os.remove("./test.db")
+    for path in ("./test.db", "./test.db-wal", "./test.db-shm"):
+        if os.path.exists(path):
+            os.remove(path)
 
 @pytest.fixture(scope="function")
 def test_db():
@@ -58,19 +77,19 @@ def test_db():
     finally:
         db.close()
         # No need to drop tables after each test, we'll clean the specific data instead
-        db.execute("DELETE FROM messages")
-        db.execute("DELETE FROM conversations")
-        db.execute("DELETE FROM users")
+        db.execute(text("DELETE FROM jobs"))
+        db.execute(text("DELETE FROM documents"))
+        db.execute(text("DELETE FROM messages"))
+        db.execute(text("DELETE FROM conversations"))
+        db.execute(text("DELETE FROM users"))
         db.commit()
 
 @pytest.fixture(scope="function")
 def client(test_db):
     # Override the get_db dependency to use the test database
-    def override_get_db():
-        try:
-            yield test_db
-        finally:
-            pass
+    async def override_get_db():
+        async with TestingAsyncSessionLocal() as db:
+            yield db
     
     app.dependency_overrides[get_db] = override_get_db
     
@@ -84,8 +103,43 @@ def client(test_db):
 @pytest.fixture
 def mock_llm_response(monkeypatch):
     # Mock the LLM service to return a predefined response
-    async def mock_get_llm_response(query):
+    async def mock_get_llm_response(query, **kwargs):
         return f"This is a mock response to: {query}"
     
     from app.services import llm_service
-    monkeypatch.setattr(llm_service, "get_llm_response", mock_get_llm_response)
\ No newline at end of file
+    monkeypatch.setattr(llm_service, "get_llm_response", mock_get_llm_response)
+
+@pytest.fixture
+def mock_llm_stream(monkeypatch):
+    # Mock the streaming LLM service to yield the response in a few deltas
+    async def mock_stream_llm_response(query, **kwargs):
+        for delta in ["This is ", "a mock ", f"stream for: {query}"]:
+            yield delta
+
+    from app.services import llm_service
+    monkeypatch.setattr(llm_service, "stream_llm_response", mock_stream_llm_response)
+
+@pytest.fixture(autouse=True)
+def clear_response_cache():
+    # Keep cached answers from leaking between tests
+    import asyncio
+    from app.services.cache import response_cache
+    from app.services.semantic_cache import semantic_cache
+    asyncio.run(response_cache.clear())
+    semantic_cache.clear()
+    yield
+
+@pytest.fixture(autouse=True)
+def clear_session_cache():
+    # Users and conversations are deleted between tests, so forget them too
+    from app.services.sessions import sessions
+    sessions.clear()
+    yield
+
+@pytest.fixture(autouse=True)
+def clear_rate_limits():
+    # Every test starts with full token buckets
+    import asyncio
+    from app.services.admission import rate_limiter
+    asyncio.run(rate_limiter.clear())
+    yield
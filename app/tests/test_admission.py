@@ -0,0 +1,109 @@
+import asyncio
+import pytest
+from app.core.config import settings
+from app.services.admission import (
+    AdmissionRejected, ConcurrencyLimiter, MemoryRateLimitBackend, SQLiteRateLimitBackend
+)
+
+def test_token_bucket_allows_burst_then_waits():
+    """A client may spend its burst, after which it must wait for a refill."""
+    backend = MemoryRateLimitBackend()
+
+    async def run():
+        return [await backend.take("user:a", rate=1.0, burst=2) for _ in range(3)]
+
+    first, second, third = asyncio.run(run())
+    assert first == second == 0
+    assert 0.9 < third <= 1.0
+
+def test_sqlite_buckets_are_shared(tmp_path):
+    """Two workers pointing at the same file draw from the same bucket."""
+    path = str(tmp_path / "limits.db")
+    worker_a = SQLiteRateLimitBackend(path)
+    worker_b = SQLiteRateLimitBackend(path)
+
+    async def run():
+        return [
+            await worker_a.take("user:a", rate=0.1, burst=1),
+            await worker_b.take("user:a", rate=0.1, burst=1),
+            await worker_b.take("user:b", rate=0.1, burst=1),
+        ]
+
+    first, second, other = asyncio.run(run())
+    assert first == 0
+    assert second > 0
+    assert other == 0
+
+def test_concurrency_limiter_rejects_when_queue_full(monkeypatch):
+    """Requests beyond the slots and the wait queue are turned away with a 503."""
+    monkeypatch.setattr(settings, "LLM_MAX_CONCURRENCY", 1)
+    monkeypatch.setattr(settings, "LLM_MAX_QUEUE", 1)
+    limiter = ConcurrencyLimiter()
+
+    async def hold():
+        async with limiter.slot():
+            await asyncio.sleep(0.05)
+        return "ok"
+
+    async def run():
+        limiter.start()
+        return await asyncio.gather(hold(), hold(), hold(), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert results[:2] == ["ok", "ok"]
+    assert isinstance(results[2], AdmissionRejected)
+    assert results[2].status_code == 503
+
+def test_concurrency_limiter_wait_timeout(monkeypatch):
+    """A request that waits longer than the queue timeout is rejected."""
+    monkeypatch.setattr(settings, "LLM_MAX_CONCURRENCY", 1)
+    monkeypatch.setattr(settings, "LLM_QUEUE_TIMEOUT", 0.01)
+    limiter = ConcurrencyLimiter()
+
+    async def hold():
+        async with limiter.slot():
+            await asyncio.sleep(0.1)
+
+    async def run():
+        limiter.start()
+        return await asyncio.gather(hold(), hold(), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert isinstance(results[1], AdmissionRejected)
+
+def test_query_rate_limited_per_user(client, mock_llm_response, test_db, monkeypatch):
+    """A user over their rate gets a 429 with Retry-After; other users are unaffected."""
+    monkeypatch.setattr(settings, "RATE_LIMIT_BURST", 1)
+    monkeypatch.setattr(settings, "RATE_LIMIT_PER_MINUTE", 1)
+
+    first = client.post("/api/query", json={"query": "What is a lease?"}, cookies={"user_id": "user-a"})
+    second = client.post("/api/query", json={"query": "What is a lease?"}, cookies={"user_id": "user-a"})
+    other = client.post("/api/query", json={"query": "What is a lease?"}, cookies={"user_id": "user-b"})
+
+    assert first.status_code == 200
+    assert second.status_code == 429
+    assert 1 <= int(second.headers["retry-after"]) <= 60
+    assert other.status_code == 200
+
+def test_conversation_routes_not_rate_limited(client, test_db, monkeypatch):
+    """Only the LLM endpoints go through admission control."""
+    monkeypatch.setattr(settings, "RATE_LIMIT_BURST", 1)
+    monkeypatch.setattr(settings, "RATE_LIMIT_PER_MINUTE", 1)
+
+    for _ in range(3):
+        assert client.get("/api/conversations").status_code == 200
+
+def request_from(peer, forwarded=None):
+    from starlette.requests import Request
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+    return Request({"type": "http", "headers": headers, "client": (peer, 1234)})
+
+def test_forwarded_for_only_trusted_from_proxies(monkeypatch):
+    """A client cannot pick its own rate-limit key by forging X-Forwarded-For."""
+    from app.api.middleware import client_key
+    monkeypatch.setattr(settings, "TRUSTED_PROXIES", "10.0.0.1, 10.0.0.2")
+
+    assert client_key(request_from("203.0.113.9", "198.51.100.1")) == "ip:203.0.113.9"
+    assert client_key(request_from("10.0.0.1", "198.51.100.1")) == "ip:198.51.100.1"
+    # Only the hops added by trusted proxies are believed
+    assert client_key(request_from("10.0.0.1", "1.2.3.4, 198.51.100.1, 10.0.0.2")) == "ip:198.51.100.1"
@@ -0,0 +1,80 @@
+import asyncio
+import pytest
+from app.services.coalescing import SingleFlight, StreamFanout
+
+def test_single_flight_shares_one_call():
+    """Concurrent callers with the same key share one upstream call."""
+    single_flight = SingleFlight()
+    calls = []
+
+    async def upstream():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    async def run():
+        return await asyncio.gather(*[single_flight.do("key", upstream) for _ in range(10)])
+
+    assert asyncio.run(run()) == ["answer"] * 10
+    assert len(calls) == 1
+    assert len(single_flight) == 0
+
+def test_single_flight_propagates_errors():
+    """Every waiter receives the upstream exception."""
+    single_flight = SingleFlight()
+
+    async def upstream():
+        await asyncio.sleep(0.01)
+        raise ValueError("provider down")
+
+    async def run():
+        return await asyncio.gather(
+            *[single_flight.do("key", upstream) for _ in range(3)],
+            return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, ValueError) for r in results)
+    assert len(single_flight) == 0
+
+def test_stream_fanout_shares_one_stream():
+    """Subscribers with the same key receive every chunk of one upstream stream."""
+    fanout = StreamFanout()
+    calls = []
+
+    async def upstream():
+        calls.append(1)
+        for chunk in ["a", "b", "c"]:
+            await asyncio.sleep(0.005)
+            yield chunk
+
+    async def consume():
+        return [chunk async for chunk in fanout.subscribe("key", upstream)]
+
+    async def run():
+        return await asyncio.gather(*[consume() for _ in range(5)])
+
+    assert asyncio.run(run()) == [["a", "b", "c"]] * 5
+    assert len(calls) == 1
+    assert len(fanout) == 0
+
+def test_stream_fanout_propagates_errors():
+    """A failing upstream stream raises in every subscriber after the chunks it produced."""
+    fanout = StreamFanout()
+
+    async def upstream():
+        yield "a"
+        await asyncio.sleep(0.005)
+        raise ValueError("stream broke")
+
+    async def consume():
+        chunks = []
+        with pytest.raises(ValueError):
+            async for chunk in fanout.subscribe("key", upstream):
+                chunks.append(chunk)
+        return chunks
+
+    async def run():
+        return await asyncio.gather(consume(), consume())
+
+    assert asyncio.run(run()) == [["a"], ["a"]]
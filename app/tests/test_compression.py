@@ -0,0 +1,56 @@
+import uuid
+import pytest
+from app.api import middleware
+from app.api.middleware import negotiate_encoding
+from app.models.database import User, Conversation, Message
+
+@pytest.mark.parametrize("header, encoding", [
+    ("gzip, deflate", "gzip"),
+    ("gzip;q=0, deflate", None),
+    ("identity", None),
+    ("*", "gzip"),
+    ("", None),
+])
+def test_negotiate_gzip(header, encoding, monkeypatch):
+    monkeypatch.setattr(middleware, "brotli", None)
+    assert negotiate_encoding(header) == encoding
+
+def test_negotiate_prefers_brotli_when_installed(monkeypatch):
+    monkeypatch.setattr(middleware, "brotli", object())
+    assert negotiate_encoding("gzip, br") == "br"
+    assert negotiate_encoding("gzip, br;q=0.5") == "gzip"
+
+@pytest.fixture
+def long_conversation(test_db):
+    user_id = str(uuid.uuid4())
+    conversation_id = str(uuid.uuid4())
+    test_db.add(User(id=user_id))
+    test_db.add(Conversation(id=conversation_id, user_id=user_id, title="Lease"))
+    test_db.add_all([
+        Message(conversation_id=conversation_id, role="ai", content=f"## Answer {i}\n\n**Deposit** rules apply.")
+        for i in range(50)
+    ])
+    test_db.commit()
+    return user_id, conversation_id
+
+def test_large_responses_are_compressed(client, long_conversation, monkeypatch):
+    monkeypatch.setattr(middleware, "brotli", None)
+    user_id, conversation_id = long_conversation
+
+    response = client.get(f"/api/conversations/{conversation_id}", cookies={"user_id": user_id}, headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert response.num_bytes_downloaded < len(response.content)
+    assert len(response.json()["messages"]) == 50
+
+    identity = client.get(f"/api/conversations/{conversation_id}", cookies={"user_id": user_id}, headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in identity.headers
+    assert identity.json() == response.json()
+
+def test_small_responses_and_streams_are_not_compressed(client, mock_llm_stream, test_db):
+    small = client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+
+    stream = client.post("/api/query/stream", json={"query": "What is a lease? " * 100}, headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in stream.headers
+    assert stream.text.splitlines()[0].startswith('{"type": "delta"')
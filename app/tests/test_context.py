@@ -0,0 +1,132 @@
+import uuid
+from datetime import datetime, timedelta
+import pytest
+from app.core.config import settings
+from app.models.database import User, Conversation, Message
+from app.services.context import ConversationContext
+from app.services.llm_service import _claude_messages, _gemini_request
+
+def seed_conversation(test_db, turns, summary=None):
+    """Create a conversation with the given (role, content) turns, oldest first."""
+    user_id = str(uuid.uuid4())
+    test_db.add(User(id=user_id))
+    conversation_id = str(uuid.uuid4())
+    test_db.add(Conversation(id=conversation_id, user_id=user_id, summary=summary))
+    start = datetime.utcnow() - timedelta(minutes=len(turns))
+    for i, (role, content) in enumerate(turns):
+        test_db.add(Message(
+            conversation_id=conversation_id,
+            role=role,
+            content=content,
+            created_at=start + timedelta(minutes=i)
+        ))
+    test_db.commit()
+    return user_id, conversation_id
+
+@pytest.fixture
+def captured_context(monkeypatch):
+    calls = []
+
+    async def mock_get_llm_response(query, context=None, **kwargs):
+        calls.append(context)
+        return "ok"
+
+    from app.services import llm_service
+    monkeypatch.setattr(llm_service, "get_llm_response", mock_get_llm_response)
+    return calls
+
+def test_follow_up_receives_history(client, test_db, captured_context):
+    """Follow-up questions are sent with the earlier turns, oldest first."""
+    user_id, conversation_id = seed_conversation(test_db, [
+        ("user", "What is a contract?"),
+        ("ai", "A contract is a legally binding agreement."),
+    ])
+
+    response = client.post(
+        "/api/query",
+        json={"query": "What about breach of contract?", "conversation_id": conversation_id},
+        cookies={"user_id": user_id}
+    )
+
+    assert response.status_code == 200
+    context = captured_context[0]
+    assert [m["content"] for m in context.history] == [
+        "What is a contract?",
+        "A contract is a legally binding agreement.",
+    ]
+
+def test_history_is_trimmed_to_token_budget(client, test_db, captured_context, monkeypatch):
+    """Only the newest turns that fit in the budget are sent, next to the stored summary."""
+    monkeypatch.setattr(settings, "CONTEXT_TOKEN_BUDGET_GEMINI", 60)
+    monkeypatch.setattr(settings, "CONTEXT_TOKEN_BUDGET_CLAUDE", 60)
+    user_id, conversation_id = seed_conversation(test_db, [
+        ("user", "old question " * 20),
+        ("ai", "old answer " * 20),
+        ("user", "recent question"),
+        ("ai", "recent answer"),
+    ], summary="The user asked about contracts.")
+
+    client.post(
+        "/api/query",
+        json={"query": "And now?", "conversation_id": conversation_id},
+        cookies={"user_id": user_id}
+    )
+
+    context = captured_context[0]
+    assert [m["content"] for m in context.history] == ["recent question", "recent answer"]
+    assert context.summary == "The user asked about contracts."
+    assert context.needs_summary
+
+def test_claude_messages_alternate_roles():
+    """Stored turns are mapped to alternating Claude roles ending with the query."""
+    context = ConversationContext(history=[
+        {"role": "ai", "content": "orphaned answer"},
+        {"role": "user", "content": "q1"},
+        {"role": "ai", "content": "a1"},
+    ])
+    messages = _claude_messages("q2", context)
+    assert messages == [
+        {"role": "user", "content": "q1"},
+        {"role": "assistant", "content": "a1"},
+        {"role": "user", "content": "q2"},
+    ]
+
+def test_gemini_prompt_includes_summary_and_history():
+    """The Gemini prompt carries the summary and transcript before the query."""
+    context = ConversationContext(
+        history=[{"role": "user", "content": "q1"}, {"role": "ai", "content": "a1"}],
+        summary="Earlier: leases.",
+    )
+    prompt = _gemini_request("q2", context)["contents"]
+    assert "Earlier: leases." in prompt
+    assert prompt.index("User: q1") < prompt.index("Assistant: a1") < prompt.index("User: q2")
+
+def test_refresh_summary_folds_old_turns(test_db, monkeypatch):
+    """Turns older than the window are folded into the stored summary once."""
+    import asyncio
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlalchemy.pool import NullPool
+    from app.services import llm_service
+    from app.services.context import refresh_summary_task
+
+    folded = []
+
+    async def mock_summarize(summary, history):
+        folded.append([m["content"] for m in history])
+        return f"{summary} + {len(history)} turns"
+
+    monkeypatch.setattr(llm_service, "summarize_conversation", mock_summarize)
+
+    _, conversation_id = seed_conversation(test_db, [
+        ("user", "q1"), ("ai", "a1"), ("user", "q2"), ("ai", "a2"),
+    ], summary="start")
+    window_start = test_db.query(Message).filter(Message.content == "q2").one().created_at
+
+    engine = create_async_engine("sqlite+aiosqlite:///./test.db", poolclass=NullPool)
+    asyncio.run(refresh_summary_task(conversation_id, window_start, engine))
+    asyncio.run(refresh_summary_task(conversation_id, window_start, engine))
+
+    test_db.expire_all()
+    conversation = test_db.get(Conversation, conversation_id)
+    assert folded == [["q1", "a1"]]
+    assert conversation.summary == "start + 2 turns"
@@ -148,4 +148,130 @@ def test_get_conversation_wrong_user(client, test_db):
     
     # Should return 404 (not 403, to avoid leaking information)
     assert response.status_code == 404
-    assert "Conversation not found" in response.json()["detail"]
\ No newline at end of file
+    assert "Conversation not found" in response.json()["detail"]
+
+def test_get_conversations_summaries(client, test_db):
+    """Listings carry message counts and a preview of the latest message, not the messages."""
+    user_id = str(uuid.uuid4())
+    test_db.add(User(id=user_id))
+    conversation_id = str(uuid.uuid4())
+    test_db.add(Conversation(id=conversation_id, user_id=user_id, title="Leases"))
+    test_db.add(Message(
+        conversation_id=conversation_id,
+        role="user",
+        content="What is a lease?",
+        created_at=datetime.utcnow() - timedelta(minutes=1)
+    ))
+    test_db.add(Message(
+        conversation_id=conversation_id,
+        role="ai",
+        content="A lease is a contract granting use of land.",
+        created_at=datetime.utcnow()
+    ))
+    test_db.commit()
+
+    response = client.get("/api/conversations", cookies={"user_id": user_id})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data) == 1
+    assert data[0]["message_count"] == 2
+    assert data[0]["last_message_preview"] == "A lease is a contract granting use of land."
+    assert "messages" not in data[0]
+    assert "X-Next-Cursor" not in response.headers
+
+def test_get_conversations_pagination(client, test_db):
+    """Conversations are paged with a keyset cursor in the X-Next-Cursor header."""
+    user_id = str(uuid.uuid4())
+    test_db.add(User(id=user_id))
+    now = datetime.utcnow()
+    for i in range(5):
+        test_db.add(Conversation(
+            user_id=user_id,
+            title=f"Conversation {i}",
+            updated_at=now - timedelta(minutes=i)
+        ))
+    test_db.commit()
+
+    titles = []
+    cursor = None
+    for _ in range(3):
+        params = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/api/conversations", params=params, cookies={"user_id": user_id})
+        assert response.status_code == 200
+        titles += [c["title"] for c in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+
+    assert titles == [f"Conversation {i}" for i in range(5)]
+    assert cursor is None
+
+def test_get_conversations_invalid_cursor(client, test_db):
+    """A malformed cursor is rejected."""
+    response = client.get(
+        "/api/conversations",
+        params={"cursor": "not-a-cursor"},
+        cookies={"user_id": str(uuid.uuid4())}
+    )
+    assert response.status_code == 400
+
+def seed_messages(test_db, count):
+    user_id = str(uuid.uuid4())
+    test_db.add(User(id=user_id))
+    conversation_id = str(uuid.uuid4())
+    test_db.add(Conversation(id=conversation_id, user_id=user_id))
+    start = datetime.utcnow() - timedelta(minutes=count)
+    for i in range(count):
+        test_db.add(Message(
+            conversation_id=conversation_id,
+            role="user" if i % 2 == 0 else "ai",
+            content=f"message {i}",
+            created_at=start + timedelta(minutes=i)
+        ))
+    test_db.commit()
+    return user_id, conversation_id
+
+def test_get_conversation_messages_pages_backwards(client, test_db):
+    """Messages are paged from newest to oldest, each page in chronological order."""
+    user_id, conversation_id = seed_messages(test_db, 5)
+    url = f"/api/conversations/{conversation_id}/messages"
+
+    first = client.get(url, params={"limit": 2}, cookies={"user_id": user_id}).json()
+    assert [m["content"] for m in first["messages"]] == ["message 3", "message 4"]
+
+    second = client.get(url, params={"limit": 2, "before": first["before_cursor"]}, cookies={"user_id": user_id}).json()
+    assert [m["content"] for m in second["messages"]] == ["message 1", "message 2"]
+
+    third = client.get(url, params={"limit": 2, "before": second["before_cursor"]}, cookies={"user_id": user_id}).json()
+    assert [m["content"] for m in third["messages"]] == ["message 0"]
+    assert third["before_cursor"] is None
+
+def test_get_conversation_messages_polls_newer(client, test_db):
+    """?after= returns only messages newer than the cursor."""
+    user_id, conversation_id = seed_messages(test_db, 3)
+    url = f"/api/conversations/{conversation_id}/messages"
+
+    page = client.get(url, cookies={"user_id": user_id}).json()
+    assert len(page["messages"]) == 3
+
+    empty = client.get(url, params={"after": page["after_cursor"]}, cookies={"user_id": user_id}).json()
+    assert empty["messages"] == []
+    assert empty["after_cursor"] == page["after_cursor"]
+
+    test_db.add(Message(conversation_id=conversation_id, role="user", content="new message"))
+    test_db.commit()
+
+    newer = client.get(url, params={"after": page["after_cursor"]}, cookies={"user_id": user_id}).json()
+    assert [m["content"] for m in newer["messages"]] == ["new message"]
+
+def test_get_conversation_messages_wrong_user(client, test_db):
+    """Another user's conversation is not found."""
+    _, conversation_id = seed_messages(test_db, 1)
+    response = client.get(
+        f"/api/conversations/{conversation_id}/messages",
+        cookies={"user_id": str(uuid.uuid4())}
+    )
+    assert response.status_code == 404
@@ -0,0 +1,120 @@
+import time
+import uuid
+import pytest
+from app.core.config import settings
+from app.models.database import User, Conversation
+from app.services.retrieval import retriever
+
+CONTRACT = """TENANCY AGREEMENT
+
+1. Rent
+The tenant shall pay a monthly rent of KES 40,000 on the first day of each month.
+
+2. Deposit
+A deposit equal to two months rent is refundable at the end of the tenancy.
+"""
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DOCUMENT_STORAGE_DIR", str(tmp_path / "uploads"))
+    monkeypatch.setattr(settings, "RETRIEVAL_INDEX_DIR", str(tmp_path / "index"))
+    return tmp_path
+
+@pytest.fixture
+def conversation(test_db):
+    user_id = str(uuid.uuid4())
+    test_db.add(User(id=user_id))
+    conversation = Conversation(user_id=user_id, title="Lease review")
+    test_db.add(conversation)
+    test_db.commit()
+    return user_id, conversation.id
+
+def wait_for_status(client, url, user_id, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        document = client.get(url, cookies={"user_id": user_id}).json()
+        if document["status"] in ("indexed", "failed"):
+            return document
+        time.sleep(0.1)
+    raise AssertionError("document was not ingested in time")
+
+def test_upload_document_is_indexed_for_conversation(client, storage, conversation):
+    """An uploaded document is ingested in the background and searchable in its conversation."""
+    user_id, conversation_id = conversation
+    response = client.post(
+        f"/api/conversations/{conversation_id}/documents",
+        files={"file": ("tenancy.txt", CONTRACT.encode(), "text/plain")},
+        cookies={"user_id": user_id}
+    )
+    assert response.status_code == 202
+    document = response.json()
+    assert document["status"] == "pending"
+    assert document["size"] == len(CONTRACT.encode())
+
+    url = f"/api/conversations/{conversation_id}/documents/{document['id']}"
+    document = wait_for_status(client, url, user_id)
+    assert document["status"] == "indexed"
+    assert document["chunk_count"] >= 2
+
+    passages = retriever.search("refundable deposit", k=1, conversation_id=conversation_id)
+    assert passages[0]["source"] == "tenancy.txt"
+    assert passages[0]["section"] == "2. Deposit"
+
+    listing = client.get(f"/api/conversations/{conversation_id}/documents", cookies={"user_id": user_id})
+    assert [d["id"] for d in listing.json()] == [document["id"]]
+
+def test_upload_rejects_unsupported_type(client, storage, conversation):
+    """Only text and PDF documents are accepted."""
+    user_id, conversation_id = conversation
+    response = client.post(
+        f"/api/conversations/{conversation_id}/documents",
+        files={"file": ("scan.png", b"\x89PNG", "image/png")},
+        cookies={"user_id": user_id}
+    )
+    assert response.status_code == 415
+
+def test_upload_rejects_oversized_document(client, storage, conversation, monkeypatch):
+    """Uploads over the size limit are refused and not kept on disk."""
+    monkeypatch.setattr(settings, "DOCUMENT_MAX_BYTES", 16)
+    user_id, conversation_id = conversation
+    response = client.post(
+        f"/api/conversations/{conversation_id}/documents",
+        files={"file": ("tenancy.txt", CONTRACT.encode(), "text/plain")},
+        cookies={"user_id": user_id}
+    )
+    assert response.status_code == 413
+    assert list((storage / "uploads" / conversation_id).iterdir()) == []
+
+def test_upload_to_other_users_conversation(client, storage, conversation):
+    """Documents can only be attached to the caller's own conversations."""
+    _, conversation_id = conversation
+    response = client.post(
+        f"/api/conversations/{conversation_id}/documents",
+        files={"file": ("tenancy.txt", CONTRACT.encode(), "text/plain")},
+        cookies={"user_id": str(uuid.uuid4())}
+    )
+    assert response.status_code == 404
+
+def test_upload_rejected_from_content_length(client, storage, conversation, monkeypatch):
+    """A declared body far over the limit is refused before any of it is read."""
+    monkeypatch.setattr(settings, "DOCUMENT_MAX_BYTES", 16)
+    user_id, conversation_id = conversation
+    response = client.post(
+        f"/api/conversations/{conversation_id}/documents",
+        content=b"x" * 100 * 1024,
+        headers={"Content-Type": "multipart/form-data; boundary=x"},
+        cookies={"user_id": user_id}
+    )
+    assert response.status_code == 413
+    assert not (storage / "uploads" / conversation_id).exists()
+
+def test_index_locks_are_released(client, storage, conversation):
+    from app.services.ingestion import ingestion_pool
+    user_id, conversation_id = conversation
+    response = client.post(
+        f"/api/conversations/{conversation_id}/documents",
+        files={"file": ("tenancy.txt", CONTRACT.encode(), "text/plain")},
+        cookies={"user_id": user_id}
+    )
+    wait_for_status(client, f"/api/conversations/{conversation_id}/documents/{response.json()['id']}", user_id)
+    assert conversation_id not in ingestion_pool._index_locks
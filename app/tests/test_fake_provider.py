@@ -0,0 +1,63 @@
+import asyncio
+import anthropic
+import httpx
+from app.benchmarks.fake_provider import FakeProvider, build_app
+
+def fake_client(**kwargs):
+    options = dict(ttft=0.001, ttft_sigma=0.1, tokens_per_second=10000, output_tokens=20, error_rate=0)
+    options.update(kwargs)
+    transport = httpx.ASGITransport(app=build_app(FakeProvider(**options)))
+    return anthropic.AsyncAnthropic(
+        api_key="load-test",
+        base_url="http://fake-provider",
+        http_client=httpx.AsyncClient(transport=transport),
+        max_retries=0,
+    )
+
+def test_fake_provider_speaks_messages_api():
+    """The Anthropic SDK can read the fake provider's plain and streamed answers."""
+    async def run():
+        client = fake_client()
+        request = dict(model="fake", max_tokens=100, messages=[{"role": "user", "content": "What is a lease?"}])
+        response = await client.messages.create(**request)
+        async with client.messages.stream(**request) as stream:
+            deltas = [text async for text in stream.text_stream]
+            final = await stream.get_final_message()
+        return response, deltas, final
+
+    response, deltas, final = asyncio.run(run())
+    assert response.content[0].text
+    assert response.usage.output_tokens > 0
+    assert len(deltas) > 1
+    assert final.usage.output_tokens == len("".join(deltas).split())
+
+def test_fake_provider_errors():
+    """Injected failures surface as retryable API errors."""
+    async def run():
+        return await fake_client(error_rate=1).messages.create(
+            model="fake", max_tokens=100, messages=[{"role": "user", "content": "What is a lease?"}]
+        )
+
+    try:
+        asyncio.run(run())
+    except anthropic.APIStatusError as e:
+        assert e.status_code in (500, 529)
+    else:
+        raise AssertionError("expected an API error")
+
+def test_fake_provider_reports_prompt_cache_usage():
+    """A cache_control prefix is written on the first call and read on the next."""
+    async def run():
+        client = fake_client()
+        request = dict(
+            model="fake", max_tokens=100,
+            system=[{"type": "text", "text": "You are a legal assistant.", "cache_control": {"type": "ephemeral"}}],
+            messages=[{"role": "user", "content": "What is a lease?"}],
+        )
+        first = await client.messages.create(**request)
+        second = await client.messages.create(**request)
+        return first.usage, second.usage
+
+    first, second = asyncio.run(run())
+    assert first.cache_creation_input_tokens > 0 and not first.cache_read_input_tokens
+    assert second.cache_read_input_tokens == first.cache_creation_input_tokens
@@ -0,0 +1,118 @@
+import uuid
+import pytest
+from app.core.config import settings
+from app.models.database import Conversation, Message, Job
+from app.services.jobs import job_pool
+from app.services.provider_router import ProviderUnavailable
+from tests.conftest import async_engine
+
+@pytest.fixture
+def workers(client, monkeypatch):
+    # Point the job workers at the test database
+    monkeypatch.setattr(settings, "JOB_POLL_INTERVAL", 0.05)
+    client.portal.call(job_pool.close)
+    client.portal.call(job_pool.start, async_engine, 2)
+    yield
+    client.portal.call(job_pool.close)
+
+def test_async_query_returns_job(client, workers, mock_llm_response, test_db):
+    """An async query answers 202 with a job that long-polls to the result."""
+    response = client.post("/api/query", json={"query": "What is a contract?", "async_mode": True})
+
+    assert response.status_code == 202
+    job = response.json()
+    assert job["status"] in ("queued", "running")
+    assert response.headers["location"] == f"/api/jobs/{job['id']}"
+    user_id = response.cookies["user_id"]
+
+    result = client.get(f"/api/jobs/{job['id']}", params={"wait": 10}, cookies={"user_id": user_id}).json()
+    assert result["status"] == "succeeded"
+    assert result["response"] == "This is a mock response to: What is a contract?"
+
+    conversation = test_db.query(Conversation).filter(Conversation.id == result["conversation_id"]).first()
+    assert conversation.user_id == user_id
+    assert test_db.query(Message).filter(Message.conversation_id == conversation.id).count() == 2
+
+def test_job_for_unknown_conversation_fails(client, workers, mock_llm_response, test_db):
+    """Validation errors are reported on the job rather than the request."""
+    response = client.post(
+        "/api/query",
+        json={"query": "What is a contract?", "conversation_id": str(uuid.uuid4()), "async_mode": True},
+        cookies={"user_id": "job-user"}
+    )
+    job_id = response.json()["id"]
+
+    result = client.get(f"/api/jobs/{job_id}", params={"wait": 10}, cookies={"user_id": "job-user"}).json()
+    assert result["status"] == "failed"
+    assert result["error"] == "Conversation not found"
+
+def test_job_requeued_when_providers_unavailable(client, workers, monkeypatch, test_db):
+    """A job is retried when no provider could answer, up to JOB_MAX_ATTEMPTS."""
+    calls = []
+
+    async def flaky_llm_response(query, **kwargs):
+        calls.append(query)
+        if len(calls) == 1:
+            raise ProviderUnavailable()
+        return "Answer after retry"
+
+    from app.services import llm_service
+    monkeypatch.setattr(llm_service, "get_llm_response", flaky_llm_response)
+
+    response = client.post("/api/query", json={"query": "What is a tort?", "async_mode": True}, cookies={"user_id": "job-user"})
+    result = client.get(f"/api/jobs/{response.json()['id']}", params={"wait": 10}, cookies={"user_id": "job-user"}).json()
+
+    assert result["status"] == "succeeded"
+    assert result["response"] == "Answer after retry"
+    assert test_db.query(Job).filter(Job.id == result["id"]).first().attempts == 2
+
+def test_job_not_visible_to_other_users(client, test_db):
+    """Jobs can only be read by the user who submitted them."""
+    response = client.post("/api/query", json={"query": "What is a contract?", "async_mode": True}, cookies={"user_id": "job-user"})
+
+    other = client.get(f"/api/jobs/{response.json()['id']}", cookies={"user_id": "someone-else"})
+    assert other.status_code == 404
+
+def test_expired_job_fails_after_max_attempts(client, monkeypatch, test_db):
+    """A job whose lease keeps expiring is not claimed forever."""
+    from datetime import datetime, timedelta
+    monkeypatch.setattr(settings, "JOB_MAX_ATTEMPTS", 2)
+    expired = datetime.utcnow() - timedelta(minutes=1)
+    for job_id, attempts in (("retry", 1), ("give-up", 2)):
+        test_db.add(Job(id=job_id, user_id="u", query="q", status="running", attempts=attempts, created_at=expired, lease_until=expired))
+    test_db.commit()
+
+    # Claim directly, without workers racing for the jobs
+    client.portal.call(job_pool.close)
+    client.portal.call(job_pool.start, async_engine, 0)
+    job = client.portal.call(job_pool._claim)
+
+    assert job.id == "retry"
+    test_db.expire_all()
+    failed = test_db.get(Job, "give-up")
+    assert failed.status == "failed"
+    assert failed.finished_at is not None
+
+def test_abandoned_sweep_runs_once_per_lease(client, monkeypatch, test_db):
+    """Idle polls within a lease period do not write to the jobs table."""
+    from datetime import datetime, timedelta
+    monkeypatch.setattr(settings, "JOB_MAX_ATTEMPTS", 1)
+    client.portal.call(job_pool.close)
+    client.portal.call(job_pool.start, async_engine, 0)
+    assert client.portal.call(job_pool._claim) is None
+
+    expired = datetime.utcnow() - timedelta(minutes=1)
+    test_db.add(Job(id="stuck", user_id="u", query="q", status="running", attempts=1, created_at=expired, lease_until=expired))
+    test_db.commit()
+    assert client.portal.call(job_pool._claim) is None
+    test_db.expire_all()
+    assert test_db.get(Job, "stuck").status == "running"
+
+    monkeypatch.setattr(job_pool, "_next_sweep", 0.0)
+    client.portal.call(job_pool._claim)
+    test_db.expire_all()
+    assert test_db.get(Job, "stuck").status == "failed"
+
+def test_wait_does_not_leak_events(client):
+    client.portal.call(job_pool.wait, "unknown-job", 0.01)
+    assert "unknown-job" not in job_pool._finished
@@ -0,0 +1,59 @@
+
+def metric_lines(client, name):
+    body = client.get("/metrics").text
+    return [line for line in body.splitlines() if line.startswith(name)]
+
+def test_metrics_endpoint_exposes_route_histograms(client, mock_llm_response, test_db):
+    """Requests are recorded under their route template, not the raw path."""
+    client.post("/api/query", json={"query": "What is a contract?"})
+    client.get("/api/conversations/does-not-exist", cookies={"user_id": "metrics-user"})
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+
+    lines = metric_lines(client, "http_request_duration_seconds_count")
+    assert any('route="/api/query"' in line and 'status="200"' in line for line in lines)
+    assert any('route="/api/conversations/{conversation_id}"' in line and 'status="404"' in line for line in lines)
+    assert not any("does-not-exist" in line for line in lines)
+
+def stage_count(client, stage):
+    lines = metric_lines(client, f'query_stage_duration_seconds_count{{stage="{stage}"}}')
+    return float(lines[0].split()[-1]) if lines else 0.0
+
+def test_metrics_include_query_stages_and_state(client, mock_llm_response, test_db):
+    """Stage timers and scrape-time gauges show up in the exposition."""
+    client.post("/api/query", json={"query": "What is a lease?"})
+
+    stages = metric_lines(client, "query_stage_duration_seconds_count")
+    for stage in ("db_read", "db_write"):
+        assert any(f'stage="{stage}"' in line for line in stages)
+
+    assert metric_lines(client, "response_cache_hit_ratio")
+    assert metric_lines(client, "db_pool_checked_out")
+    assert metric_lines(client, "llm_slots_in_use")
+
+def test_metrics_count_prompt_cache_tokens(client):
+    """Prompt-cache reads and writes are reported as their own token kinds."""
+    from types import SimpleNamespace
+    from app.services.llm_service import record_claude_usage
+
+    record_claude_usage(SimpleNamespace(input_tokens=10, output_tokens=5, cache_read_input_tokens=900, cache_creation_input_tokens=0))
+
+    lines = metric_lines(client, "llm_tokens_total")
+    assert any('kind="cache_read"' in line and 'provider="claude"' in line for line in lines)
+
+def test_streamed_query_records_time_to_first_token(client, monkeypatch, test_db):
+    """The real streaming path times the first delta from the provider."""
+    from app.services import llm_service
+
+    async def mock_stream_provider_response(provider, query, context=None, route=None):
+        for delta in ["A lease ", "is a contract."]:
+            yield delta
+
+    monkeypatch.setattr(llm_service, "stream_provider_response", mock_stream_provider_response)
+    before = stage_count(client, "llm_ttft")
+
+    response = client.post("/api/query/stream", json={"query": "What is a lease?"})
+    assert response.status_code == 200
+    assert stage_count(client, "llm_ttft") == before + 1
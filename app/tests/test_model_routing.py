@@ -0,0 +1,95 @@
+import json
+import pytest
+from types import SimpleNamespace
+from app.core.config import settings
+from app.models.database import Message
+from app.services import llm_service, model_routing
+from app.services.model_routing import choose_route, heuristic_classifier
+
+@pytest.mark.parametrize("query, tier", [
+    ("What is consideration?", "simple"),
+    ("Define adverse possession", "simple"),
+    ("Can my landlord keep the deposit for normal wear?", "standard"),
+    ("How do I appeal a small claims judgment and what deadlines apply?", "complex"),
+    ("1) Is the clause valid; 2) can I terminate; 3) what are the damages?", "complex"),
+    (" ".join(["word"] * 60), "complex"),
+])
+def test_heuristic_tiers(query, tier):
+    assert heuristic_classifier(query) == tier
+
+def test_routes_use_configured_tokens_and_models(monkeypatch):
+    monkeypatch.setattr(settings, "CLAUDE_MODEL_SIMPLE", "claude-small")
+    route = choose_route("What is consideration?")
+
+    assert (route.tier, route.max_tokens) == ("simple", settings.MAX_TOKENS_SIMPLE)
+    assert route.model("claude") == "claude-small"
+    # Tiers without a model of their own use the provider default
+    assert choose_route("How do I appeal, and by when?").model("claude") == settings.LLM_MODEL
+    assert route.model("gemini") == settings.GEMINI_MODEL
+
+def test_routing_can_be_disabled_or_replaced(monkeypatch):
+    monkeypatch.setattr(settings, "MODEL_ROUTING", False)
+    assert choose_route("What is consideration?").tier == "standard"
+
+    monkeypatch.setattr(settings, "MODEL_ROUTING", True)
+    monkeypatch.setattr(model_routing, "_classifier", lambda query, context: "complex")
+    assert choose_route("What is consideration?").tier == "complex"
+
+@pytest.fixture
+def claude_calls(monkeypatch):
+    """Answer through a fake Claude client that records its requests."""
+    calls = []
+
+    async def create(**request):
+        calls.append(request)
+        return SimpleNamespace(
+            content=[SimpleNamespace(text=f"answer from {request['model']}")],
+            usage=SimpleNamespace(input_tokens=10, output_tokens=5),
+        )
+
+    client = SimpleNamespace(messages=SimpleNamespace(create=create))
+    monkeypatch.setattr(settings, "LLM_PROVIDER", "claude")
+    monkeypatch.setattr(settings, "LLM_FALLBACK_PROVIDERS", "")
+    monkeypatch.setattr(settings, "CLAUDE_MODEL_SIMPLE", "claude-small")
+    monkeypatch.setattr(settings, "CLAUDE_MODEL_COMPLEX", "claude-large")
+    monkeypatch.setattr(llm_service.clients, "get", lambda provider: client)
+    return calls
+
+def test_route_is_recorded_per_message(client, claude_calls, test_db):
+    """Each tier reaches the provider with its own model and max_tokens, and the ai message keeps the route."""
+    simple = client.post("/api/query", json={"query": "What is consideration?"})
+    complex_ = client.post("/api/query", json={"query": "How do I appeal a judgment, and what are the steps?"})
+
+    assert [(call["model"], call["max_tokens"]) for call in claude_calls] == [
+        ("claude-small", settings.MAX_TOKENS_SIMPLE),
+        ("claude-large", settings.MAX_TOKENS_COMPLEX),
+    ]
+    assert simple.json()["response"] == "answer from claude-small"
+
+    messages = test_db.query(Message).filter(
+        Message.conversation_id.in_([simple.json()["conversation_id"], complex_.json()["conversation_id"]]),
+        Message.role == "ai",
+    )
+    routes = {message.route: message for message in messages}
+    assert routes["simple"].model == "claude-small"
+    assert routes["complex"].model == "claude-large"
+    assert all(message.latency_ms is not None for message in routes.values())
+
+def test_cached_answers_have_no_route(client, mock_llm_response, test_db):
+    first = client.post("/api/query", json={"query": "What is a lease?"}).json()
+    again = client.post("/api/query", json={"query": "What is a lease?"}).json()
+    assert again["cached"] is True
+
+    route_of = lambda conversation_id: test_db.query(Message.route).filter(
+        Message.conversation_id == conversation_id, Message.role == "ai"
+    ).scalar()
+    assert route_of(first["conversation_id"]) == "simple"
+    assert route_of(again["conversation_id"]) is None
+
+def test_streamed_answers_record_route(client, mock_llm_stream, test_db):
+    response = client.post("/api/query/stream", json={"query": "What is a lease?"})
+    done = json.loads(response.text.splitlines()[-1])
+    message = test_db.query(Message).filter(Message.conversation_id == done["conversation_id"], Message.role == "ai").one()
+
+    assert (message.route, message.model) == ("simple", settings.GEMINI_MODEL)
+    assert message.latency_ms is not None
@@ -0,0 +1,159 @@
+import asyncio
+import pytest
+from types import SimpleNamespace
+from app.core.config import settings
+from app.models.database import Message
+from app.services import llm_service
+from app.services.context import ConversationContext
+from app.services.llm_service import GeminiContextCache, _claude_request, _gemini_request
+from app.services.prompts import ANSWER, PromptRegistry, prompts
+
+def history_context():
+    return ConversationContext(
+        history=[{"role": "user", "content": "q1"}, {"role": "ai", "content": "a1"}],
+        summary="Earlier: leases.",
+    )
+
+def test_registry_returns_latest_version():
+    """New versions take over; older ones stay reachable."""
+    registry = PromptRegistry()
+    registry.register("answer", "1", claude="old")
+    registry.register("answer", "2", claude="new", gemini="new for gemini")
+
+    assert registry.get("answer").id == "answer@2"
+    assert registry.get("answer").system("gemini") == "new for gemini"
+    assert registry.get("answer", "1").system("gemini") == "old"
+    with pytest.raises(ValueError):
+        registry.register("answer", "2", claude="again")
+
+def test_claude_request_marks_cacheable_prefixes(monkeypatch):
+    """The system prompt, the summary and the history before the query are cache breakpoints."""
+    monkeypatch.setattr(settings, "PROMPT_CACHE", True)
+    monkeypatch.setattr(settings, "PROMPT_CACHE_MIN_TOKENS", 0)
+    request = _claude_request("q2", history_context())
+
+    system = request["system"]
+    assert system[0]["text"] == prompts.get(ANSWER).system("claude")
+    assert all(block["cache_control"] == {"type": "ephemeral"} for block in system)
+    assert "Earlier: leases." in system[1]["text"]
+
+    messages = request["messages"]
+    assert messages[-2]["content"] == [{"type": "text", "text": "a1", "cache_control": {"type": "ephemeral"}}]
+    assert messages[-1]["content"] == "q2"
+
+    # Requests never share the template's blocks
+    assert _claude_request("q3")["messages"] == [{"role": "user", "content": "q3"}]
+
+def test_claude_request_leaves_short_or_sliding_prefixes_unmarked(monkeypatch):
+    """Prefixes below the minimum cacheable size, and history about to slide, get no breakpoint."""
+    monkeypatch.setattr(settings, "PROMPT_CACHE", True)
+    request = _claude_request("q2", history_context())
+    assert not any("cache_control" in block for block in request["system"])
+    assert request["messages"][-2]["content"] == "a1"
+
+    monkeypatch.setattr(settings, "PROMPT_CACHE_MIN_TOKENS", 0)
+    context = history_context()
+    context.needs_summary = True
+    request = _claude_request("q2", context)
+    assert all("cache_control" in block for block in request["system"])
+    assert request["messages"][-2]["content"] == "a1"
+
+def test_marked_history_prefix_is_stable_across_turns(client, monkeypatch, test_db):
+    """The prefix cached on one turn is repeated unchanged by the next, so it is read back."""
+    requests = []
+
+    async def create(**request):
+        requests.append(request)
+        return SimpleNamespace(
+            content=[SimpleNamespace(text=f"Answer {len(requests)}: " + "the deposit rules apply. " * 20)],
+            usage=SimpleNamespace(input_tokens=10, output_tokens=5),
+        )
+
+    claude = SimpleNamespace(messages=SimpleNamespace(create=create))
+    monkeypatch.setattr(settings, "LLM_PROVIDER", "claude")
+    monkeypatch.setattr(settings, "LLM_FALLBACK_PROVIDERS", "")
+    monkeypatch.setattr(settings, "PROMPT_CACHE", True)
+    monkeypatch.setattr(settings, "PROMPT_CACHE_MIN_TOKENS", 200)
+    monkeypatch.setattr(llm_service.clients, "get", lambda provider: claude)
+
+    first = client.post("/api/query", json={"query": "What does a tenant need to know about deposits? " * 8})
+    cookies = {"user_id": first.cookies["user_id"]}
+    for topic in ("repairs", "notice periods", "rent increases"):
+        body = {"query": f"What does a tenant need to know about {topic}? " * 8, "conversation_id": first.json()["conversation_id"]}
+        assert client.post("/api/query", json=body, cookies=cookies).status_code == 200
+
+    def text(message):
+        content = message["content"]
+        return content if isinstance(content, str) else "".join(block["text"] for block in content)
+
+    def marked_prefix(request):
+        for i, message in enumerate(request["messages"]):
+            if not isinstance(message["content"], str) and message["content"][-1].get("cache_control"):
+                return [(m["role"], text(m)) for m in request["messages"][:i + 1]]
+
+    assert marked_prefix(requests[0]) is None
+    for previous, current in zip(requests[1:], requests[2:]):
+        prefix = marked_prefix(previous)
+        assert prefix
+        assert current["system"] == previous["system"]
+        assert [(m["role"], text(m)) for m in current["messages"][:len(prefix)]] == prefix
+
+def test_claude_request_without_prompt_cache(monkeypatch):
+    monkeypatch.setattr(settings, "PROMPT_CACHE", False)
+    request = _claude_request("q2", history_context())
+
+    assert not any("cache_control" in block for block in request["system"])
+    assert all(isinstance(message["content"], str) for message in request["messages"])
+
+def test_gemini_request_uses_cached_instruction():
+    """A context cache replaces the inline system instruction."""
+    inline = _gemini_request("q")["config"]
+    assert inline.system_instruction == prompts.get(ANSWER).system("gemini")
+    assert inline.cached_content is None
+
+    cached = _gemini_request("q", cached_content="cachedContents/abc")["config"]
+    assert cached.system_instruction is None
+    assert cached.cached_content == "cachedContents/abc"
+
+def test_gemini_context_cache_is_created_once(monkeypatch):
+    """Concurrent calls share one cache, and a failed creation falls back to inline prompts."""
+    monkeypatch.setattr(settings, "PROMPT_CACHE", True)
+    created = []
+
+    async def create(model, config):
+        created.append((model, config.display_name))
+        await asyncio.sleep(0.01)
+        return SimpleNamespace(name=f"cachedContents/{len(created)}")
+
+    async def fail(model, config):
+        raise RuntimeError("Cached content is too small")
+
+    template = prompts.get(ANSWER)
+
+    async def run(create):
+        cache = GeminiContextCache()
+        client = SimpleNamespace(caches=SimpleNamespace(create=create))
+        return await asyncio.gather(*(cache.name(client, "gemini-2.0-flash", template) for _ in range(5)))
+
+    assert asyncio.run(run(create)) == ["cachedContents/1"] * 5
+    assert created == [("gemini-2.0-flash", template.id)]
+    assert asyncio.run(run(fail)) == [None] * 5
+
+def test_answers_record_prompt_version(client, mock_llm_response, test_db):
+    """Every stored answer names the prompt template that produced it."""
+    response = client.post("/api/query", json={"query": "What is a lease?"})
+    conversation_id = response.json()["conversation_id"]
+
+    messages = test_db.query(Message).filter(Message.conversation_id == conversation_id).all()
+    versions = {message.role: message.prompt_version for message in messages}
+    assert versions["user"] is None
+    assert versions["ai"] == prompts.get(ANSWER).id
+
+def test_response_cache_key_follows_prompt_version(monkeypatch):
+    """Answers cached under one prompt version are not served for another."""
+    key = llm_service.response_cache_key("What is a lease?")
+    registry = PromptRegistry()
+    registry.register(ANSWER, "1", claude="one")
+    monkeypatch.setattr(llm_service, "ANSWER_PROMPT", registry.register(ANSWER, "2", claude="two"))
+
+    assert llm_service.response_cache_key("What is a lease?") != key
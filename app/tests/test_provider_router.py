@@ -0,0 +1,167 @@
+import asyncio
+import pytest
+from app.core.config import settings
+from app.services.provider_router import ProviderRouter, ProviderUnavailable, CircuitBreaker
+
+class Transient(Exception):
+    status_code = 503
+
+class BadRequest(Exception):
+    status_code = 400
+
+def retryable(error):
+    return isinstance(error, (Transient, TimeoutError))
+
+@pytest.fixture
+def routing(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_PROVIDER", "claude")
+    monkeypatch.setattr(settings, "LLM_FALLBACK_PROVIDERS", "gemini")
+    monkeypatch.setattr(settings, "LLM_MAX_RETRIES", 2)
+    monkeypatch.setattr(settings, "LLM_RETRY_BACKOFF", 0.001)
+    monkeypatch.setattr(settings, "LLM_BREAKER_FAILURES", 3)
+    monkeypatch.setattr(settings, "LLM_HEDGE", False)
+    return ProviderRouter(retryable=retryable)
+
+def test_retries_transient_errors(routing):
+    """A transient error is retried on the same provider."""
+    calls = []
+
+    async def call(provider):
+        calls.append(provider)
+        if len(calls) == 1:
+            raise Transient("overloaded")
+        return f"answer from {provider}"
+
+    assert asyncio.run(routing.call(call)) == "answer from claude"
+    assert calls == ["claude", "claude"]
+
+def test_fails_over_without_retrying_permanent_errors(routing):
+    """A non-retryable error moves straight on to the fallback provider."""
+    calls = []
+
+    async def call(provider):
+        calls.append(provider)
+        if provider == "claude":
+            raise BadRequest("invalid request")
+        return f"answer from {provider}"
+
+    assert asyncio.run(routing.call(call)) == "answer from gemini"
+    assert calls == ["claude", "gemini"]
+
+def test_timeout_fails_over(routing, monkeypatch):
+    """An attempt that exceeds its provider's timeout counts as a failure."""
+    monkeypatch.setattr(settings, "LLM_TIMEOUT_CLAUDE", 0.01)
+    monkeypatch.setattr(settings, "LLM_MAX_RETRIES", 0)
+
+    async def call(provider):
+        if provider == "claude":
+            await asyncio.sleep(1)
+        return provider
+
+    assert asyncio.run(routing.call(call)) == "gemini"
+
+def test_long_answers_get_time_for_their_max_tokens(routing, monkeypatch):
+    """A response slower than the first-token timeout but within its max_tokens budget neither fails nor trips the breaker."""
+    monkeypatch.setattr(settings, "LLM_TIMEOUT_CLAUDE", 0.01)
+    monkeypatch.setattr(settings, "LLM_MIN_TOKENS_PER_SECOND", 1000)
+    monkeypatch.setattr(settings, "LLM_BREAKER_FAILURES", 1)
+
+    async def call(provider):
+        await asyncio.sleep(0.05)
+        return provider
+
+    async def run():
+        return [await routing.call(call, max_tokens=200) for _ in range(3)]
+
+    assert asyncio.run(run()) == ["claude"] * 3
+    assert routing.breaker("claude").failures == 0
+
+def test_circuit_breaker_sheds_failing_provider(routing):
+    """Once a provider's breaker opens it is skipped until the reset timeout."""
+    calls = []
+
+    async def call(provider):
+        calls.append(provider)
+        if provider == "claude":
+            raise Transient("down")
+        return provider
+
+    async def run():
+        first = await routing.call(call)
+        second = await routing.call(call)
+        return first, second
+
+    assert asyncio.run(run()) == ("gemini", "gemini")
+    assert calls == ["claude", "claude", "claude", "gemini", "gemini"]
+    assert routing.breaker("claude").state == "open"
+
+def test_client_errors_do_not_open_the_breaker(routing):
+    """Requests the provider rejects, like a bad prompt, leave its breaker closed."""
+    async def call(provider):
+        if provider == "claude":
+            raise BadRequest("invalid request")
+        return provider
+
+    async def run():
+        return [await routing.call(call) for _ in range(5)]
+
+    assert asyncio.run(run()) == ["gemini"] * 5
+    assert routing.breaker("claude").state == "closed"
+    assert routing.breaker("claude").failures == 0
+
+def test_all_providers_down_reports_retry_after(routing):
+    """When every breaker is open the router raises with a retry hint."""
+    async def call(provider):
+        raise Transient("down")
+
+    with pytest.raises(ProviderUnavailable) as first:
+        asyncio.run(routing.call(call))
+    assert isinstance(first.value.__cause__, Transient)
+
+    with pytest.raises(ProviderUnavailable) as second:
+        asyncio.run(routing.call(call))
+    assert 0 < second.value.retry_after <= settings.LLM_BREAKER_RESET
+
+def test_half_open_breaker_allows_one_trial(monkeypatch):
+    """After the reset timeout a single trial call decides the breaker's state."""
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+def test_hedges_after_observed_p95(routing, monkeypatch):
+    """A slow primary is hedged by the fallback, and the loser is cancelled."""
+    monkeypatch.setattr(settings, "LLM_HEDGE", True)
+    monkeypatch.setattr(settings, "LLM_HEDGE_MIN_SAMPLES", 5)
+    for _ in range(5):
+        routing.latency("claude", "response").record(0.01)
+    cancelled = []
+
+    async def call(provider):
+        if provider == "claude":
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                cancelled.append(provider)
+                raise
+        return provider
+
+    assert asyncio.run(routing.call(call)) == "gemini"
+    assert cancelled == ["claude"]
+    assert routing.breaker("claude").failures == 0
+
+def test_stream_fails_over_before_first_chunk(routing):
+    """A stream that fails before its first chunk is replaced by the fallback's."""
+    async def stream(provider):
+        if provider == "claude":
+            raise BadRequest("invalid request")
+        for delta in ["a ", "b"]:
+            yield delta
+
+    async def run():
+        return [delta async for delta in routing.stream(stream)]
+
+    assert asyncio.run(run()) == ["a ", "b"]
@@ -1,7 +1,9 @@
 import pytest
 import uuid
+import json
 from fastapi.testclient import TestClient
 from app.models.database import User, Conversation, Message
+from app.core.config import settings
 
 def test_process_query_new_user(client, mock_llm_response, test_db):
     """Test processing a query from a new user without a user_id cookie."""
@@ -29,11 +31,11 @@ def test_process_query_new_user(client, mock_llm_response, test_db):
     assert conversation is not None
     assert conversation.id == data["conversation_id"]
     
-    messages = test_db.query(Message).filter(Message.conversation_id == conversation.id).all()
-    assert len(messages) == 2  # User message and assistant response
+    messages = test_db.query(Message).filter(Message.conversation_id == conversation.id).order_by(Message.created_at).all()
+    assert len(messages) == 2  # User message and AI response
     assert messages[0].role == "user"
     assert messages[0].content == "What is a contract?"
-    assert messages[1].role == "assistant"
+    assert messages[1].role == "ai"
     assert messages[1].content == "This is a mock response to: What is a contract?"
 
 def test_process_query_existing_user(client, mock_llm_response, test_db):
@@ -131,7 +133,7 @@ def test_process_query_invalid_conversation(client, mock_llm_response, test_db):
 def test_process_query_error_handling(client, monkeypatch, test_db):
     """Test error handling in the query processing endpoint."""
     # Mock LLM service to raise an exception
-    async def mock_error_llm_response(query):
+    async def mock_error_llm_response(query, **kwargs):
         raise Exception("LLM service error")
     
     from app.services import llm_service
@@ -146,3 +148,147 @@ def test_process_query_error_handling(client, monkeypatch, test_db):
     # Should return 500 error
     assert response.status_code == 500
     assert "LLM service error" in response.json()["detail"]
+
+def test_process_query_providers_unavailable(client, monkeypatch, test_db):
+    """When every provider is down the endpoint answers 503 with Retry-After."""
+    from app.services import llm_service
+    from app.services.provider_router import ProviderUnavailable
+
+    async def mock_unavailable(query, **kwargs):
+        raise ProviderUnavailable(retry_after=12.4)
+
+    monkeypatch.setattr(llm_service, "get_llm_response", mock_unavailable)
+
+    response = client.post(
+        "/api/query",
+        json={"query": "What is a contract?"}
+    )
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "12"
+
+def test_process_query_stream_ndjson(client, mock_llm_stream, test_db):
+    """Test streaming a query response as newline-delimited JSON."""
+    response = client.post(
+        "/api/query/stream",
+        json={"query": "What is a contract?"}
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert "user_id" in response.cookies
+
+    events = [json.loads(line) for line in response.text.splitlines() if line]
+    deltas = [e["text"] for e in events if e["type"] == "delta"]
+    assert deltas == ["This is ", "a mock ", "stream for: What is a contract?"]
+    assert events[-1]["type"] == "done"
+
+    # The assembled answer is stored as a single assistant message
+    conversation_id = events[-1]["conversation_id"]
+    messages = test_db.query(Message).filter(Message.conversation_id == conversation_id).all()
+    assert len(messages) == 2
+    assert messages[1].content == "This is a mock stream for: What is a contract?"
+
+def test_process_query_stream_sse(client, mock_llm_stream, test_db):
+    """Test streaming a query response as server-sent events."""
+    response = client.post(
+        "/api/query/stream",
+        json={"query": "What is a tort?"},
+        headers={"Accept": "text/event-stream"}
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert "event: delta" in response.text
+    assert "event: done" in response.text
+
+def test_process_query_error_writes_nothing(client, monkeypatch, test_db):
+    """Nothing is persisted when the LLM call fails."""
+    async def mock_error_llm_response(query, **kwargs):
+        raise Exception("LLM service error")
+
+    from app.services import llm_service
+    monkeypatch.setattr(llm_service, "get_llm_response", mock_error_llm_response)
+
+    user_id = str(uuid.uuid4())
+    response = client.post(
+        "/api/query",
+        json={"query": "What is a contract?"},
+        cookies={"user_id": user_id}
+    )
+
+    assert response.status_code == 500
+    assert test_db.query(User).filter(User.id == user_id).first() is None
+    assert test_db.query(Conversation).filter(Conversation.user_id == user_id).count() == 0
+
+def test_process_query_batch(client, monkeypatch, test_db):
+    """Batch items stream back as NDJSON, share cached answers and are saved in bulk."""
+    calls = []
+
+    async def mock_get_llm_response(query, **kwargs):
+        calls.append(query)
+        return f"This is a mock response to: {query}"
+
+    from app.services import llm_service
+    monkeypatch.setattr(llm_service, "get_llm_response", mock_get_llm_response)
+
+    response = client.post(
+        "/api/query/batch",
+        json={"queries": [
+            {"query": "What is a lease?"},
+            {"query": "What is a contract?"},
+            {"query": "what is a lease"},
+            {"query": "Who pays rent?", "conversation_id": str(uuid.uuid4())},
+        ]}
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+
+    results = {line["index"]: line for line in lines if line["type"] == "result"}
+    errors = {line["index"]: line for line in lines if line["type"] == "error"}
+    assert sorted(results) == [0, 1, 2]
+    assert errors[3]["status"] == 404
+    assert lines[-1] == {"type": "done", "saved": 3, "failed": 1}
+    assert results[2]["response"] == "This is a mock response to: What is a lease?"
+    assert len(calls) == 2
+
+    user_id = response.cookies["user_id"]
+    conversations = test_db.query(Conversation).filter(Conversation.user_id == user_id).all()
+    assert len(conversations) == 3
+    assert test_db.query(Message).count() == 6
+
+def test_batch_items_are_admitted_one_by_one(client, mock_llm_response, monkeypatch, test_db):
+    """Each item of a batch spends a rate-limit token, waiting for one when the burst is used up, and an LLM slot of its own."""
+    from app.services.admission import llm_limiter
+
+    monkeypatch.setattr(settings, "RATE_LIMIT_BURST", 3)
+    monkeypatch.setattr(settings, "RATE_LIMIT_PER_MINUTE", 1200)
+    slots = []
+    slot = llm_limiter.slot
+    monkeypatch.setattr(llm_limiter, "slot", lambda: slots.append(1) or slot())
+
+    response = client.post(
+        "/api/query/batch",
+        json={"queries": [{"query": f"What is clause {i}?"} for i in range(8)]},
+    )
+
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[-1] == {"type": "done", "saved": 8, "failed": 0}
+    assert len(slots) == 8
+
+def test_batch_items_refused_past_the_rate_limit_deadline(client, mock_llm_response, monkeypatch, test_db):
+    """Items that could not get a token within BATCH_RATE_LIMIT_WAIT are reported as 429s."""
+    monkeypatch.setattr(settings, "RATE_LIMIT_BURST", 3)
+    monkeypatch.setattr(settings, "RATE_LIMIT_PER_MINUTE", 0.001)
+    monkeypatch.setattr(settings, "BATCH_RATE_LIMIT_WAIT", 1)
+
+    response = client.post(
+        "/api/query/batch",
+        json={"queries": [{"query": f"What is clause {i}?"} for i in range(5)]},
+    )
+
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(line["status"] for line in lines if line["type"] == "error") == [429, 429]
+    assert lines[-1] == {"type": "done", "saved": 3, "failed": 2}
@@ -0,0 +1,74 @@
+import asyncio
+import time
+import pytest
+from app.services.cache import (
+    MemoryCacheBackend,
+    SQLiteCacheBackend,
+    ResponseCache,
+    make_cache_key,
+)
+
+def test_cache_key_normalizes_query():
+    """Whitespace, case and trailing punctuation should not change the key."""
+    key1 = make_cache_key("What is mitigation?", "gemini", "m", "sys", {"t": 0.3})
+    key2 = make_cache_key("  what is   Mitigation ", "gemini", "m", "sys", {"t": 0.3})
+    assert key1 == key2
+
+def test_cache_key_includes_generation_settings():
+    """Different providers, models, prompts or parameters get different keys."""
+    base = make_cache_key("What is mitigation", "gemini", "m", "sys", {"t": 0.3})
+    assert base != make_cache_key("What is mitigation", "claude", "m", "sys", {"t": 0.3})
+    assert base != make_cache_key("What is mitigation", "gemini", "m2", "sys", {"t": 0.3})
+    assert base != make_cache_key("What is mitigation", "gemini", "m", "sys2", {"t": 0.3})
+    assert base != make_cache_key("What is mitigation", "gemini", "m", "sys", {"t": 0.7})
+
+def test_memory_backend_counts_hits_and_misses():
+    """The front-end counts hits and misses."""
+    response_cache = ResponseCache(MemoryCacheBackend(maxsize=2, ttl=60))
+
+    async def run():
+        assert await response_cache.get("a") is None
+        await response_cache.set("a", "answer")
+        assert await response_cache.get("a") == "answer"
+
+    asyncio.run(run())
+    assert response_cache.stats() == {"hits": 1, "misses": 1, "hit_ratio": 0.5}
+
+def test_sqlite_backend_expires_and_evicts(tmp_path):
+    """The SQLite backend honours the TTL and evicts least recently used entries."""
+    backend = SQLiteCacheBackend(str(tmp_path / "cache.db"), maxsize=2, ttl=60)
+
+    async def run():
+        await backend.set("a", "1")
+        await backend.set("b", "2")
+        assert await backend.get("a") == "1"  # "a" is now more recent than "b"
+        await backend.set("c", "3")
+        assert await backend.get("b") is None
+        assert await backend.get("a") == "1"
+        assert await backend.get("c") == "3"
+
+        backend.ttl = 0
+        time.sleep(0.01)
+        assert await backend.get("a") is None
+
+    asyncio.run(run())
+
+def test_query_uses_cache(client, monkeypatch, test_db):
+    """Repeated queries are served from the cache unless bypass_cache is set."""
+    calls = []
+
+    async def mock_get_llm_response(query, **kwargs):
+        calls.append(query)
+        return f"Answer {len(calls)}"
+
+    from app.services import llm_service
+    monkeypatch.setattr(llm_service, "get_llm_response", mock_get_llm_response)
+
+    first = client.post("/api/query", json={"query": "What is mitigation"})
+    second = client.post("/api/query", json={"query": "what is mitigation?"})
+    assert first.json()["response"] == second.json()["response"] == "Answer 1"
+    assert len(calls) == 1
+
+    bypassed = client.post("/api/query", json={"query": "What is mitigation", "bypass_cache": True})
+    assert bypassed.json()["response"] == "Answer 2"
+    assert len(calls) == 2
@@ -0,0 +1,91 @@
+import os
+import numpy as np
+import pytest
+from app.core.config import settings
+from app.services import retrieval
+from app.services.retrieval import Retriever, build_index, chunk_lines
+
+STATUTE = """LAND ACT
+
+PART I - PRELIMINARY
+
+1. Short title
+This Act may be cited as the Land Act.
+
+2. Interpretation
+In this Act, "lease" means a grant of land for a specified term.
+
+PART II - LEASES
+
+45. Obligations of a tenant
+A tenant shall pay rent and keep the premises in repair.
+"""
+
+JUDGMENT = """# Mitigation of damages
+A claimant must take reasonable steps to mitigate the loss arising from a breach of contract.
+"""
+
+@pytest.fixture
+def index_dir(tmp_path):
+    corpus = tmp_path / "corpus"
+    corpus.mkdir()
+    (corpus / "land_act.txt").write_text(STATUTE)
+    (corpus / "judgment.md").write_text(JUDGMENT)
+    path = str(tmp_path / "index")
+    build_index(retrieval.iter_corpus(str(corpus)), path, with_embeddings=True)
+    return path
+
+def test_chunk_lines_splits_by_section():
+    """Each numbered section or part becomes its own chunk."""
+    chunks = list(chunk_lines(STATUTE.splitlines(keepends=True), "land_act.txt"))
+    sections = [c["section"] for c in chunks]
+    assert "1. Short title" in sections
+    assert "45. Obligations of a tenant" in sections
+    assert all(c["source"] == "land_act.txt" for c in chunks)
+
+def test_bm25_search_ranks_relevant_section(index_dir):
+    """The section sharing the query terms ranks first."""
+    retriever = Retriever()
+    assert retriever.load(index_dir)
+    passages = retriever.search("obligations of a tenant to pay rent", k=2)
+    assert passages[0]["section"] == "45. Obligations of a tenant"
+    assert passages[0]["score"] > 0
+    retriever.close()
+
+def test_index_built_in_spilled_blocks_matches(index_dir, tmp_path):
+    """Spilling postings every few entries gives the same index as building it in one block."""
+    spilled = str(tmp_path / "spilled")
+    build_index(retrieval.iter_corpus(str(tmp_path / "corpus")), spilled, block_postings=3)
+
+    for name in ("term_offsets.npy", "doc_ids.npy", "tfs.npy"):
+        assert (np.load(os.path.join(spilled, name)) == np.load(os.path.join(index_dir, name))).all()
+    assert not [name for name in os.listdir(spilled) if name.startswith("postings-")]
+
+def test_hybrid_search_with_vectors(index_dir, monkeypatch):
+    """Vector search fuses with BM25 when enabled."""
+    monkeypatch.setattr(settings, "RETRIEVAL_USE_VECTORS", True)
+    retriever = Retriever()
+    retriever.load(index_dir)
+    passages = retriever.search("mitigate loss after breach of contract", k=1)
+    assert passages[0]["source"] == "judgment.md"
+    retriever.close()
+
+def test_query_includes_passages(client, index_dir, monkeypatch, test_db):
+    """Retrieved passages are passed to the LLM with the query."""
+    captured = []
+
+    async def mock_get_llm_response(query, context=None, **kwargs):
+        captured.append(context)
+        return "ok"
+
+    from app.services import llm_service
+    monkeypatch.setattr(llm_service, "get_llm_response", mock_get_llm_response)
+    monkeypatch.setattr(retrieval.retriever, "index", None)
+    retrieval.retriever.load(index_dir)
+    try:
+        response = client.post("/api/query", json={"query": "What must a tenant pay?"})
+    finally:
+        retrieval.retriever.close()
+
+    assert response.status_code == 200
+    assert captured[0].passages[0]["section"] == "45. Obligations of a tenant"
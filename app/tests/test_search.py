@@ -0,0 +1,105 @@
+import uuid
+from app.models.database import User, Conversation, Message
+
+
+def add_conversation(test_db, user_id, title, contents):
+    conversation = Conversation(id=str(uuid.uuid4()), user_id=user_id, title=title)
+    test_db.add(conversation)
+    test_db.flush()
+    for i, content in enumerate(contents):
+        test_db.add(Message(conversation_id=conversation.id, role="user" if i % 2 == 0 else "assistant", content=content))
+    test_db.commit()
+    return conversation
+
+
+def make_user(test_db):
+    user_id = str(uuid.uuid4())
+    test_db.add(User(id=user_id))
+    test_db.commit()
+    return user_id
+
+
+def test_search_no_user_id(client, test_db):
+    response = client.get("/api/search", params={"q": "lease"})
+
+    assert response.status_code == 200
+    assert response.json() == []
+
+
+def test_search_requires_query(client, test_db):
+    response = client.get("/api/search", params={"q": ""}, cookies={"user_id": "someone"})
+
+    assert response.status_code == 422
+
+
+def test_search_ranks_conversations_with_snippets(client, test_db):
+    user_id = make_user(test_db)
+    land = add_conversation(test_db, user_id, "Farm", [
+        "Can I sublet a land lease for grazing?",
+        "A land lease usually allows subletting only with the landlord's consent.",
+    ])
+    add_conversation(test_db, user_id, "Flat", ["My flat lease ends in June, can the landlord raise the rent?"])
+    add_conversation(test_db, user_id, "Will", ["How do I write a will?"])
+
+    response = client.get("/api/search", params={"q": "land lease"}, cookies={"user_id": user_id})
+
+    assert response.status_code == 200
+    data = response.json()
+    # Only the conversation with both words matches, once, with both of its messages counted
+    assert len(data) == 1
+    assert data[0]["conversation_id"] == land.id
+    assert data[0]["title"] == "Farm"
+    assert data[0]["hits"] == 2
+    assert "**land**" in data[0]["snippet"]
+    assert "**lease**" in data[0]["snippet"]
+
+    response = client.get("/api/search", params={"q": "lease"}, cookies={"user_id": user_id})
+    titles = [result["title"] for result in response.json()]
+    assert sorted(titles) == ["Farm", "Flat"]
+    # Ordered by relevance
+    ranks = [result["rank"] for result in response.json()]
+    assert ranks == sorted(ranks, reverse=True)
+
+
+def test_search_matches_prefix_and_stems(client, test_db):
+    user_id = make_user(test_db)
+    add_conversation(test_db, user_id, "Tenancy", ["The tenants were evicted without notice"])
+
+    for q in ["tenant", "evict", "evic"]:
+        response = client.get("/api/search", params={"q": q}, cookies={"user_id": user_id})
+        assert [result["title"] for result in response.json()] == ["Tenancy"], q
+
+
+def test_search_is_scoped_to_user(client, test_db):
+    owner = make_user(test_db)
+    other = make_user(test_db)
+    add_conversation(test_db, owner, "Mine", ["Questions about a land lease"])
+
+    response = client.get("/api/search", params={"q": "lease"}, cookies={"user_id": other})
+
+    assert response.status_code == 200
+    assert response.json() == []
+
+
+def test_search_handles_query_syntax(client, test_db):
+    user_id = make_user(test_db)
+    add_conversation(test_db, user_id, "Quotes", ['What does "force majeure" mean?'])
+
+    for q in ['"force', 'majeure" AND', "force (majeure", "NEAR(*"]:
+        response = client.get("/api/search", params={"q": q}, cookies={"user_id": user_id})
+        assert response.status_code == 200, q
+
+
+def test_search_follows_updates_and_deletes(client, test_db):
+    user_id = make_user(test_db)
+    conversation = add_conversation(test_db, user_id, "Edits", ["Questions about easements"])
+    message = test_db.query(Message).filter(Message.conversation_id == conversation.id).one()
+
+    message.content = "Questions about covenants"
+    test_db.commit()
+    assert client.get("/api/search", params={"q": "easements"}, cookies={"user_id": user_id}).json() == []
+    assert len(client.get("/api/search", params={"q": "covenants"}, cookies={"user_id": user_id}).json()) == 1
+
+    test_db.delete(message)
+    test_db.commit()
+    assert client.get("/api/search", params={"q": "covenants"}, cookies={"user_id": user_id}).json() == []
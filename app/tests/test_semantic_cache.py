@@ -0,0 +1,127 @@
+import numpy as np
+import pytest
+from app.core.config import settings
+from app.services.embeddings import embed
+from app.services.semantic_cache import SemanticCache, semantic_cache
+
+def unit(*values):
+    vector = np.asarray(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+def test_lookup_uses_threshold_and_scope():
+    cache = SemanticCache(maxsize=8, ttl=60, threshold=0.9)
+    cache.add(unit(1, 0, 0), "claude", "about leases")
+    cache.add(unit(0, 1, 0), "claude", "about torts")
+
+    assert cache.lookup(unit(1, 0.1, 0), "claude")[0] == "about leases"
+    assert cache.lookup(unit(1, 1, 0), "claude") is None
+    assert cache.lookup(unit(1, 0, 0), "gemini") is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+def test_lookup_many_answers_each_row():
+    """One matrix product serves a whole batch of queries."""
+    cache = SemanticCache(maxsize=8, ttl=60, threshold=0.9)
+    cache.add(unit(1, 0, 0), "s", "a")
+    cache.add(unit(0, 1, 0), "s", "b")
+
+    results = cache.lookup_many(np.stack([unit(0, 1, 0), unit(0, 0, 1), unit(1, 0, 0)]), "s")
+    assert [r and r[0] for r in results] == ["b", None, "a"]
+
+def test_eviction_by_size_and_age():
+    cache = SemanticCache(maxsize=2, ttl=60, threshold=0.9)
+    cache.add(unit(1, 0, 0), "s", "first")
+    cache.add(unit(0, 1, 0), "s", "second")
+    cache.add(unit(0, 0, 1), "s", "third")
+
+    # The oldest row was overwritten
+    assert cache.lookup(unit(1, 0, 0), "s") is None
+    assert cache.lookup(unit(0, 0, 1), "s")[0] == "third"
+    assert len(cache) == 2
+
+    cache.ttl = 0
+    assert cache.lookup(unit(0, 0, 1), "s") is None
+    assert len(cache) == 0
+
+def test_float64_queries_match_float32_rows():
+    cache = SemanticCache(maxsize=8, ttl=60, threshold=0.9)
+    cache.add(unit(1, 0, 0), "s", "a")
+
+    answer, similarity = cache.lookup(unit(1, 0, 0).astype(np.float64), "s")
+    assert answer == "a"
+    assert similarity == pytest.approx(1.0)
+
+@pytest.fixture
+def semantic(monkeypatch):
+    monkeypatch.setattr(settings, "SEMANTIC_CACHE", True)
+    monkeypatch.setattr(semantic_cache, "threshold", 0.85)
+
+def test_paraphrase_is_served_from_semantic_cache(client, semantic, test_db, monkeypatch):
+    """A near-identical question in a new conversation reuses the stored answer."""
+    from app.services import llm_service
+
+    calls = []
+
+    async def mock_get_llm_response(query, **kwargs):
+        calls.append(query)
+        return f"This is a mock response to: {query}"
+
+    monkeypatch.setattr(llm_service, "get_llm_response", mock_get_llm_response)
+
+    first = "What does mitigation mean?"
+    second = "What does mitigation mean exactly?"
+    assert float(embed([first])[0] @ embed([second])[0]) >= 0.85
+
+    response = client.post("/api/query", json={"query": first})
+    assert response.json()["cached"] is False
+    user_id = response.cookies["user_id"]
+
+    paraphrased = client.post("/api/query", json={"query": second}, cookies={"user_id": user_id}).json()
+    assert paraphrased["cached"] is True
+    assert paraphrased["response"] == f"This is a mock response to: {first}"
+    assert calls == [first]
+
+    # Follow-ups depend on the conversation, so they are not matched semantically
+    follow_up = client.post(
+        "/api/query",
+        json={"query": second, "conversation_id": response.json()["conversation_id"]},
+        cookies={"user_id": user_id},
+    ).json()
+    assert follow_up["cached"] is False
+    assert calls == [first, second]
+
+def test_semantic_lookup_runs_off_the_event_loop(semantic, monkeypatch):
+    """Embedding and the similarity search happen in a worker thread."""
+    import asyncio
+    import threading
+    from app.services import llm_service
+    from app.services.model_routing import choose_route
+
+    threads = []
+    embed_query = semantic_cache.embed
+
+    def recording_embed(query):
+        threads.append(threading.current_thread())
+        return embed_query(query)
+
+    monkeypatch.setattr(semantic_cache, "embed", recording_embed)
+
+    async def run():
+        route = choose_route("What is a lease?")
+        await llm_service.SemanticLookup("What is a lease?", True, route).set("A lease is ...")
+        return await llm_service.SemanticLookup("What is a lease?", True, route).get()
+
+    assert asyncio.run(run()).text == "A lease is ..."
+    assert threads and threading.main_thread() not in threads
+
+def test_exact_cache_hits_are_marked_cached(client, mock_llm_response, test_db):
+    first = client.post("/api/query", json={"query": "What is a lease?"}).json()
+    again = client.post("/api/query", json={"query": "What is a lease?"}).json()
+
+    assert first["cached"] is False
+    assert again["cached"] is True
+
+def test_semantic_cache_is_off_by_default(client, mock_llm_response, test_db):
+    client.post("/api/query", json={"query": "What does mitigation mean?"})
+    response = client.post("/api/query", json={"query": "What does mitigation mean exactly?"})
+
+    assert response.json()["cached"] is False
@@ -0,0 +1,89 @@
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.models.database import User, Conversation
+from app.services import conversation_service
+from app.services.sessions import sessions
+from tests.conftest import async_engine
+
+def test_known_user_skips_upsert(client, mock_llm_response, test_db, monkeypatch):
+    """Only the first query of a user writes the user row."""
+    upserts = []
+    upsert_user = conversation_service.upsert_user
+
+    async def counting_upsert(user_id, db):
+        upserts.append(user_id)
+        await upsert_user(user_id, db)
+
+    monkeypatch.setattr(conversation_service, "upsert_user", counting_upsert)
+
+    first = client.post("/api/query", json={"query": "What is a contract?"})
+    user_id = first.cookies["user_id"]
+    client.post("/api/query", json={"query": "What is a tort?"}, cookies={"user_id": user_id})
+
+    assert upserts == [user_id]
+    assert test_db.query(User).filter(User.id == user_id).count() == 1
+
+def test_ownership_checks_are_cached(client, test_db):
+    """A conversation's owner is looked up once; other users are still refused."""
+    owner = str(uuid.uuid4())
+    conversation_id = str(uuid.uuid4())
+    test_db.add(User(id=owner))
+    test_db.add(Conversation(id=conversation_id, user_id=owner, title="Lease"))
+    test_db.commit()
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(Engine, "before_cursor_execute", listener)
+    try:
+        for _ in range(3):
+            response = client.get(f"/api/conversations/{conversation_id}/messages", cookies={"user_id": owner})
+            assert response.status_code == 200
+        intruder = client.get(f"/api/conversations/{conversation_id}/messages", cookies={"user_id": "someone-else"})
+    finally:
+        event.remove(Engine, "before_cursor_execute", listener)
+
+    assert intruder.status_code == 404
+    assert len([s for s in statements if "FROM conversations" in s]) == 1
+
+def test_last_seen_is_flushed_in_bulk(client, test_db):
+    """Requests only buffer last_seen; a flush writes them all in one statement."""
+    stale = datetime.utcnow() - timedelta(days=30)
+    user_ids = [str(uuid.uuid4()) for _ in range(3)]
+    for user_id in user_ids:
+        test_db.add(User(id=user_id, created_at=stale, last_seen=stale))
+    test_db.commit()
+
+    client.portal.call(sessions.close)
+    client.portal.call(sessions.start, async_engine)
+    try:
+        for user_id in user_ids:
+            client.get("/api/conversations", cookies={"user_id": user_id})
+        test_db.expire_all()
+        assert all(user.last_seen == stale for user in test_db.query(User).filter(User.id.in_(user_ids)))
+
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(Engine, "before_cursor_execute", listener)
+        try:
+            client.portal.call(sessions.flush)
+        finally:
+            event.remove(Engine, "before_cursor_execute", listener)
+    finally:
+        client.portal.call(sessions.close)
+
+    assert len([s for s in statements if s.startswith("UPDATE users")]) == 1
+    test_db.expire_all()
+    assert all(user.last_seen > stale for user in test_db.query(User).filter(User.id.in_(user_ids)))
+
+def test_last_seen_buffer_is_bounded(monkeypatch):
+    """Unknown user ids stop being buffered once the cap is reached; known users still are."""
+    from app.core.config import settings
+    monkeypatch.setattr(settings, "USER_CACHE_SIZE", 2)
+    for user_id in ("a", "b", "c"):
+        sessions.touch(user_id)
+    sessions.add_user("known")
+    sessions.touch("known")
+
+    assert set(sessions._seen) == {"a", "b", "known"}
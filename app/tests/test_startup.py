@@ -0,0 +1,38 @@
+import os
+import subprocess
+import sys
+from sqlalchemy import create_engine, inspect, text
+from app.db import migrate
+
+REPOSITORY_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+def test_import_does_not_load_provider_sdks(tmp_path):
+    """Importing the app leaves the provider SDKs and the schema alone."""
+    database = tmp_path / "import.db"
+    check = (
+        "import sys, app.main; "
+        "print(','.join(m for m in ('anthropic', 'google.genai') if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", check],
+        cwd=REPOSITORY_ROOT,
+        env={**os.environ, "DATABASE_URL": f"sqlite:///{database}"},
+        capture_output=True, text=True, check=True,
+    )
+    assert result.stdout.strip() == ""
+    assert not database.exists() or inspect(create_engine(f"sqlite:///{database}")).get_table_names() == []
+
+def test_migrate_upgrades_a_create_all_database(tmp_path):
+    """A database created before migrations were used is stamped and brought to head."""
+    url = f"sqlite:///{tmp_path / 'legacy.db'}"
+    engine = create_engine(url)
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE users (id VARCHAR NOT NULL PRIMARY KEY, created_at DATETIME, last_seen DATETIME)"))
+        connection.execute(text("CREATE TABLE conversations (id VARCHAR NOT NULL PRIMARY KEY, user_id VARCHAR REFERENCES users (id), title VARCHAR, created_at DATETIME, updated_at DATETIME)"))
+        connection.execute(text("CREATE TABLE messages (id VARCHAR NOT NULL PRIMARY KEY, conversation_id VARCHAR REFERENCES conversations (id), role VARCHAR, content TEXT, created_at DATETIME)"))
+
+    migrate.upgrade(url)
+
+    tables = inspect(engine).get_table_names()
+    assert {"jobs", "documents", "messages_fts", "alembic_version"} <= set(tables)
+    assert "prompt_version" in [column["name"] for column in inspect(engine).get_columns("messages")]